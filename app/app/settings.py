@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,15 +85,42 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.dbpool',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'MAX_AGE': int(os.environ.get('DB_POOL_MAX_AGE', 1800)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+# the per user change versions that cached responses, etags, tokens and
+# the in-process indexes are checked against live here, so every worker
+# has to share it. local memory is only right for a single process
+if os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ.get('MEMCACHED_LOCATION'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -136,4 +165,16 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# uploads are stored by content hash and shared between influencers
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
 AUTH_USER_MODEL = 'core.User'
+
+# bearer token /metrics asks for, the endpoint is closed while unset
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# where `manage.py serve` workers share their metrics, a new temporary
+# directory per run when unset
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# log N+1 and slow queries per request, meant for staging
+QUERY_DETECTOR = bool(int(os.environ.get('QUERY_DETECTOR', 0)))
@@ -0,0 +1,92 @@
+"""Benchmark suites run with `python manage.py benchmark <suite>`
+
+every suite module exposes `run(command, options)` and runs inside a
+transaction that is rolled back afterwards, so seeded rows never persist
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+
+from core.models import Tag, Style, Influencer
+
+
+def timed(func, repeat=20):
+    """call func repeat times and return (median, best, p95) in ms"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return statistics.median(samples), samples[0], p95
+
+
+def report(command, label, func, repeat=20):
+    """time func and write a one line result to the command's stdout"""
+    median, best, p95 = timed(func, repeat)
+    command.stdout.write(
+        f'{label:<40} median {median:9.3f}ms  best {best:9.3f}ms  '
+        f'p95 {p95:9.3f}ms'
+    )
+    return median
+
+
+def seed_user(email='benchmark@burningb.com'):
+    """create the user owning the seeded roster"""
+    return get_user_model().objects.create_user(email, 'benchmark')
+
+
+def seed_roster(user, influencers=1000, tags=20, styles=10,
+                per_influencer=4, seed=0, batch_size=5000):
+    """bulk create a roster with random tag and style memberships
+
+    returns (tag ids, style ids)
+    """
+    rng = random.Random(seed)
+    Tag.objects.bulk_create(
+        [Tag(user=user, name=f'tag{i}') for i in range(tags)]
+    )
+    Style.objects.bulk_create(
+        [Style(user=user, name=f'style{i}') for i in range(styles)]
+    )
+    tag_ids = list(Tag.objects.filter(user=user).order_by('id')
+                   .values_list('id', flat=True))
+    style_ids = list(Style.objects.filter(user=user).order_by('id')
+                     .values_list('id', flat=True))
+
+    for start in range(0, influencers, batch_size):
+        Influencer.objects.bulk_create([
+            Influencer(
+                user=user,
+                name=f'influencer{i}',
+                insta_id=f'insta_{i}',
+                followers=rng.randint(0, 1000000),
+                insta_link=f'www.instagram.com/insta_{i}',
+                score=rng.randint(0, 10000) / 100,
+            )
+            for i in range(start, min(start + batch_size, influencers))
+        ])
+
+    TagThrough = Influencer.tags.through
+    StyleThrough = Influencer.styles.through
+    influencer_ids = Influencer.objects.filter(user=user).order_by('id')\
+        .values_list('id', flat=True).iterator()
+    tag_rows, style_rows = [], []
+    for influencer_id in influencer_ids:
+        for tag_id in rng.sample(tag_ids, min(per_influencer, tags)):
+            tag_rows.append(TagThrough(influencer_id=influencer_id,
+                                       tag_id=tag_id))
+        for style_id in rng.sample(style_ids, min(per_influencer, styles)):
+            style_rows.append(StyleThrough(influencer_id=influencer_id,
+                                           style_id=style_id))
+        if len(tag_rows) >= batch_size:
+            TagThrough.objects.bulk_create(tag_rows)
+            StyleThrough.objects.bulk_create(style_rows)
+            tag_rows, style_rows = [], []
+    TagThrough.objects.bulk_create(tag_rows)
+    StyleThrough.objects.bulk_create(style_rows)
+
+    return tag_ids, style_ids
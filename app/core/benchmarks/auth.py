@@ -0,0 +1,30 @@
+"""authenticated request latency: token lookup per request versus cached"""
+from django.test import Client
+from django.urls import reverse
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.benchmarks import report, seed_user
+from user.authentication import CachedTokenAuthentication
+from user.views import ManageUserView
+
+
+def run(command, options):
+    user = seed_user()
+    token = Token.objects.create(user=user)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+    url = reverse('user:me')
+    original = ManageUserView.authentication_classes
+
+    def request():
+        assert client.get(url).status_code == 200
+
+    try:
+        for cls in (TokenAuthentication, CachedTokenAuthentication):
+            ManageUserView.authentication_classes = (cls,)
+            request()
+            report(command, f'me: {cls.__name__}', request,
+                   options['repeat'])
+    finally:
+        ManageUserView.authentication_classes = original
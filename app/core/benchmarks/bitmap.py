@@ -0,0 +1,41 @@
+"""tag/style filter resolution: bitmap index versus sql"""
+import time
+
+from core.benchmarks import report, seed_roster, seed_user
+from core.models import Influencer
+from influencer import bitmap
+from influencer.filters import MATCH_ALL, MATCH_ANY, filter_by_members
+
+
+def run(command, options):
+    user = seed_user()
+    tag_ids, style_ids = seed_roster(user, influencers=options['influencers'],
+                                     tags=options['tags'])
+    roster = Influencer.objects.filter(user=user)
+    size = options['filter_size']
+    filters = {'tags': tag_ids[:size], 'styles': style_ids[:2]}
+
+    started = time.perf_counter()
+    index = bitmap.warm(user.id)
+    command.stdout.write(
+        f'{options["influencers"]} influencers, index built in '
+        f'{(time.perf_counter() - started) * 1000:.1f}ms'
+    )
+
+    for match in (MATCH_ALL, MATCH_ANY):
+        def sql():
+            queryset = roster
+            for relation, keys in filters.items():
+                queryset = filter_by_members(queryset, relation, keys, match)
+            return sorted(queryset.values_list('id', flat=True))
+
+        def indexed():
+            result = None
+            for relation, keys in filters.items():
+                bits = index.resolve(relation, keys, match)
+                result = bits if result is None else result & bits
+            return index.to_ids(result)
+
+        assert sql() == indexed()
+        report(command, f'{match}: sql', sql, options['repeat'])
+        report(command, f'{match}: bitmap index', indexed, options['repeat'])
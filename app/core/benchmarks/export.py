@@ -0,0 +1,45 @@
+"""roster export: time to first row and peak memory by roster size"""
+import time
+import tracemalloc
+
+from core.benchmarks import report, seed_roster, seed_user
+from core.models import Influencer
+from influencer import exports
+
+
+def run(command, options):
+    user = seed_user()
+    seed_roster(user, influencers=options['influencers'],
+                tags=options['tags'])
+    ids = list(Influencer.objects.filter(user=user).order_by('id')
+               .values_list('id', flat=True))
+    command.stdout.write(f'{len(ids)} influencers')
+
+    for size in (len(ids) // 100, len(ids) // 10, len(ids)):
+        roster = Influencer.objects.filter(user=user, id__lte=ids[size - 1])
+        for fmt in sorted(exports.ENCODERS):
+            def first_byte():
+                chunks = exports.ENCODERS[fmt](
+                    exports.iter_chunks(user, roster)
+                )
+                # the json array opens with a lone '['
+                while len(next(chunks)) < 2:
+                    pass
+                # closes the server-side cursor like an aborted download
+                chunks.close()
+
+            label = f'{fmt} {size}: first row'
+            report(command, label, first_byte, options['repeat'])
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            written = sum(len(chunk) for chunk in exports.streaming_response(
+                user, roster, fmt).streaming_content)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            command.stdout.write(
+                f'{fmt + " " + str(size) + ": full":<40} '
+                f'{elapsed:9.3f}s  {written / 2 ** 20:8.1f}MiB out  '
+                f'peak {peak / 2 ** 20:6.2f}MiB'
+            )
@@ -0,0 +1,42 @@
+"""tag filtering: one join per tag versus GROUP BY/HAVING"""
+from core.benchmarks import report, seed_roster, seed_user
+from core.models import Influencer
+from influencer.filters import MATCH_ALL, MATCH_ANY, filter_by_members
+
+
+def run(command, options):
+    user = seed_user()
+    tag_ids, _ = seed_roster(user, influencers=options['influencers'],
+                             tags=options['tags'])
+    wanted = tag_ids[:options['filter_size']]
+    roster = Influencer.objects.filter(user=user)
+    command.stdout.write(
+        f'{options["influencers"]} influencers, '
+        f'{len(wanted)} tag filter'
+    )
+
+    def join_per_tag():
+        queryset = roster
+        for tag_id in wanted:
+            queryset = queryset.filter(tags__id=tag_id)
+        return list(queryset.values_list('id', flat=True))
+
+    def match_all():
+        return list(filter_by_members(roster, 'tags', wanted, MATCH_ALL)
+                    .values_list('id', flat=True))
+
+    def join_any():
+        return list(roster.filter(tags__id__in=wanted).distinct()
+                    .values_list('id', flat=True))
+
+    def match_any():
+        return list(filter_by_members(roster, 'tags', wanted, MATCH_ANY)
+                    .values_list('id', flat=True))
+
+    assert sorted(join_per_tag()) == sorted(match_all())
+    assert sorted(join_any()) == sorted(match_any())
+    repeat = options['repeat']
+    report(command, 'all: one join per tag', join_per_tag, repeat)
+    report(command, 'all: group by / having', match_all, repeat)
+    report(command, 'any: join + distinct', join_any, repeat)
+    report(command, 'any: id in subquery', match_any, repeat)
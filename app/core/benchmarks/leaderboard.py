@@ -0,0 +1,32 @@
+"""top-K: cached leaderboard versus ORDER BY ... LIMIT"""
+from core.benchmarks import report, seed_roster, seed_user
+from core.models import Influencer
+from influencer import leaderboard
+
+
+def run(command, options):
+    user = seed_user()
+    tag_ids, _ = seed_roster(user, influencers=options['influencers'],
+                             tags=options['tags'])
+    command.stdout.write(f'{options["influencers"]} influencers, top 50')
+    repeat = options['repeat']
+
+    for label, facet in (('all', leaderboard.FACET_ALL),
+                         ('one tag', ('tags', tag_ids[0]))):
+        for metric in leaderboard.METRICS:
+            assert leaderboard.top_ids(user.id, metric, facet, 50) == \
+                leaderboard.top_sql(user.id, metric, facet, 50)
+            report(command, f'{label} by {metric}: sql',
+                   lambda: leaderboard.top_sql(user.id, metric, facet, 50),
+                   repeat)
+            report(command, f'{label} by {metric}: board',
+                   lambda: leaderboard.top_ids(user.id, metric, facet, 50),
+                   repeat)
+
+    influencer = Influencer.objects.filter(user=user).first()
+
+    def save():
+        influencer.score = (influencer.score + 1) % 100
+        influencer.save()
+
+    report(command, 'influencer save, 4 boards kept current', save, repeat)
@@ -0,0 +1,74 @@
+"""worker time per MB served: static() view, serve_media and offloading"""
+import os
+import tempfile
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from core.benchmarks import report
+from core.views import serve_media
+
+
+FILE_MB = 8
+
+
+def sendfile_wrapper(fileobj, block_size=None):
+    """a wsgi.file_wrapper sending the file to /dev/null like a server"""
+    with open(os.devnull, 'wb') as devnull:
+        size = os.fstat(fileobj.fileno()).st_size
+        offset = 0
+        while offset < size:
+            offset += os.sendfile(devnull.fileno(), fileobj.fileno(),
+                                  offset, size - offset)
+    fileobj.close()
+    return []
+
+
+def consume(response):
+    for _ in response.streaming_content if response.streaming else ():
+        pass
+    response.close()
+
+
+def run(command, options):
+    with tempfile.TemporaryDirectory() as media_root:
+        name = 'uploads/influencer/bench.jpg'
+        os.makedirs(os.path.join(media_root, os.path.dirname(name)))
+        with open(os.path.join(media_root, name), 'wb') as fileobj:
+            fileobj.write(os.urandom(FILE_MB * 1024 * 1024))
+
+        factory = RequestFactory()
+        repeat = options['repeat']
+        with override_settings(MEDIA_ROOT=media_root):
+            def static_view():
+                consume(serve(factory.get('/media/' + name), name,
+                              document_root=media_root))
+
+            def python_stream():
+                consume(serve_media(factory.get('/media/' + name), name))
+
+            handler = WSGIHandler()
+
+            def file_wrapper():
+                environ = factory.get('/media/' + name).environ
+                environ['wsgi.file_wrapper'] = sendfile_wrapper
+                handler(environ, lambda status, headers: None)
+
+            results = [
+                ('static(): python iteration', static_view),
+                ('serve_media: python iteration', python_stream),
+                ('serve_media: wsgi.file_wrapper sendfile', file_wrapper),
+            ]
+            for label, func in results:
+                median = report(command, label, func, repeat)
+                command.stdout.write(f'{"":<40} {median / FILE_MB:.3f}ms/MB')
+
+        with override_settings(MEDIA_ROOT=media_root,
+                               MEDIA_ACCEL_REDIRECT_PREFIX='/protected/'):
+            def offload():
+                consume(serve_media(factory.get('/media/' + name), name))
+
+            median = report(command, 'serve_media: X-Accel-Redirect', offload,
+                            repeat)
+            command.stdout.write(f'{"":<40} {median / FILE_MB:.3f}ms/MB')
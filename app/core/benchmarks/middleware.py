@@ -0,0 +1,87 @@
+"""PerformanceMiddleware overhead on real API requests"""
+import statistics
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.benchmarks import report, seed_roster, seed_user
+from core.middleware import PerformanceMiddleware
+
+
+MIDDLEWARE = 'core.middleware.PerformanceMiddleware'
+
+
+def run(command, options):
+    user = seed_user()
+    seed_roster(user, influencers=options['influencers'],
+                tags=options['tags'])
+    token = Token.objects.create(user=user)
+    without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+    requests = [
+        ('tags', reverse('influencer:tag-list'), {}),
+        ('influencers', reverse('influencer:influencer-list'),
+         {'page_size': 50}),
+    ]
+    command.stdout.write(f'{options["influencers"]} influencers')
+
+    # the middleware's own cost around a response that does nothing
+    request = RequestFactory().get('/')
+    request.user = user
+    middleware = PerformanceMiddleware(lambda request: HttpResponse())
+    cost = report(command, 'middleware alone (per request)',
+                  lambda: middleware(request), options['repeat'] * 10)
+
+    # a second client without the middleware gives the noise floor
+    chains = {
+        'without': without,
+        'without again': without,
+        'with': [MIDDLEWARE] + without,
+    }
+    for name, url, params in requests:
+        clients = {}
+        for label, middleware in chains.items():
+            with override_settings(MIDDLEWARE=middleware):
+                # the chain is loaded on a client's first request
+                clients[label] = Client(
+                    HTTP_AUTHORIZATION=f'Token {token.key}'
+                )
+                clients[label].get(url, params)
+
+        labels = list(clients)
+        samples = {label: [] for label in labels}
+        with override_settings(INFLUENCER_RESPONSE_CACHE=False):
+            # interleaved in rotating order so drift and cache effects
+            # hit every side alike
+            for i in range(options['repeat']):
+                shift = i % len(labels)
+                for label in labels[shift:] + labels[:shift]:
+                    started = time.perf_counter()
+                    res = clients[label].get(url, params)
+                    samples[label].append(
+                        (time.perf_counter() - started) * 1000
+                    )
+                    assert res.status_code == 200
+
+        medians = {}
+        for label, values in samples.items():
+            medians[label] = statistics.median(values)
+            command.stdout.write(
+                f'{name + ": " + label:<40} median {medians[label]:9.3f}ms  '
+                f'best {min(values):9.3f}ms'
+            )
+        # both clients without the middleware make the baseline, whichever
+        # client is loaded first tends to come out a little faster
+        base = statistics.median(samples['without'] +
+                                 samples['without again'])
+        measured = (medians['with'] - base) / base * 100
+        noise = (medians['without again'] - medians['without']) / base * 100
+        command.stdout.write(
+            f'{name + ": overhead":<40} measured {measured:+.2f}%  '
+            f'noise {noise:+.2f}%  '
+            f'middleware alone {cost / base * 100:.2f}%'
+        )
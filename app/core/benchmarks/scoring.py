@@ -0,0 +1,30 @@
+"""score recomputation throughput over a seeded roster"""
+import time
+
+from core import scoring
+from core.benchmarks import seed_roster, seed_user
+from core.models import Tag, Style
+
+
+def run(command, options):
+    user = seed_user()
+    seed_roster(user, influencers=options['influencers'],
+                tags=options['tags'])
+    weights = {
+        'tags': {name: 1 + i % 3 for i, name in enumerate(
+            Tag.objects.filter(user=user).values_list('name', flat=True)
+        )},
+        'styles': {name: 2 for name in
+                   Style.objects.filter(user=user)
+                   .values_list('name', flat=True)[:3]},
+    }
+
+    for label in ('first run (every score written)',
+                  'second run (nothing changed)'):
+        started = time.perf_counter()
+        scored, changed = scoring.recompute_user(user, weights)
+        elapsed = time.perf_counter() - started
+        command.stdout.write(
+            f'{label:<40} {elapsed:8.2f}s  {scored} scored, '
+            f'{changed} changed ({scored / elapsed:.0f} rows/sec)'
+        )
@@ -0,0 +1,37 @@
+"""name / insta_id search and autocomplete latency"""
+import itertools
+import random
+
+from django.db.models import Q
+
+from core.benchmarks import report, seed_roster, seed_user
+from core.models import Influencer
+from influencer import search
+
+
+def run(command, options):
+    user = seed_user()
+    seed_roster(user, influencers=options['influencers'],
+                tags=options['tags'])
+    roster = Influencer.objects.filter(user=user)
+    rng = random.Random(0)
+    queries = [f'insta_{rng.randint(0, options["influencers"])}'[:n]
+               for n in range(3, 12)] + ['fluencer12', 'nothing']
+    command.stdout.write(f'{options["influencers"]} influencers')
+
+    next_query = itertools.cycle(queries).__next__
+
+    def sql():
+        query = next_query()
+        list(roster.filter(
+            Q(name__icontains=query) | Q(insta_id__icontains=query)
+        ).values_list('id', flat=True)[:10])
+
+    index = search.NgramIndex.build(user.id, 0)
+
+    def ngram():
+        index.autocomplete(next_query(), 10)
+
+    repeat = options['repeat'] * len(queries)
+    report(command, 'sql icontains (per query)', sql, repeat)
+    report(command, 'ngram autocomplete (per query)', ngram, repeat)
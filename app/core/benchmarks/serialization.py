@@ -0,0 +1,43 @@
+"""list serialization throughput: ModelSerializer versus values() rows"""
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.benchmarks import report, seed_roster, seed_user
+from influencer.pagination import KeysetPagination
+
+
+def run(command, options):
+    user = seed_user()
+    seed_roster(user, influencers=options['influencers'],
+                tags=options['tags'])
+    token = Token.objects.create(user=user)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+    page_size = min(options['influencers'], KeysetPagination.max_page_size)
+    lists = [
+        ('influencers', reverse('influencer:influencer-list'),
+         {'page_size': page_size}, page_size),
+        ('tags', reverse('influencer:tag-list'), {}, options['tags']),
+    ]
+    command.stdout.write(
+        f'{options["influencers"]} influencers, {options["tags"]} tags'
+    )
+
+    for name, url, params, rows in lists:
+        bodies = {}
+        for fast in (False, True):
+            def request():
+                res = client.get(url, params)
+                assert res.status_code == 200
+                bodies[fast] = res.content
+
+            label = 'values rows' if fast else 'serializer'
+            with override_settings(INFLUENCER_RESPONSE_CACHE=False,
+                                   INFLUENCER_FAST_SERIALIZATION=fast):
+                median = report(command, f'{name}: {label}', request,
+                                options['repeat'])
+            command.stdout.write(
+                f'{"":<40} {rows / median * 1000:12.0f} rows/s'
+            )
+        assert bodies[False] == bodies[True]
@@ -0,0 +1,74 @@
+"""Bulk write helpers missing from the pinned Django (2.1)"""
+from django.db import connections, router, transaction
+
+
+def bulk_update(objs, fields, batch_size=1000):
+    """save fields of already stored objects without per object queries
+
+    no signals are sent. returns the number of objects written
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+    model = type(objs[0])
+    attnames = [model._meta.get_field(name).attname for name in fields]
+    return update_rows(
+        model, fields,
+        [(obj.pk, *[getattr(obj, name) for name in attnames])
+         for obj in objs],
+        batch_size=batch_size,
+    )
+
+
+def update_rows(model, fields, rows, batch_size=1000):
+    """write (pk, *values) rows to fields of a model's table
+
+    postgres gets one UPDATE ... FROM (VALUES ...) per batch, other backends
+    a single executemany of UPDATE ... WHERE id = %s. values are prepared
+    by the model fields like save() does.
+    returns the number of rows written
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    meta = model._meta
+    model_fields = [meta.get_field(name) for name in fields]
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table, pk_column = quote(meta.db_table), quote(meta.pk.column)
+    columns = [quote(field.column) for field in model_fields]
+
+    def params(row):
+        return [field.get_db_prep_save(value, connection)
+                for field, value in zip(model_fields, row[1:])] + [row[0]]
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            if connection.vendor == 'postgresql':
+                casts = [f'%s::{field.db_type(connection)}'
+                         for field in model_fields] + \
+                    [f'%s::{meta.pk.rel_db_type(connection)}']
+                values = ', '.join([f'({", ".join(casts)})'] * len(batch))
+                assignments = ', '.join(
+                    f'{column} = v.c{i}' for i, column in enumerate(columns)
+                )
+                names = ', '.join(
+                    [f'c{i}' for i in range(len(columns))] + ['pk']
+                )
+                cursor.execute(
+                    f'UPDATE {table} SET {assignments} '
+                    f'FROM (VALUES {values}) AS v ({names}) '
+                    f'WHERE {table}.{pk_column} = v.pk',
+                    [param for row in batch for param in params(row)],
+                )
+            else:
+                assignments = ', '.join(f'{column} = %s'
+                                        for column in columns)
+                cursor.executemany(
+                    f'UPDATE {table} SET {assignments} '
+                    f'WHERE {pk_column} = %s',
+                    [params(row) for row in batch],
+                )
+    return len(rows)
@@ -0,0 +1,27 @@
+"""Whether the default cache is shared between the app's processes"""
+from django.conf import settings
+
+
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared():
+    """return whether every process of the app sees the same cache
+
+    with a process local backend whatever one process caches or deletes,
+    change versions and revoked tokens included, the others never see
+    """
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_BACKENDS
+
+
+def enabled_with_shared_cache(name):
+    """return a switch that defaults to on only with a shared cache
+
+    for features that answer from cached state and would keep serving
+    it after another process changed the data behind it
+    """
+    value = getattr(settings, name, None)
+    return is_shared() if value is None else value
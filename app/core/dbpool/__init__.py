@@ -0,0 +1,15 @@
+"""Pooled PostgreSQL backend, use with ENGINE 'core.dbpool'
+
+connections are returned to a per process pool when Django closes them
+and handed to the next request after a health check. the pool is set up
+with a POOL dict next to the other DATABASES keys:
+
+    'POOL': {
+        'MAX_SIZE': 10,     # open connections per process
+        'MIN_SIZE': 1,      # opened and checked by warm_pool()
+        'MAX_AGE': 1800,    # seconds before a connection is replaced
+        'TIMEOUT': 10,      # seconds to wait for a free connection
+        'CHECK_IDLE': 5,    # ping connections idle this long before reuse
+    }
+"""
+from core.dbpool.pool import close_pools, stats  # noqa: F401
@@ -0,0 +1,119 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as \
+    PostgresDatabaseCreation
+from psycopg2 import extensions
+
+from core.dbpool.pool import ConnectionPool, PoolTimeout, close_pools, \
+    get_pool
+
+
+Database = base.Database
+
+POOL_DEFAULTS = {
+    'MAX_SIZE': 10,
+    'MIN_SIZE': 1,
+    'MAX_AGE': 1800,
+    'TIMEOUT': 10,
+    'CHECK_IDLE': 5,
+}
+
+
+def check_connection(conn):
+    """return whether an idle connection still answers"""
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if conn.get_transaction_status() != \
+                extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+def reset_connection(conn):
+    """roll back leftovers of a returned connection, False if it's broken"""
+    if conn.closed:
+        return False
+    status = conn.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    return True
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections would block DROP DATABASE
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL wrapper checking connections out of a process wide pool"""
+    creation_class = DatabaseCreation
+
+    pool = None
+
+    def get_pool(self, conn_params=None):
+        """return the pool for this alias and connection parameters"""
+        if conn_params is None:
+            conn_params = self.get_connection_params()
+        options = dict(POOL_DEFAULTS, **self.settings_dict.get('POOL', {}))
+        key = tuple(sorted((name, repr(value))
+                           for name, value in conn_params.items()))
+
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+
+        def connect():
+            connection = Database.connect(**conn_params)
+            if isolation_level is not None and \
+                    connection.isolation_level != isolation_level:
+                connection.set_session(isolation_level=isolation_level)
+            return connection
+
+        return get_pool(self.alias, key, lambda: ConnectionPool(
+            connect,
+            max_size=options['MAX_SIZE'],
+            min_size=options['MIN_SIZE'],
+            max_age=options['MAX_AGE'],
+            timeout=options['TIMEOUT'],
+            check_idle=options['CHECK_IDLE'],
+            check=check_connection,
+            reset=reset_connection,
+        ))
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        try:
+            connection = pool.get()
+        except PoolTimeout as exc:
+            raise Database.OperationalError(str(exc))
+        self.pool = pool
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # a close inside atomic() keeps self.connection around, so the
+        # connection can't be handed to anyone else
+        with self.wrap_database_errors:
+            self.pool.put(self.connection, discard=self.in_atomic_block)
+
+    def warm_pool(self):
+        """open and check the pool's MIN_SIZE connections, returns its size
+
+        raises OperationalError when the database can't be reached
+        """
+        with self.wrap_database_errors:
+            try:
+                return self.get_pool().warm()
+            except (ConnectionError, PoolTimeout) as exc:
+                raise Database.OperationalError(str(exc))
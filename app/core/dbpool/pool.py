@@ -0,0 +1,246 @@
+"""A thread-safe pool of DB-API connections
+
+the pool knows nothing about the database driver: it is given a connect
+factory plus optional check (before reuse) and reset (on return) hooks,
+which keeps it testable with fake connections
+"""
+import collections
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """raised when no connection frees up within the pool's timeout"""
+
+
+_Entry = collections.namedtuple('_Entry', 'conn created returned')
+
+
+class ConnectionPool:
+    """Hand out at most max_size connections, reusing idle ones
+
+    idle connections older than max_age seconds are closed instead of
+    reused. connections idle for check_idle seconds or more are passed to
+    check() first and replaced when it returns False
+    """
+
+    def __init__(self, connect, max_size=10, min_size=1, max_age=1800,
+                 timeout=10, check_idle=5, check=None, reset=None,
+                 clock=time.monotonic):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.connect = connect
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.check = check
+        self.reset = reset
+        self.clock = clock
+        self._idle = collections.deque()
+        self._created = {}
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._counters = collections.Counter()
+        self._wait_time = 0.0
+
+    @property
+    def size(self):
+        """the number of open connections, idle or checked out"""
+        return len(self._created)
+
+    def _expired(self, created):
+        return self.max_age is not None and \
+            self.clock() - created >= self.max_age
+
+    def _count(self, name):
+        with self._cond:
+            self._counters[name] += 1
+
+    def _open(self):
+        """connect outside the lock, the slot is reserved by the caller"""
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._pending -= 1
+            self._counters['connects'] += 1
+            self._created[id(conn)] = self.clock()
+        return conn
+
+    def _close(self, conn):
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _take(self, deadline):
+        """return an idle entry, or None once a new slot is reserved"""
+        with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._created) + self._pending < self.max_size:
+                    self._pending += 1
+                    return None
+                if not waited:
+                    self._counters['waits'] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'no connection available within {self.timeout}s '
+                        f'({self.max_size} in use)'
+                    )
+                started = time.monotonic()
+                self._cond.wait(remaining)
+                self._wait_time += time.monotonic() - started
+
+    def get(self):
+        """check out a connection, waiting up to timeout for a free one"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = self._take(deadline)
+            if entry is None:
+                conn = self._open()
+                break
+            if self._expired(entry.created):
+                self._count('recycled')
+                self._close(entry.conn)
+                continue
+            if self.check is not None and \
+                    self.clock() - entry.returned >= self.check_idle and \
+                    not self.check(entry.conn):
+                self._count('failed_checks')
+                self._close(entry.conn)
+                continue
+            conn = entry.conn
+            break
+        self._count('checkouts')
+        return conn
+
+    def put(self, conn, discard=False):
+        """return a checked out connection, closing it when discard is set"""
+        with self._cond:
+            created = self._created.get(id(conn))
+        if created is None:
+            return
+        usable = not discard
+        if usable and self.reset is not None:
+            try:
+                usable = self.reset(conn)
+            except Exception:
+                usable = False
+        if usable and self._expired(created):
+            self._count('recycled')
+            usable = False
+        if not usable:
+            self._close(conn)
+            return
+        with self._cond:
+            self._idle.append(_Entry(conn, created, self.clock()))
+            self._cond.notify()
+
+    def warm(self):
+        """open and check connections up to min_size, returns the size
+
+        raises ConnectionError when a connection fails its check
+        """
+        conns = []
+        failed = False
+        try:
+            while len(conns) < self.min_size:
+                conns.append(self.get())
+            for conn in conns:
+                if self.check is not None and not self.check(conn):
+                    self._count('failed_checks')
+                    failed = True
+        finally:
+            for conn in conns:
+                self.put(conn, discard=failed)
+        if failed:
+            raise ConnectionError('pooled connection failed its check')
+        return self.size
+
+    def close(self):
+        """close the idle connections, checked out ones close on return"""
+        with self._cond:
+            idle, self._idle = list(self._idle), collections.deque()
+        for entry in idle:
+            self._close(entry.conn)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            size = len(self._created)
+            return {
+                'size': size,
+                'idle': idle,
+                'in_use': size - idle,
+                'max_size': self.max_size,
+                'checkouts': self._counters['checkouts'],
+                'connects': self._counters['connects'],
+                'waits': self._counters['waits'],
+                'wait_seconds': round(self._wait_time, 6),
+                'timeouts': self._counters['timeouts'],
+                'failed_checks': self._counters['failed_checks'],
+                'recycled': self._counters['recycled'],
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, key, factory):
+    """return the pool for (alias, key), creating it with factory()"""
+    with _pools_lock:
+        pool = _pools.get((alias, key))
+        if pool is None:
+            pool = _pools[(alias, key)] = factory()
+        return pool
+
+
+def stats():
+    """return {alias: pool stats} of this process, summed per alias"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    result = {}
+    for (alias, _), pool in pools:
+        current = pool.stats()
+        if alias in result:
+            current = {name: result[alias][name] + value
+                       for name, value in current.items()}
+        result[alias] = current
+    return result
+
+
+def close_pools():
+    """close every idle pooled connection of this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def _forget_pools():
+    # a forked child shares the parent's sockets, closing them would end
+    # the parent's sessions, so the child just starts with empty pools
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_pools)
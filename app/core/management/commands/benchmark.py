@@ -0,0 +1,29 @@
+from importlib import import_module
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    """django command to run a benchmark suite from core.benchmarks"""
+    help = 'Run a benchmark suite against throwaway seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite')
+        parser.add_argument('--influencers', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--filter-size', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        name = f'core.benchmarks.{options["suite"]}'
+        try:
+            suite = import_module(name)
+        except ModuleNotFoundError as exc:
+            if exc.name != name:
+                raise
+            raise CommandError(f'Unknown benchmark suite "{options["suite"]}"')
+
+        with transaction.atomic():
+            suite.run(self, options)
+            transaction.set_rollback(True)
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from influencer import leaderboard
+from influencer.cache import get_user_version
+
+
+class Command(BaseCommand):
+    """django command to compare cached leaderboards against sql"""
+    help = 'Check that the cached top-K leaderboards match the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users',
+                            help='email of a user to check, repeatable; '
+                                 'every user when omitted')
+        parser.add_argument('--fix', action='store_true',
+                            help='drop inconsistent boards so they are '
+                                 'rebuilt on the next read')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['users']:
+            users = users.filter(email__in=options['users'])
+
+        checked, broken = 0, []
+        for user in users.iterator():
+            version = get_user_version(user.id)
+            for metric, facet in sorted(leaderboard.registered(user.id),
+                                        key=repr):
+                board = leaderboard.load(user.id, metric, facet)
+                if board is None or board.version != version:
+                    continue
+                checked += 1
+                count = len(board.entries)
+                # a complete board must also hold the facet's last row
+                expected = leaderboard.top_entries(user.id, metric, facet,
+                                                   count + 1)
+                if not board.complete:
+                    expected = expected[:count]
+                if board.entries != expected:
+                    broken.append((user, metric, facet))
+                    self.stdout.write(self.style.ERROR(
+                        f'{user.email}: {metric} {facet[0]} {facet[1]} '
+                        f'does not match the database'
+                    ))
+                    if options['fix']:
+                        cache.delete(
+                            leaderboard.board_key(user.id, metric, facet)
+                        )
+
+        if broken and not options['fix']:
+            raise CommandError(
+                f'{len(broken)} of {checked} leaderboards are inconsistent'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} leaderboards, {len(broken)} inconsistent'
+            + (' and dropped' if broken else '')
+        ))
@@ -0,0 +1,196 @@
+import csv
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+
+from core.models import Tag, Style, Influencer
+from influencer.cache import bump_user_version
+
+
+INFLUENCER_FIELDS = ('name', 'insta_id', 'followers', 'insta_link', 'score')
+NAME_SEPARATOR = '|'
+
+
+def read_csv(fileobj):
+    """yield (line number, row dict) from a csv file"""
+    reader = csv.DictReader(fileobj)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(fileobj):
+    """yield (line number, row dict) from a newline delimited json file"""
+    for line_num, line in enumerate(fileobj, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except ValueError as exc:
+            raise CommandError(f'line {line_num}: invalid json ({exc})')
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+
+def split_names(value):
+    """return a list of tag/style names from a list or a | separated str"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(NAME_SEPARATOR)
+    return [str(name).strip() for name in value if str(name).strip()]
+
+
+def batched(rows, size):
+    """group an iterable into lists of at most size items"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def resolve_names(model, user, names):
+    """return a name -> id map, creating the names that don't exist yet"""
+    if not names:
+        return {}
+    resolved = {}
+    existing = model.objects.filter(user=user, name__in=names)\
+        .order_by('id').values_list('name', 'id')
+    for name, pk in existing:
+        resolved.setdefault(name, pk)
+    missing = [name for name in names if name not in resolved]
+    if missing:
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing]
+        )
+        created = model.objects.filter(user=user, name__in=missing)\
+            .order_by('id').values_list('name', 'id')
+        for name, pk in created:
+            resolved.setdefault(name, pk)
+    return resolved
+
+
+class Command(BaseCommand):
+    """django command to bulk import influencers from a csv/ndjson file"""
+    help = 'Stream influencers from a CSV or NDJSON file into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True,
+                            help='email of the user owning the influencers')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='file format, guessed from the extension '
+                                 'when omitted')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt == 'jsonl':
+            fmt = 'ndjson'
+        if fmt not in READERS:
+            raise CommandError(f'Unknown file format "{fmt}"')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User "{options["user"]}" does not exist')
+
+        total = 0
+        started = time.monotonic()
+        # all or nothing, a bad row fails the import before anything of
+        # it is visible
+        with open(path, newline='', encoding='utf-8') as fileobj, \
+                transaction.atomic():
+            rows = READERS[fmt](fileobj)
+            for batch in batched(rows, options['batch_size']):
+                total += self.import_batch(user, batch)
+                reset_queries()
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{total} rows imported '
+                    f'({total / max(elapsed, 1e-9):.0f} rows/sec)'
+                )
+            transaction.on_commit(lambda: bump_user_version(user.id))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {total} influencers in {elapsed:.2f}s '
+            f'({total / max(elapsed, 1e-9):.0f} rows/sec)'
+        ))
+
+    def parse_row(self, line_num, row):
+        """return an unsaved influencer plus its tag and style names"""
+        values = {
+            field: row.get(field) for field in INFLUENCER_FIELDS
+            if row.get(field) not in (None, '')
+        }
+        if not values.get('name'):
+            raise CommandError(f'line {line_num}: name is required')
+        values.setdefault('followers', 0)
+        values.setdefault('insta_id', '')
+        values.setdefault('insta_link', '')
+        for field, value in values.items():
+            model_field = Influencer._meta.get_field(field)
+            try:
+                values[field] = model_field.to_python(value)
+                model_field.run_validators(values[field])
+            except ValidationError:
+                raise CommandError(
+                    f'line {line_num}: invalid {field} value {value!r}'
+                )
+
+        return (
+            Influencer(**values),
+            split_names(row.get('tags')),
+            split_names(row.get('styles')),
+        )
+
+    def import_batch(self, user, batch):
+        """write one batch of rows, returns the number of rows written"""
+        parsed = [self.parse_row(line_num, row) for line_num, row in batch]
+        tag_ids = resolve_names(
+            Tag, user, sorted({n for _, tags, _ in parsed for n in tags})
+        )
+        style_ids = resolve_names(
+            Style, user, sorted({n for _, _, styles in parsed for n in styles})
+        )
+
+        influencers = [influencer for influencer, _, _ in parsed]
+        for influencer in influencers:
+            influencer.user = user
+        if connection.features.can_return_ids_from_bulk_insert:
+            Influencer.objects.bulk_create(influencers)
+        else:
+            for influencer in influencers:
+                influencer.save(force_insert=True)
+
+        TagThrough = Influencer.tags.through
+        StyleThrough = Influencer.styles.through
+        TagThrough.objects.bulk_create([
+            TagThrough(influencer_id=influencer.id, tag_id=tag_ids[name])
+            for influencer, tags, _ in parsed
+            for name in dict.fromkeys(tags)
+        ])
+        StyleThrough.objects.bulk_create([
+            StyleThrough(influencer_id=influencer.id,
+                         style_id=style_ids[name])
+            for influencer, _, styles in parsed
+            for name in dict.fromkeys(styles)
+        ])
+
+        return len(influencers)
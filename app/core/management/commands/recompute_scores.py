@@ -0,0 +1,71 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import scoring
+
+
+class Command(BaseCommand):
+    """django command to recompute influencer scores in batches"""
+    help = 'Recompute Influencer.score from followers and tag/style weights'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users',
+                            help='email of a user to rescore, repeatable; '
+                                 'every user when omitted')
+        parser.add_argument('--weights',
+                            help='json file overriding '
+                                 'INFLUENCER_SCORE_WEIGHTS')
+        parser.add_argument('--chunk-size', type=int, default=50000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--chunk-size and --batch-size must be '
+                               'positive')
+        weights = self.load_weights(options['weights'])
+
+        users = get_user_model().objects.order_by('id')
+        if options['users']:
+            users = users.filter(email__in=options['users'])
+            missing = set(options['users']) - \
+                set(users.values_list('email', flat=True))
+            if missing:
+                raise CommandError(
+                    f'User "{sorted(missing)[0]}" does not exist'
+                )
+
+        total = 0
+        started = time.monotonic()
+        for user in users.iterator():
+            scored, changed = scoring.recompute_user(
+                user, weights,
+                chunk_size=options['chunk_size'],
+                batch_size=options['batch_size'],
+            )
+            total += scored
+            if scored:
+                self.stdout.write(
+                    f'{user.email}: {scored} scored, {changed} changed'
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {total} influencers in {elapsed:.2f}s '
+            f'({total / max(elapsed, 1e-9):.0f} rows/sec)'
+        ))
+
+    def load_weights(self, path):
+        """return the weights from a json file, None without a file"""
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as fileobj:
+                weights = json.load(fileobj)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not read weights: {exc}')
+        if not isinstance(weights, dict):
+            raise CommandError('Weights must be a json object')
+        return weights
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import metrics, server
+from core.cache import is_shared
+
+
+def default_workers():
+    return int(os.environ.get('WEB_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+
+
+class Command(BaseCommand):
+    """django command to serve the app with prefork workers"""
+    help = 'Serve app.wsgi.application with preloaded, recycled workers'
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='0.0.0.0:8000',
+                            help='host:port to listen on')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='worker processes, defaults to '
+                                 '$WEB_WORKERS or 2 * cpus + 1')
+        parser.add_argument('--threads', type=int,
+                            default=int(os.environ.get('WEB_THREADS', 4)),
+                            help='request threads per worker')
+        parser.add_argument('--max-requests', type=int,
+                            default=int(os.environ.get('WEB_MAX_REQUESTS',
+                                                       1000)),
+                            help='recycle a worker after this many '
+                                 'requests, 0 to disable')
+        parser.add_argument('--max-requests-jitter', type=int, default=100)
+        parser.add_argument('--max-rss', type=int,
+                            default=int(os.environ.get('WEB_MAX_RSS_MB', 0)),
+                            help='recycle a worker above this RSS in MiB, '
+                                 '0 to disable')
+        parser.add_argument('--graceful-timeout', type=float, default=30,
+                            help='seconds workers get to drain on SIGTERM')
+        parser.add_argument('--timeout', type=float,
+                            default=float(os.environ.get('WEB_TIMEOUT', 30)),
+                            help='seconds a connection may stay idle on a '
+                                 'read or write, 0 to disable')
+        parser.add_argument('--backlog', type=int, default=2048)
+        parser.add_argument('--access-log', action='store_true')
+
+    def handle(self, *args, **options):
+        host, _, port = options['bind'].rpartition(':')
+        try:
+            port = int(port)
+        except ValueError:
+            raise CommandError(f'Invalid --bind "{options["bind"]}"')
+        workers = options['workers'] or default_workers()
+        if workers < 1 or options['threads'] < 1:
+            raise CommandError('--workers and --threads must be positive')
+        if workers > 1 and not is_shared():
+            # every worker would keep its own change versions and serve
+            # cached data the others already changed
+            raise CommandError(
+                'The default cache is local to each process, configure a '
+                'shared cache (MEMCACHED_LOCATION) or run one worker'
+            )
+
+        sock = server.bind(host.strip('[]') or '0.0.0.0', port,
+                           options['backlog'])
+        app = server.load_application()
+        master = server.Master(
+            sock, app,
+            workers=workers,
+            threads=options['threads'],
+            max_requests=options['max_requests'],
+            max_requests_jitter=options['max_requests_jitter'],
+            max_rss=options['max_rss'] * 2 ** 20,
+            graceful_timeout=options['graceful_timeout'],
+            timeout=options['timeout'],
+            access_log=options['access_log'],
+            log=self.stderr.write,
+        )
+        # every worker writes its metrics there for /metrics to add up
+        metrics_dir = getattr(settings, 'METRICS_DIR', None)
+        temporary = metrics_dir is None
+        if temporary:
+            metrics_dir = tempfile.mkdtemp(prefix='metrics-')
+        os.makedirs(metrics_dir, exist_ok=True)
+        metrics.set_directory(metrics_dir, clear=True)
+
+        try:
+            killed = master.run()
+        finally:
+            metrics.set_directory(None)
+            if temporary:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+        if killed:
+            raise CommandError(f'{killed} workers killed after the '
+                               f'graceful timeout')
@@ -2,20 +2,49 @@ import time
 
 from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+
+INITIAL_DELAY = 0.5
+MAX_DELAY = 5
 
 
 class Command(BaseCommand):
     """django command to pause execuation until db is available"""
 
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--timeout', type=float, default=120,
+                            help='seconds to wait before giving up')
+
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delay = INITIAL_DELAY
+        while True:
             try:
-                db_conn = connections['default']
+                pool_size = self.check_database(options['database'])
+                break
             except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                if time.monotonic() + delay > deadline:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]:g}s'
+                    )
+                self.stdout.write(
+                    f'Database unavailable, waiting {delay:g} seconds...'
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_DELAY)
 
         self.stdout.write(self.style.SUCCESS('Database availalbe!'))
+        if pool_size is not None:
+            self.stdout.write(f'Connection pool ready ({pool_size} open)')
+
+    def check_database(self, alias):
+        """run a query, returns the warmed pool size of pooled backends"""
+        db_conn = connections[alias]
+        with db_conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # the pooled backend opens and checks its connections
+        warm_pool = getattr(db_conn, 'warm_pool', None)
+        return warm_pool() if warm_pool is not None else None
@@ -0,0 +1,373 @@
+"""Request metrics rendered in the Prometheus text format
+
+requests only queue their numbers, they are counted into the histograms
+in batches, so observing stays cheap enough to be on in production.
+every process counts on its own. under
+`manage.py serve` each worker also writes its numbers to a file in a
+directory shared with the others (set_directory) about once a second,
+and a scrape answered by any worker adds up the files of all of them.
+the master folds the files of exited workers into one, so the totals
+never go back when workers are recycled
+"""
+import bisect
+import collections
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from core.dbpool import stats as pool_stats
+from influencer.cache import cache_stats
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, one series per label"""
+
+    def __init__(self, name, help, buckets, lock=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        # histograms observed together can share one lock
+        self._lock = lock or threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            self._observe(label, value)
+
+    def _observe(self, label, value):
+        """observe() with the lock already held"""
+        series = self._series.get(label)
+        if series is None:
+            # per bucket counts, the +Inf count and the sum
+            series = self._series[label] = \
+                [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def raw(self):
+        """return {label: [per bucket counts with +Inf last, sum]}"""
+        with self._lock:
+            return {label: [list(counts), total]
+                    for label, (counts, total) in self._series.items()}
+
+    def snapshot(self):
+        """return {label: (cumulative bucket counts, count, sum)}"""
+        return cumulative(self.raw())
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+def cumulative(series):
+    """turn raw() series into {label: (cumulative counts, count, sum)}"""
+    result = {}
+    for label, (counts, total) in series.items():
+        buckets, running = [], 0
+        for count in counts:
+            running += count
+            buckets.append(running)
+        result[label] = (buckets[:-1], running, total)
+    return result
+
+
+def _labels(**labels):
+    return ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\')
+                     .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestHistogram(Histogram):
+    """Histogram of the numbers queued by observe_request()"""
+
+    def raw(self):
+        count_requests()
+        return super().raw()
+
+
+# the request histograms share one lock, count_requests() takes it once
+# for all of them
+_request_lock = threading.Lock()
+# numbers of the requests observed but not counted yet
+_pending = collections.deque()
+# more queued requests are counted right away by observe_request()
+PENDING_MAX = 1000
+
+REQUEST_SECONDS = RequestHistogram(
+    'http_request_duration_seconds',
+    'Total request time by view', LATENCY_BUCKETS, _request_lock,
+)
+DB_SECONDS = RequestHistogram(
+    'http_request_db_seconds',
+    'Time spent in SQL queries per request by view', LATENCY_BUCKETS,
+    _request_lock,
+)
+SERIALIZE_SECONDS = RequestHistogram(
+    'http_request_serialize_seconds',
+    'Time spent serializing the response data outside SQL by view',
+    LATENCY_BUCKETS, _request_lock,
+)
+RENDER_SECONDS = RequestHistogram(
+    'http_request_render_seconds',
+    'Time spent rendering the response to JSON by view',
+    LATENCY_BUCKETS, _request_lock,
+)
+QUERIES = RequestHistogram(
+    'http_request_queries',
+    'SQL queries per request by view', QUERY_BUCKETS, _request_lock,
+)
+HISTOGRAMS = (REQUEST_SECONDS, DB_SECONDS, SERIALIZE_SECONDS, RENDER_SECONDS,
+              QUERIES)
+
+
+def observe_request(view, total, db, queries, serialize, render):
+    """record the timings (in seconds) of one request
+
+    they are only queued, touching the histograms after every request
+    costs more than counting them later in a batch
+    """
+    _pending.append((view, total, db, queries, serialize, render))
+    if len(_pending) >= PENDING_MAX:
+        count_requests()
+
+
+def count_requests():
+    """count the queued requests into the request histograms"""
+    with _request_lock:
+        while True:
+            try:
+                view, total, db, queries, serialize, render = \
+                    _pending.popleft()
+            except IndexError:
+                return
+            REQUEST_SECONDS._observe(view, total)
+            DB_SECONDS._observe(view, db)
+            SERIALIZE_SECONDS._observe(view, serialize)
+            RENDER_SECONDS._observe(view, render)
+            QUERIES._observe(view, queries)
+
+
+def reset():
+    _pending.clear()
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+
+def _histogram_lines(histogram, series):
+    yield f'# HELP {histogram.name} {histogram.help}'
+    yield f'# TYPE {histogram.name} histogram'
+    for view, (buckets, count, total) in sorted(cumulative(series).items()):
+        for bound, value in zip(histogram.buckets, buckets):
+            yield '%s_bucket{%s} %d' % (
+                histogram.name, _labels(view=view, le=bound), value
+            )
+        yield '%s_bucket{%s} %d' % (
+            histogram.name, _labels(view=view, le='+Inf'), count
+        )
+        yield '%s_sum{%s} %s' % (histogram.name, _labels(view=view),
+                                 _number(total))
+        yield '%s_count{%s} %d' % (histogram.name, _labels(view=view), count)
+
+
+def _cache_lines(cache):
+    name = 'influencer_response_cache_total'
+    yield f'# HELP {name} Response cache lookups by result'
+    yield f'# TYPE {name} counter'
+    for result, count in sorted(cache.items()):
+        yield '%s{%s} %d' % (name, _labels(result=result), count)
+
+
+POOL_METRICS = (
+    ('size', 'gauge', 'Open pooled connections'),
+    ('idle', 'gauge', 'Idle pooled connections'),
+    ('in_use', 'gauge', 'Checked out pooled connections'),
+    ('max_size', 'gauge', 'Pool size limit'),
+    ('checkouts', 'counter', 'Connections checked out'),
+    ('connects', 'counter', 'New connections opened'),
+    ('waits', 'counter', 'Checkouts that waited for a free connection'),
+    ('wait_seconds', 'counter', 'Time spent waiting for a connection'),
+    ('timeouts', 'counter', 'Checkouts that gave up waiting'),
+    ('failed_checks', 'counter', 'Connections replaced after a failed check'),
+    ('recycled', 'counter', 'Connections replaced for their age'),
+)
+POOL_GAUGES = {field for field, kind, _ in POOL_METRICS if kind == 'gauge'}
+
+
+def _pool_lines(pools):
+    if not pools:
+        return
+    for field, kind, help in POOL_METRICS:
+        name = f'db_pool_{field}'
+        if kind == 'counter':
+            name += '_total'
+        yield f'# HELP {name} {help}'
+        yield f'# TYPE {name} {kind}'
+        for alias, values in sorted(pools.items()):
+            yield '%s{%s} %s' % (name, _labels(alias=alias),
+                                 _number(values.get(field, 0)))
+
+
+def state():
+    """return the metrics of this process as json serializable data"""
+    return {
+        'histograms': {histogram.name: histogram.raw()
+                       for histogram in HISTOGRAMS},
+        'cache': cache_stats(),
+        'pools': pool_stats(),
+    }
+
+
+def merge(states, gauges=True):
+    """add up states, without the pool gauges unless gauges is true"""
+    merged = {'histograms': {}, 'cache': {}, 'pools': {}}
+    for current in states:
+        for name, series in current.get('histograms', {}).items():
+            target = merged['histograms'].setdefault(name, {})
+            for label, (counts, total) in series.items():
+                if label not in target:
+                    target[label] = [[0] * len(counts), 0.0]
+                summed = target[label]
+                summed[0] = [a + b for a, b in zip(summed[0], counts)]
+                summed[1] += total
+        for result, count in current.get('cache', {}).items():
+            merged['cache'][result] = merged['cache'].get(result, 0) + count
+        for alias, values in current.get('pools', {}).items():
+            target = merged['pools'].setdefault(alias, {})
+            for field, value in values.items():
+                if gauges or field not in POOL_GAUGES:
+                    target[field] = target.get(field, 0) + value
+    return merged
+
+
+_directory = None
+RETIRED = 'retired.json'
+
+
+def set_directory(path, clear=False):
+    """share the metrics of every process through files in path
+
+    None goes back to process local metrics. with clear the files of an
+    earlier run are removed
+    """
+    global _directory
+    _directory = path
+    if path is not None and clear:
+        for name in glob.glob(os.path.join(path, '*.json')):
+            os.remove(name)
+
+
+def _worker_path(pid):
+    return os.path.join(_directory, f'worker-{pid}.json')
+
+
+def _read(path):
+    try:
+        with open(path) as fileobj:
+            return json.load(fileobj)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=_directory, prefix='.metrics-')
+    try:
+        with os.fdopen(fd, 'w') as out:
+            json.dump(data, out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def flush():
+    """write this process's metrics to the shared directory, if any"""
+    if _directory is not None:
+        _write(_worker_path(os.getpid()), state())
+
+
+def _flush_forever(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Failed to write the metrics of this worker')
+
+
+def start_flusher(interval=1.0):
+    """flush this process's metrics every interval seconds on a thread
+
+    called in each forked worker, threads don't survive the fork
+    """
+    if _directory is None:
+        return
+    threading.Thread(target=_flush_forever, args=(interval,),
+                     name='metrics', daemon=True).start()
+
+
+def retire(pid):
+    """fold the file of an exited worker into the retired totals
+
+    its counters keep counting in the sums, its gauges are dropped. the
+    retired file lists the pids folded in so a scrape racing this never
+    counts a worker twice
+    """
+    if _directory is None:
+        return
+    path = _worker_path(pid)
+    final = _read(path)
+    retired_path = os.path.join(_directory, RETIRED)
+    retired = _read(retired_path) or {'pids': []}
+    pids = [other for other in retired['pids']
+            if os.path.exists(_worker_path(other))]
+    if final is not None:
+        retired = dict(merge([retired, final], gauges=False), pids=pids)
+        retired['pids'].append(pid)
+        _write(retired_path, retired)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def collect():
+    """return the metrics of every process sharing the directory"""
+    if _directory is None:
+        return state()
+    flush()
+    retired = _read(os.path.join(_directory, RETIRED)) or {'pids': []}
+    folded = {_worker_path(pid) for pid in retired['pids']}
+    states = [retired]
+    for path in sorted(glob.glob(os.path.join(_directory, 'worker-*.json'))):
+        if path not in folded:
+            current = _read(path)
+            if current is not None:
+                states.append(current)
+    return merge(states)
+
+
+def render():
+    """return the metrics of every worker in the Prometheus text format"""
+    collected = collect()
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(_histogram_lines(
+            histogram, collected['histograms'].get(histogram.name, {})
+        ))
+    lines.extend(_cache_lines(collected['cache']))
+    lines.extend(_pool_lines(collected['pools']))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,207 @@
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from rest_framework.serializers import ListSerializer
+
+from core import metrics, querycheck
+
+
+class RequestTimings:
+    """SQL, serialization and render timings of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self._render_started = None
+
+    def render_started(self):
+        self._render_started = time.perf_counter()
+
+    def render_finished(self, response):
+        if self._render_started is not None:
+            self.render += time.perf_counter() - self._render_started
+            self._render_started = None
+
+    def serializing(self, func, *args):
+        """call func, counting its time outside SQL as serialization"""
+        started = time.perf_counter()
+        db = self.db
+        try:
+            return func(*args)
+        finally:
+            in_sql = self.db - db
+            self.serialize += time.perf_counter() - started - in_sql
+
+
+_current = threading.local()
+
+
+def time_query(execute, sql, params, many, context):
+    """execute_wrapper counting queries into the current request's timings
+
+    added to every connection once as it opens, see core.signals
+    """
+    timings = getattr(_current, 'timings', None)
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - started
+        timings.queries += 1
+
+
+class TimedData:
+    """Serializer mixin counting .data as the request's serialization"""
+
+    @property
+    def data(self):
+        timings = getattr(_current, 'timings', None)
+        if timings is None:
+            return super().data
+        return timings.serializing(lambda: super(TimedData, self).data)
+
+
+_timed_classes = {}
+
+
+def timed_serializer_class(cls):
+    """return a subclass of serializer class cls with TimedData in front
+
+    made once per class, it keeps the name of cls and passes isinstance()
+    checks. its list_serializer_class is timed as well, for many=True
+    """
+    timed = cls if issubclass(cls, TimedData) else _timed_classes.get(cls)
+    if timed is None:
+        meta = getattr(cls, 'Meta', object)
+        list_class = getattr(meta, 'list_serializer_class', ListSerializer)
+        timed_list = type(list_class)(
+            list_class.__name__, (TimedData, list_class),
+            {'__module__': list_class.__module__},
+        )
+        timed = _timed_classes[cls] = type(cls)(
+            cls.__name__, (TimedData, cls), {
+                '__module__': cls.__module__,
+                'Meta': type('Meta', (meta,),
+                             {'list_serializer_class': timed_list}),
+            },
+        )
+    return timed
+
+
+@functools.lru_cache(maxsize=1024)
+def view_name(view_func, method):
+    """return a label like InfluencerViewSet.list for a resolved view"""
+    cls = getattr(view_func, 'cls', None) or \
+        getattr(view_func, 'view_class', None)
+    if cls is None:
+        return getattr(view_func, '__name__', type(view_func).__name__)
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return f'{cls.__name__}.{actions.get(method.lower(), method)}'
+    return cls.__name__
+
+
+class PerformanceMiddleware:
+    """Time every request and aggregate it into the /metrics histograms
+
+    records the SQL query count and time through time_query(), the
+    serialization of the response data by views using
+    timed_serializer_class(), its rendering to JSON and the total per
+    view. staff users also get the numbers back in a Server-Timing header.
+    the request's timings are kept in a thread local for the code that
+    has no request at hand. place it first in MIDDLEWARE so the total
+    covers the other middleware, PERFORMANCE_METRICS = False turns it off
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timings = request._timings = _current.timings = RequestTimings()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.timings = None
+        total = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = 'unmatched' if match is None else \
+            view_name(match.func, request.method)
+        metrics.observe_request(view, total, timings.db,
+                                timings.queries, timings.serialize,
+                                timings.render)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = self.server_timing(timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = getattr(request, '_timings', None)
+        if timings is not None:
+            timings.render_started()
+            response.add_post_render_callback(timings.render_finished)
+        return response
+
+    @staticmethod
+    def server_timing(timings, total):
+        app = max(
+            total - timings.db - timings.serialize - timings.render, 0
+        )
+        return ', '.join([
+            f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries"',
+            f'serialize;dur={timings.serialize * 1000:.2f};'
+            f'desc="serialization"',
+            f'render;dur={timings.render * 1000:.2f};desc="json rendering"',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+class QueryDetectorMiddleware:
+    """Report N+1 and slow queries per request and check query budgets
+
+    opt-in with QUERY_DETECTOR = True, meant for staging and for the
+    core.testrunner.QueryCheckRunner test runner. problems are logged to
+    the core.querycheck logger. with QUERY_BUDGET_STRICT = True a view
+    running more queries than its query_budget raises QueryBudgetExceeded
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_DETECTOR', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        log = request._query_log = querycheck.QueryLog()
+        request._query_view = ('unmatched', None)
+        wrapped = connections.all()
+        for connection in wrapped:
+            connection.execute_wrappers.append(log)
+        try:
+            response = self.get_response(request)
+        finally:
+            for connection in wrapped:
+                connection.execute_wrappers.remove(log)
+
+        view, budget = request._query_view
+        querycheck.check(log, view, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_query_log'):
+            request._query_view = (
+                view_name(view_func, request.method),
+                querycheck.query_budget(view_func, request.method),
+            )
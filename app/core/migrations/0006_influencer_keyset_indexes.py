@@ -0,0 +1,29 @@
+# Generated by Django 2.1.15 on 2026-10-17 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_auto_20190411_1621'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='influencer',
+            index=models.Index(fields=['user', 'id'], name='core_infl_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='influencer',
+            index=models.Index(fields=['user', 'followers', 'id'], name='core_infl_user_followers_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='influencer',
+            index=models.Index(fields=['user', 'score', 'id'], name='core_infl_user_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='influencer',
+            index=models.Index(fields=['user', 'name', 'id'], name='core_infl_user_name_idx'),
+        ),
+    ]
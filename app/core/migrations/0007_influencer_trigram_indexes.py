@@ -0,0 +1,40 @@
+# Generated by Django 2.1.15 on 2026-10-17 18:23
+
+from django.db import migrations
+
+
+# icontains/istartswith compile to UPPER("col"::text) LIKE UPPER(...) on
+# postgres, so the trigram indexes are built over the same expression
+INDEXES = (
+    ('core_infl_name_trgm_idx', 'name'),
+    ('core_infl_insta_id_trgm_idx', 'insta_id'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON core_influencer '
+            f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_influencer_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
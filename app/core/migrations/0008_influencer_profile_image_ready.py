@@ -0,0 +1,52 @@
+# Generated by Django 2.1.15 on 2026-10-17 20:26
+
+import os
+
+from django.db import migrations, models
+
+
+# the derivative names, sizes and formats of influencer.images when this
+# migration was written, it must not follow later changes to that module
+DERIVATIVES_DIR = 'derivatives/influencer/'
+SIZES = (64, 256, 1024)
+EXTENSIONS = ('jpg', 'webp')
+
+
+def derivative_names(name):
+    base = os.path.basename(name).replace('.', '_')
+    return [f'{DERIVATIVES_DIR}{base}_{size}.{extension}'
+            for size in SIZES for extension in EXTENSIONS]
+
+
+def mark_generated(apps, schema_editor):
+    """flag the images whose derivatives were already stored"""
+    from django.core.files.storage import default_storage
+
+    Influencer = apps.get_model('core', 'Influencer')
+    names = Influencer.objects.exclude(profile_image='')\
+        .exclude(profile_image__isnull=True)\
+        .values_list('profile_image', flat=True).distinct()
+    ready = [
+        name for name in names.iterator()
+        if all(default_storage.exists(target)
+               for target in derivative_names(name))
+    ]
+    for start in range(0, len(ready), 500):
+        Influencer.objects.filter(profile_image__in=ready[start:start + 500])\
+            .update(profile_image_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_influencer_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='influencer',
+            name='profile_image_ready',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_generated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.1.15 on 2026-10-17 21:20
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_influencer_profile_image_ready'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='influencer',
+            name='profile_image',
+            field=models.ImageField(db_index=True, null=True, upload_to=core.models.influencer_image_file_path),
+        ),
+    ]
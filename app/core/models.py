@@ -86,8 +86,23 @@ class Influencer(models.Model):
     score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     tags = models.ManyToManyField('Tag')
     styles = models.ManyToManyField('Style')
-    profile_image = models.ImageField(null=True,
+    # indexed for the reference checks before a shared file is deleted
+    profile_image = models.ImageField(null=True, db_index=True,
                                       upload_to=influencer_image_file_path)
+    # set once the resized copies of profile_image are stored
+    profile_image_ready = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_infl_user_id_idx'),
+            models.Index(fields=['user', 'followers', 'id'],
+                         name='core_infl_user_followers_idx'),
+            models.Index(fields=['user', 'score', 'id'],
+                         name='core_infl_user_score_idx'),
+            models.Index(fields=['user', 'name', 'id'],
+                         name='core_infl_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
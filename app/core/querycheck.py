@@ -0,0 +1,212 @@
+"""Detect repeated (N+1) and slow SQL queries within one request
+
+a QueryLog is installed as a connection execute wrapper for the length of
+a request. it groups the queries by shape, the SQL with its literals and
+IN lists blanked out, and attributes each shape to where it was issued:
+the serializer field, the view method and the innermost frame of this
+project's code. used by QueryDetectorMiddleware and the
+core.testrunner.QueryCheckRunner test runner
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from rest_framework.fields import Field
+from rest_framework.views import APIView
+
+
+logger = logging.getLogger(__name__)
+
+REPEAT_THRESHOLD = 3
+SLOW_MS = 100
+SQL_PREVIEW = 200
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+# the detector's own frames are never the origin of a query
+_SKIPPED = {os.path.join(_HERE, name)
+            for name in ('querycheck.py', 'middleware.py', 'testrunner.py')}
+_paths = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its query_budget allows"""
+
+
+class Origin(namedtuple('Origin', 'field view location')):
+    """Where a query was issued, any part may be None"""
+    __slots__ = ()
+
+    def __str__(self):
+        return ', '.join(part for part in self if part) or 'unknown'
+
+
+class Problem(namedtuple('Problem', 'kind view sql count duration origin')):
+    """A repeated or slow query shape of one request"""
+    __slots__ = ()
+
+    def __str__(self):
+        sql = self.sql
+        if len(sql) > SQL_PREVIEW:
+            sql = sql[:SQL_PREVIEW] + '...'
+        return (f'{self.kind} in {self.view}: {self.count} x {sql} '
+                f'({self.duration * 1000:.1f}ms) from {self.origin}')
+
+
+def normalize(sql):
+    """return the shape of a query, equal for queries differing by values"""
+    sql = _STRING.sub('?', sql.replace('%s', '?'))
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _app_path(filename):
+    """return filename relative to BASE_DIR if it is this project's code"""
+    try:
+        return _paths[filename]
+    except KeyError:
+        pass
+    path = os.path.abspath(filename)
+    root = os.path.join(os.path.abspath(settings.BASE_DIR), '')
+    relative = None
+    if path.startswith(root) and 'site-packages' not in path and \
+            path not in _SKIPPED:
+        relative = os.path.relpath(path, root)
+    _paths[filename] = relative
+    return relative
+
+
+def _is_test(path):
+    return f'{os.sep}tests{os.sep}' in path or \
+        os.path.basename(path).startswith('test')
+
+
+def origin(frame):
+    """return the Origin of the query executed below frame
+
+    the innermost bound serializer field and view method on the stack,
+    and the innermost frame of the project's own code, preferring
+    application code over the tests calling it
+    """
+    field = view = location = fallback = None
+    while frame is not None:
+        code = frame.f_code
+        if location is None:
+            path = _app_path(code.co_filename)
+            if path is not None:
+                where = f'{path}:{frame.f_lineno} in {code.co_name}'
+                if not _is_test(path):
+                    location = where
+                elif fallback is None:
+                    fallback = where
+        if field is None or view is None:
+            # type() rather than isinstance(), which would evaluate lazy
+            # objects like request.user and run queries from in here
+            owner = type(frame.f_locals.get('self'))
+            if field is None and issubclass(owner, Field):
+                bound = frame.f_locals['self']
+                if bound.field_name and bound.parent is not None:
+                    field = f'{type(bound.parent).__name__}.' \
+                            f'{bound.field_name}'
+            elif view is None and issubclass(owner, APIView):
+                view = f'{owner.__name__}.{code.co_name}'
+        frame = frame.f_back
+    return Origin(field, view, location or fallback)
+
+
+class QueryLog:
+    """execute_wrapper grouping the queries of one request by shape"""
+
+    def __init__(self):
+        self.repeats = getattr(settings, 'QUERY_DETECTOR_REPEATS',
+                               REPEAT_THRESHOLD)
+        self.slow_ms = getattr(settings, 'QUERY_DETECTOR_SLOW_MS', SLOW_MS)
+        self.queries = 0
+        # shape: [count, total seconds, origin]
+        self.shapes = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - started,
+                        sys._getframe(1))
+
+    def record(self, sql, duration, frame):
+        self.queries += 1
+        shape = normalize(sql)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            entry = self.shapes[shape] = [0, 0.0, None]
+        entry[0] += 1
+        entry[1] += duration
+        slow = duration * 1000 >= self.slow_ms
+        if entry[0] <= 2 or slow:
+            # the second run of a shape is the call site an N+1 repeats
+            where = origin(frame)
+            if entry[0] <= 2:
+                entry[2] = where
+            if slow:
+                self.slow.append((shape, duration, where))
+
+    def problems(self, view):
+        """return the N+1 and slow query Problems seen so far"""
+        found = [
+            Problem('N+1', view, shape, count, duration, where)
+            for shape, (count, duration, where) in self.shapes.items()
+            if count >= self.repeats and shape.startswith('SELECT')
+        ]
+        found.extend(Problem('slow', view, shape, 1, duration, where)
+                     for shape, duration, where in self.slow)
+        return found
+
+    def summary(self, limit=5):
+        """return the most repeated shapes, one per line"""
+        shapes = sorted(self.shapes.items(), key=lambda item: -item[1][0])
+        return '\n'.join(f'  {count} x {shape[:SQL_PREVIEW]} from {where}'
+                         for shape, (count, _, where) in shapes[:limit])
+
+
+def query_budget(view_func, method):
+    """return the query_budget a resolved view declares, or None
+
+    viewsets set query_budget to a number of queries, or to a
+    {action: number} dict for per action budgets
+    """
+    cls = getattr(view_func, 'cls', None) or \
+        getattr(view_func, 'view_class', None)
+    budget = getattr(cls, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        budget = budget.get(actions.get(method.lower()))
+    return budget
+
+
+def check(log, view, budget=None):
+    """log the problems of a finished request and check its budget
+
+    raises QueryBudgetExceeded with QUERY_BUDGET_STRICT, returns the
+    problems otherwise
+    """
+    problems = log.problems(view)
+    for problem in problems:
+        logger.warning('%s', problem, extra={'problem': problem})
+    if budget is not None and log.queries > budget:
+        message = (f'{view} ran {log.queries} queries, '
+                   f'its query_budget is {budget}:\n{log.summary()}')
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning('%s', message)
+    return problems
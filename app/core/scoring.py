@@ -0,0 +1,158 @@
+"""Batch recomputation of Influencer.score
+
+a user's roster is streamed in id ordered chunks into numpy arrays and
+scored with one vectorized expression per chunk:
+
+    raw = weights['followers'] * log10(1 + followers)
+          + sum(weights['tags'][tag]) + sum(weights['styles'][style])
+
+with normalize on, raw scores are min-max scaled to 0..100 per user. this
+takes two passes over the roster (min/max first, then the writes) so
+memory stays bounded by the chunk size instead of the roster size
+"""
+from decimal import Decimal
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from core.bulk import update_rows
+from core.models import Tag, Style, Influencer
+from influencer.cache import bump_user_version
+
+
+DEFAULT_WEIGHTS = {
+    'followers': 1.0,
+    'tags': {},
+    'styles': {},
+    'normalize': True,
+}
+MAX_SCORE = 100
+
+
+def score_limit():
+    """return the largest absolute value the score column can store"""
+    field = Influencer._meta.get_field('score')
+    return 10 ** (field.max_digits - field.decimal_places) - \
+        10 ** -field.decimal_places
+
+
+def get_weights(overrides=None):
+    """return the scoring weights: defaults < settings < overrides"""
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(getattr(settings, 'INFLUENCER_SCORE_WEIGHTS', {}))
+    weights.update(overrides or {})
+    return weights
+
+
+def member_weights(model, user, weights):
+    """return sorted (ids, weights) arrays for a user's weighted names"""
+    pairs = sorted(
+        (pk, weights[name]) for pk, name in
+        model.objects.filter(user=user, name__in=list(weights))
+        .values_list('id', 'name')
+    )
+    return (np.array([pk for pk, _ in pairs], dtype=np.int64),
+            np.array([weight for _, weight in pairs], dtype=np.float64))
+
+
+def iter_chunks(user, chunk_size):
+    """yield (ids, followers, score cents) arrays in id order"""
+    last_id = 0
+    while True:
+        # scores are read as floats, building a Decimal per row costs more
+        # than the rest of the chunk
+        rows = list(
+            Influencer.objects.filter(user=user, id__gt=last_id)
+            .annotate(score_value=Cast('score', FloatField()))
+            .order_by('id').values_list('id', 'followers', 'score_value')
+            [:chunk_size]
+        )
+        if not rows:
+            return
+        chunk = np.array(rows, dtype=np.float64)
+        yield (chunk[:, 0].astype(np.int64), chunk[:, 1],
+               np.rint(chunk[:, 2] * 100).astype(np.int64))
+        last_id = rows[-1][0]
+
+
+def add_member_weights(raw, user, ids, model, member_ids, member_weight):
+    """add the weight of every weighted tag/style each row belongs to"""
+    if not len(member_ids):
+        return
+    through = Influencer.tags.through if model is Tag \
+        else Influencer.styles.through
+    column = 'tag_id' if model is Tag else 'style_id'
+    # the user's pairs of the id range, served by the (influencer_id,
+    # tag_id) unique index; filtering on the weighted ids would make
+    # sqlite scan the whole table through the tag index instead
+    pairs = np.fromiter(
+        chain.from_iterable(through.objects.filter(
+            influencer__user=user,
+            influencer_id__gte=int(ids[0]), influencer_id__lte=int(ids[-1]),
+        ).values_list('influencer_id', column)),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    rows = np.minimum(np.searchsorted(ids, pairs[:, 0]), len(ids) - 1)
+    members = np.minimum(np.searchsorted(member_ids, pairs[:, 1]),
+                         len(member_ids) - 1)
+    known = (ids[rows] == pairs[:, 0]) & \
+        (member_ids[members] == pairs[:, 1])
+    np.add.at(raw, rows[known], member_weight[members[known]])
+
+
+def raw_scores(user, ids, followers, weights, tag_weights, style_weights):
+    """return the unnormalized scores of one chunk"""
+    raw = weights['followers'] * np.log10(1 + np.maximum(followers, 0))
+    add_member_weights(raw, user, ids, Tag, *tag_weights)
+    add_member_weights(raw, user, ids, Style, *style_weights)
+    return raw
+
+
+def recompute_user(user, weights=None, chunk_size=50000, batch_size=1000):
+    """recompute and store the scores of a user's influencers
+
+    returns (influencers scored, influencers whose score changed)
+    """
+    weights = get_weights(weights)
+    tag_weights = member_weights(Tag, user, weights['tags'])
+    style_weights = member_weights(Style, user, weights['styles'])
+
+    def scored_chunks():
+        for ids, followers, cents in iter_chunks(user, chunk_size):
+            yield ids, cents, raw_scores(user, ids, followers, weights,
+                                         tag_weights, style_weights)
+
+    low, high = 0.0, None
+    if weights['normalize']:
+        low, high = np.inf, -np.inf
+        for _, _, raw in scored_chunks():
+            low, high = min(low, raw.min()), max(high, raw.max())
+        if high == -np.inf:
+            return 0, 0
+
+    limit = score_limit()
+    scored = changed = 0
+    for ids, cents, raw in scored_chunks():
+        if high is None:
+            score = raw
+        elif high > low:
+            score = (raw - low) * (MAX_SCORE / (high - low))
+        else:
+            score = np.zeros_like(raw)
+        new_cents = np.rint(np.clip(score, -limit, limit) * 100)\
+            .astype(np.int64)
+        dirty = np.flatnonzero(new_cents != cents)
+        changed += update_rows(
+            Influencer, ['score'],
+            [(int(ids[i]), Decimal(int(new_cents[i])).scaleb(-2))
+             for i in dirty],
+            batch_size=batch_size,
+        )
+        scored += len(ids)
+
+    if changed:
+        bump_user_version(user.id)
+    return scored, changed
@@ -0,0 +1,350 @@
+"""Prefork WSGI server used by `manage.py serve`
+
+the master binds the listening socket and loads and warms the application
+once, then forks workers that share it copy-on-write. every worker accepts
+on the shared socket and runs requests on a fixed number of threads. a
+worker exits after max_requests requests or once its RSS passes max_rss
+and the master starts a fresh one. SIGTERM (or SIGINT) makes the workers
+stop accepting, finish the requests in flight and exit
+"""
+import gc
+import io
+import os
+import random
+import resource
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, \
+    WSGIServer
+
+
+def bind(host, port, backlog=2048):
+    """return a listening socket shared by every worker"""
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def load_application():
+    """import the wsgi application and warm what requests would load lazily
+
+    runs in the master before forking, so the workers share the imported
+    modules, url resolvers and serializer fields instead of each building
+    their own on the first requests
+    """
+    from app.wsgi import application
+    from django.apps import apps
+    from django.db import connections
+    from django.urls import get_resolver
+    from django.utils.module_loading import autodiscover_modules
+    from rest_framework import serializers
+
+    get_resolver().reverse_dict
+    autodiscover_modules('serializers', 'views')
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+    pending = [serializers.ModelSerializer]
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        if getattr(getattr(cls, 'Meta', None), 'model', None) is None:
+            continue
+        try:
+            cls().fields
+        except Exception:
+            # some serializers need a request in their context
+            pass
+
+    # no sockets may be shared with the children
+    connections.close_all()
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        # keep the preloaded objects out of later collections, which would
+        # otherwise touch their pages and undo the copy-on-write sharing
+        gc.freeze()
+    return application
+
+
+def warm_pool():
+    """open this worker's pooled database connections, if any"""
+    from django.db import connections
+    from django.db.utils import OperationalError
+
+    warm = getattr(connections['default'], 'warm_pool', None)
+    if warm is None:
+        return None
+    try:
+        return warm()
+    except OperationalError:
+        # requests will connect on demand and report the error themselves
+        return None
+
+
+def current_rss():
+    """return the resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # peak rather than current, but good enough for a limit
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SendfileHandler(ServerHandler):
+    """ServerHandler sending wsgi.file_wrapper responses with sendfile()
+
+    Django returns FileResponses through wsgi.file_wrapper, so files are
+    copied to the socket by the kernel instead of read into the worker
+    """
+
+    def sendfile(self):
+        filelike = self.result.filelike
+        try:
+            filelike.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        # socket.sendfile() also waits out a full buffer on sockets with
+        # a timeout, and falls back to send() where sendfile is missing
+        self.bytes_sent += self.request_handler.connection.sendfile(filelike)
+        return True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def handle(self):
+        """WSGIRequestHandler.handle() running SendfileHandler"""
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        handler = SendfileHandler(
+            self.rfile, self.wfile, self.get_stderr(), self.get_environ()
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+
+class Worker:
+    """Accept connections on a shared socket and serve them on threads"""
+
+    def __init__(self, sock, app, threads=4, max_requests=0, max_rss=0,
+                 timeout=30, access_log=False):
+        self.sock = sock
+        self.threads = threads
+        # seconds a connection may sit idle on a read or write, so clients
+        # that send nothing can't hold the threads
+        self.timeout = timeout or None
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+        self.requests = 0
+        self.stopped_at = None
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(threads)
+        host, port = sock.getsockname()[:2]
+        self.server = WSGIServer((host, port), QuietRequestHandler,
+                                 bind_and_activate=False)
+        self.server.socket = sock
+        self.server.server_name = socket.getfqdn(host)
+        self.server.server_port = port
+        self.server.access_log = access_log
+        self.server.setup_environ()
+        self.server.set_app(app)
+
+    def stop(self, *args):
+        """stop accepting, requests in flight still finish"""
+        if self.stopped_at is None:
+            self.stopped_at = time.monotonic()
+        self.stopping.set()
+
+    def run(self):
+        """serve until stopped or recycled"""
+        self.sock.settimeout(0.5)
+        executor = ThreadPoolExecutor(max_workers=self.threads)
+        try:
+            while not self.stopping.is_set():
+                # only accept what a free thread can start on right away,
+                # busy workers leave connections to the idle ones
+                if not self._slots.acquire(timeout=0.5):
+                    continue
+                try:
+                    conn, addr = self.sock.accept()
+                except (socket.timeout, BlockingIOError, InterruptedError):
+                    self._slots.release()
+                    continue
+                conn.settimeout(self.timeout)
+                executor.submit(self._handle, conn, addr)
+        finally:
+            executor.shutdown(wait=True)
+
+    def _handle(self, conn, addr):
+        try:
+            self.server.finish_request(conn, addr)
+        except socket.timeout:
+            pass
+        except Exception:
+            self.server.handle_error(conn, addr)
+        finally:
+            self.server.shutdown_request(conn)
+            self._slots.release()
+            self._finished()
+
+    def _finished(self):
+        with self._lock:
+            self.requests += 1
+            recycle = (self.max_requests and
+                       self.requests >= self.max_requests)
+        if not recycle and self.max_rss:
+            recycle = current_rss() > self.max_rss
+        if recycle:
+            self.stop()
+
+
+class Master:
+    """Fork the workers and replace the ones that exit"""
+
+    def __init__(self, sock, app, workers=2, threads=4, max_requests=0,
+                 max_requests_jitter=0, max_rss=0, graceful_timeout=30,
+                 timeout=30, access_log=False, log=None):
+        self.sock = sock
+        self.app = app
+        self.workers = workers
+        self.worker_options = {'threads': threads, 'max_rss': max_rss,
+                               'timeout': timeout, 'access_log': access_log}
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.log = log or (lambda message: print(message, file=sys.stderr))
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self):
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            # spread restarts so the workers don't all recycle together
+            max_requests += random.randint(0, self.max_requests_jitter)
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            worker = Worker(self.sock, self.app, max_requests=max_requests,
+                            **self.worker_options)
+            signal.signal(signal.SIGTERM, worker.stop)
+            warm_pool()
+            from core import metrics
+            metrics.start_flusher()
+            worker.run()
+            self.finish_background_work(worker)
+            from django.db import connections
+            connections.close_all()
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+
+    def finish_background_work(self, worker):
+        """let a stopped worker's image queue drain before it exits
+
+        within what is left of graceful_timeout since it was stopped,
+        when the master would kill it anyway. its metrics are written
+        one last time
+        """
+        from influencer import images
+
+        stopped_at = worker.stopped_at or time.monotonic()
+        remaining = self.graceful_timeout - (time.monotonic() - stopped_at)
+        if not images.shutdown(timeout=max(remaining, 0)):
+            self.log(f'Worker {os.getpid()} exited with profile image '
+                     f'derivatives still queued')
+        from core import metrics
+        metrics.flush()
+
+    def retire(self, pid):
+        from core import metrics
+        try:
+            metrics.retire(pid)
+        except Exception as exc:
+            self.log(f'Failed to keep the metrics of worker {pid}: {exc}')
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        host, port = self.sock.getsockname()[:2]
+        self.log(f'Listening at http://{host}:{port} '
+                 f'with {self.workers} workers')
+        while not self.stopping:
+            while len(self.children) < self.workers:
+                self.spawn()
+            self.reap()
+            time.sleep(0.2)
+        return self.shutdown()
+
+    def reap(self):
+        """forget exited workers, returns the pids reaped"""
+        reaped = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            started = self.children.pop(pid, None)
+            self.retire(pid)
+            if started is not None and not self.stopping and \
+                    os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+                self.log(f'Worker {pid} recycled after '
+                         f'{time.monotonic() - started:.0f}s')
+            elif started is not None and not self.stopping:
+                self.log(f'Worker {pid} died ({status}), restarting')
+                # don't spin when workers crash on start
+                time.sleep(1)
+            reaped.append(pid)
+        return reaped
+
+    def shutdown(self):
+        """drain the workers, killing those past graceful_timeout"""
+        self.log('Shutting down, draining workers')
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.retire(pid)
+        killed = len(self.children)
+        self.children.clear()
+        self.sock.close()
+        return killed
@@ -0,0 +1,11 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core.middleware import time_query
+
+
+@receiver(connection_created)
+def add_query_timer(sender, connection, **kwargs):
+    """time the queries of every connection once it is opened"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
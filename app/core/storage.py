@@ -0,0 +1,69 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.dispatch import Signal
+
+
+# sent with the content name once an upload is written and synced to its
+# temporary file, right before the file is looked up and published under
+# that name
+publishing = Signal(providing_args=['name'])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming uploads by the sha256 of their content
+
+    files saved under one of `content_addressed_prefixes` are hashed while
+    they stream to disk and stored as <dir>/<2 hex>/<sha256><ext>, so the
+    same content is only ever written once and shared by every row that
+    references it. other names are stored as usual
+    """
+    content_addressed_prefixes = ('uploads/',)
+
+    def is_content_addressed(self, name):
+        return name.replace('\\', '/').startswith(
+            self.content_addressed_prefixes
+        )
+
+    def get_available_name(self, name, max_length=None):
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not self.is_content_addressed(name):
+            return super()._save(name, content)
+
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=full_directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+
+            hexdigest = digest.hexdigest()
+            name = os.path.join(directory, hexdigest[:2], hexdigest + ext)
+            full_path = self.path(name)
+            publishing.send(sender=type(self), name=name.replace('\\', '/'))
+            if os.path.exists(full_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return name.replace('\\', '/')
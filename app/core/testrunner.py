@@ -0,0 +1,96 @@
+"""Test runner enforcing query budgets and reporting N+1 queries
+
+    python manage.py test --testrunner=core.testrunner.QueryCheckRunner
+
+runs the suite with QueryDetectorMiddleware in strict mode, so a request
+running more queries than its view's query_budget fails its test. the
+N+1 and slow queries seen along the way are listed after the run and
+--fail-on-n-plus-one fails the run when there are any
+"""
+import logging
+import sys
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from core import querycheck
+
+
+MIDDLEWARE = 'core.middleware.QueryDetectorMiddleware'
+
+
+class ProblemCollector(logging.Handler):
+    """Keep the distinct problems logged by the detector"""
+
+    def __init__(self):
+        super().__init__()
+        self.problems = {}
+
+    def emit(self, record):
+        problem = getattr(record, 'problem', None)
+        if problem is None:
+            return
+        key = (problem.kind, problem.view, problem.sql, problem.origin)
+        seen = self.problems.get(key)
+        if seen is None or problem.count > seen.count:
+            self.problems[key] = problem
+
+
+class QueryCheckRunner(DiscoverRunner):
+    """DiscoverRunner with the query detector switched on"""
+
+    def __init__(self, fail_on_n_plus_one=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_on_n_plus_one = fail_on_n_plus_one
+        self.collector = ProblemCollector()
+        self._settings = None
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--fail-on-n-plus-one', action='store_true',
+            help='Fail the run when any request repeats a query.',
+        )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        middleware = list(settings.MIDDLEWARE)
+        if MIDDLEWARE not in middleware:
+            middleware.insert(0, MIDDLEWARE)
+        self._settings = override_settings(
+            MIDDLEWARE=middleware,
+            QUERY_DETECTOR=True,
+            QUERY_BUDGET_STRICT=True,
+        )
+        self._settings.enable()
+        querycheck.logger.addHandler(self.collector)
+        querycheck.logger.propagate = False
+
+    def teardown_test_environment(self, **kwargs):
+        querycheck.logger.propagate = True
+        querycheck.logger.removeHandler(self.collector)
+        if self._settings is not None:
+            self._settings.disable()
+            self._settings = None
+        super().teardown_test_environment(**kwargs)
+
+    def report(self, stream=None):
+        """write the problems seen, returns the number of N+1 problems"""
+        stream = stream or sys.stderr
+        problems = sorted(self.collector.problems.values(),
+                          key=lambda problem: (problem.kind, problem.view,
+                                               -problem.count))
+        if problems and self.verbosity:
+            stream.write(f'\n{len(problems)} query problems:\n')
+            for problem in problems:
+                stream.write(f'  {problem}\n')
+        return sum(problem.kind == 'N+1' for problem in problems)
+
+    def suite_result(self, suite, result, **kwargs):
+        failures = super().suite_result(suite, result, **kwargs)
+        repeated = self.report()
+        if self.fail_on_n_plus_one:
+            failures += repeated
+        return failures
@@ -1,23 +1,133 @@
-from unittest.mock import patch
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import MagicMock, patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.models import Tag, Influencer
+
 
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available"""
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
+            db_conn = gi.return_value = MagicMock()
+            call_command('wait_for_db', stdout=StringIO())
             self.assertEqual(gi.call_count, 1)
+            db_conn.cursor.return_value.__enter__.return_value.execute\
+                .assert_called_once_with('SELECT 1')
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """test waiting for db"""
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+            db_conn = gi.return_value = MagicMock()
+            db_conn.cursor.side_effect = [OperationalError] * 5 + \
+                [MagicMock()]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(db_conn.cursor.call_count, 6)
+            self.assertEqual([call[0][0] for call in ts.call_args_list],
+                             [0.5, 1, 2, 4, 5])
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """test waiting for db gives up after the timeout"""
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value.cursor.side_effect = OperationalError
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=0, stdout=StringIO())
+
+
+class ImportInfluencersCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+
+    def write_file(self, suffix, content):
+        """write content to a temporary file and return its path"""
+        ntf = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        with ntf:
+            ntf.write(content)
+        self.addCleanup(os.remove, ntf.name)
+        return ntf.name
+
+    def test_import_csv(self):
+        """test importing influencers with tags and styles from csv"""
+        path = self.write_file('.csv', (
+            'name,insta_id,followers,insta_link,score,tags,styles\n'
+            'Park,park_,1200,www.instagram.com/park_,4.5,Solo|Girl,Chic\n'
+            'Seo,seo_,300,www.instagram.com/seo_,,Solo,\n'
+            'Hong,hong_,50,www.instagram.com/hong_,,,\n'
+        ))
+        Tag.objects.create(user=self.user, name='Solo')
+
+        call_command('import_influencers', path, user=self.user.email,
+                     batch_size=2, stdout=StringIO())
+
+        influencers = Influencer.objects.filter(user=self.user)
+        self.assertEqual(influencers.count(), 3)
+        park = influencers.get(name='Park')
+        self.assertEqual(park.followers, 1200)
+        self.assertEqual(str(park.score), '4.50')
+        self.assertEqual(
+            sorted(park.tags.values_list('name', flat=True)),
+            ['Girl', 'Solo']
+        )
+        self.assertEqual(list(park.styles.values_list('name', flat=True)),
+                         ['Chic'])
+        self.assertEqual(Tag.objects.filter(name='Solo').count(), 1)
+        self.assertEqual(
+            list(influencers.get(name='Seo').tags.all()),
+            [Tag.objects.get(name='Solo')]
+        )
+
+    def test_import_ndjson(self):
+        """test importing influencers from newline delimited json"""
+        path = self.write_file('.ndjson', (
+            '{"name": "Park", "insta_id": "park_", "followers": 10, '
+            '"insta_link": "www.instagram.com", "tags": ["Solo"]}\n'
+            '\n'
+            '{"name": "Seo", "followers": 20, "styles": "Chic|Cute"}\n'
+        ))
+
+        call_command('import_influencers', path, user=self.user.email,
+                     stdout=StringIO())
+
+        self.assertEqual(Influencer.objects.count(), 2)
+        seo = Influencer.objects.get(name='Seo')
+        self.assertEqual(
+            sorted(seo.styles.values_list('name', flat=True)),
+            ['Chic', 'Cute']
+        )
+
+    def test_import_invalid_row(self):
+        """test a row without a name aborts the import"""
+        path = self.write_file('.csv', 'name,followers\n,10\n')
+
+        with self.assertRaises(CommandError):
+            call_command('import_influencers', path, user=self.user.email,
+                         stdout=StringIO())
+        self.assertFalse(Influencer.objects.exists())
+
+    def test_import_invalid_score(self):
+        """test a bad value fails with its line, earlier batches included"""
+        path = self.write_file('.csv', (
+            'name,followers,score\n'
+            'Park,10,4.5\n'
+            'Seo,20,high\n'
+        ))
+
+        with self.assertRaisesRegex(CommandError,
+                                    "line 3: invalid score value 'high'"):
+            call_command('import_influencers', path, user=self.user.email,
+                         batch_size=1, stdout=StringIO())
+        self.assertFalse(Influencer.objects.exists())
@@ -0,0 +1,283 @@
+import threading
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core.management import call_command
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from core.dbpool import pool as dbpool
+from core.dbpool.base import DatabaseWrapper
+from core.dbpool.pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise extensions.QueryCanceledError('server closed the connection')
+        self.conn.queries.append(sql)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """stands in for a psycopg2 connection"""
+
+    def __init__(self, **params):
+        self.params = params
+        self.closed = 0
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.isolation_level = None
+        self.autocommit = False
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def set_client_encoding(self, encoding):
+        pass
+
+    def get_parameter_status(self, name):
+        return 'UTC'
+
+    def set_session(self, **kwargs):
+        pass
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """test the pool with a fake connect factory"""
+
+    def setUp(self):
+        self.connections = []
+        self.clock = FakeClock()
+
+    def connect(self):
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+    def make_pool(self, **kwargs):
+        kwargs.setdefault('check', lambda conn: not conn.broken)
+        return ConnectionPool(self.connect, clock=self.clock, **kwargs)
+
+    def test_reuses_returned_connections(self):
+        """test a returned connection is handed out again"""
+        pool = self.make_pool()
+        conn = pool.get()
+        pool.put(conn)
+
+        self.assertIs(pool.get(), conn)
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_max_size_and_timeout(self):
+        """test checkouts past max_size wait and then time out"""
+        pool = self.make_pool(max_size=2, timeout=0.05)
+        pool.get()
+        pool.get()
+
+        with self.assertRaises(PoolTimeout):
+            pool.get()
+
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['in_use']), (2, 2))
+        self.assertEqual((stats['waits'], stats['timeouts']), (1, 1))
+
+    def test_waiter_gets_returned_connection(self):
+        """test a waiting checkout gets the next returned connection"""
+        pool = self.make_pool(max_size=1, timeout=5)
+        conn = pool.get()
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(pool.get()))
+        waiter.start()
+        while not pool.stats()['waits']:
+            pass
+
+        pool.put(conn)
+        waiter.join()
+
+        self.assertEqual(result, [conn])
+
+    def test_max_age_recycles(self):
+        """test connections past max_age are replaced"""
+        pool = self.make_pool(max_age=60)
+        old = pool.get()
+        pool.put(old)
+        self.clock.now = 61
+
+        new = pool.get()
+
+        self.assertIsNot(new, old)
+        self.assertTrue(old.closed)
+        self.assertEqual(pool.stats()['recycled'], 1)
+
+    def test_health_check_before_reuse(self):
+        """test idle connections failing the check are replaced"""
+        pool = self.make_pool(check_idle=5)
+        conn = pool.get()
+        pool.put(conn)
+        conn.broken = True
+
+        # recently returned connections skip the check
+        self.assertIs(pool.get(), conn)
+        pool.put(conn)
+        self.clock.now = 5
+        replacement = pool.get()
+
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+
+    def test_reset_and_discard(self):
+        """test connections failing reset or discarded are closed"""
+        pool = self.make_pool(reset=lambda conn: conn.status == 0)
+        first, second = pool.get(), pool.get()
+        first.status = 4
+        pool.put(first)
+        pool.put(second, discard=True)
+
+        self.assertTrue(first.closed and second.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_warm(self):
+        """test warm opens and checks min_size connections"""
+        pool = self.make_pool(min_size=3)
+
+        self.assertEqual(pool.warm(), 3)
+        self.assertEqual(pool.stats()['idle'], 3)
+
+    def test_connect_failure_frees_slot(self):
+        """test a failed connect doesn't use up the pool"""
+        pool = ConnectionPool(MagicMock(side_effect=OSError), max_size=1,
+                              timeout=0)
+
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.get()
+
+
+class DatabaseWrapperTests(SimpleTestCase):
+    """test the backend checks connections in and out of the pool"""
+
+    settings_dict = {
+        'ENGINE': 'core.dbpool',
+        'NAME': 'app',
+        'USER': 'postgres',
+        'PASSWORD': 'secret',
+        'HOST': 'db',
+        'PORT': '',
+        'OPTIONS': {},
+        'AUTOCOMMIT': True,
+        'ATOMIC_REQUESTS': False,
+        'CONN_MAX_AGE': 0,
+        'TIME_ZONE': None,
+        'TEST': {},
+        'POOL': {'MAX_SIZE': 2, 'MIN_SIZE': 2, 'TIMEOUT': 0},
+    }
+
+    def setUp(self):
+        patcher = patch('core.dbpool.base.Database.connect',
+                        side_effect=FakeConnection)
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(dbpool._pools.clear)
+
+    def wrapper(self):
+        return DatabaseWrapper(dict(self.settings_dict), alias='pooltest')
+
+    def test_close_returns_connection(self):
+        """test closing a wrapper hands its connection to the next one"""
+        first = self.wrapper()
+        first.ensure_connection()
+        conn = first.connection
+        first.close()
+
+        second = self.wrapper()
+        second.ensure_connection()
+
+        self.assertIs(second.connection, conn)
+        self.assertEqual(self.connect.call_count, 1)
+        self.assertEqual(conn.params['host'], 'db')
+        self.assertFalse(conn.closed)
+
+    def test_open_transaction_rolled_back(self):
+        """test a connection returned mid transaction is rolled back"""
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        conn = wrapper.connection
+        conn.status = extensions.TRANSACTION_STATUS_INTRANS
+        wrapper.close()
+
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(dbpool.stats()['pooltest']['idle'], 1)
+
+    def test_close_in_atomic_block_discards(self):
+        """test a connection still held by atomic() isn't shared"""
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        conn = wrapper.connection
+        wrapper.in_atomic_block = True
+        wrapper.close()
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(dbpool.stats()['pooltest']['size'], 0)
+
+    def test_exhausted_pool(self):
+        """test checkouts past MAX_SIZE raise OperationalError"""
+        for _ in range(2):
+            self.wrapper().ensure_connection()
+
+        with self.assertRaises(OperationalError):
+            self.wrapper().ensure_connection()
+
+    def test_warm_pool(self):
+        """test warm_pool opens MIN_SIZE checked connections"""
+        self.assertEqual(self.wrapper().warm_pool(), 2)
+        self.assertEqual(self.connect.call_count, 2)
+
+        stats = dbpool.stats()['pooltest']
+        self.assertEqual((stats['idle'], stats['connects']), (2, 2))
+
+    def test_wait_for_db_warms_pool(self):
+        """test wait_for_db retries until the pool is warm"""
+        db_conn = MagicMock()
+        db_conn.warm_pool.side_effect = [OperationalError, 2]
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi, \
+                patch('time.sleep'):
+            gi.return_value = db_conn
+            call_command('wait_for_db', stdout=StringIO())
+
+        self.assertEqual(db_conn.warm_pool.call_count, 2)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import views
+
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+
+class HealthTests(TestCase):
+    """test the liveness and readiness probes"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = patch.object(views, '_migrations_applied', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_healthz(self):
+        """test liveness answers without touching the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    def test_ready(self):
+        """test readiness passes every check"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        checks = res.json()['checks']
+        self.assertEqual(checks['migrations'], {'status': 'ok', 'pending': 0})
+        self.assertGreaterEqual(checks['database']['latency_ms'], 0)
+        self.assertEqual(checks['media'], {'status': 'ok'})
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_migrations_checked_once(self):
+        """test applied migrations aren't loaded again"""
+        self.client.get(READYZ_URL)
+
+        with patch.object(views, 'MigrationExecutor') as executor:
+            self.client.get(READYZ_URL)
+
+        executor.assert_not_called()
+
+    def test_pending_migrations(self):
+        """test pending migrations make the instance not ready"""
+        with patch.object(views.MigrationExecutor, 'migration_plan',
+                          return_value=['0002_pending']):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['migrations']['pending'], 1)
+
+    def test_database_unavailable(self):
+        """test a failing database query is reported"""
+        with patch('django.db.backends.utils.CursorWrapper.execute',
+                   side_effect=OperationalError('connection refused')), \
+                self.assertLogs('core.views', 'WARNING') as logs:
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['database'],
+                         {'status': 'fail'})
+        self.assertNotIn('connection refused', res.content.decode())
+        self.assertIn('connection refused', logs.output[0])
+
+    @override_settings(READINESS_DB_LATENCY_MS=-1)
+    def test_database_slow(self):
+        """test a round trip over the latency budget fails readiness"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['database']['status'], 'fail')
+
+    def test_media_not_writable(self):
+        """test an unwritable media volume fails readiness"""
+        with override_settings(MEDIA_ROOT=os.path.join(self.media_root,
+                                                       'missing')), \
+                self.assertLogs('core.views', 'WARNING'):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['media']['status'], 'fail')
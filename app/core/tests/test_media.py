@@ -0,0 +1,106 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+def media_url(path):
+    return reverse('media', args=[path])
+
+
+class ServeMediaTests(TestCase):
+    """test serving uploaded files"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.content = bytes(range(256)) * 4
+        directory = os.path.join(media.name, 'uploads', 'influencer')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'a.jpg'), 'wb') as fileobj:
+            fileobj.write(self.content)
+        with open(os.path.join(media.name, 'notes.txt'), 'wb') as fileobj:
+            fileobj.write(b'notes')
+        self.url = media_url('uploads/influencer/a.jpg')
+
+    def test_serve_file(self):
+        """test a file is served with caching headers"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(self.content)))
+        self.assertEqual(res['Cache-Control'],
+                         'public, max-age=31536000, immutable')
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+
+    def test_mutable_path_cache_control(self):
+        """test files outside uploads/ get a short max-age"""
+        res = self.client.get(media_url('notes.txt'))
+
+        self.assertEqual(res['Cache-Control'], 'public, max-age=3600')
+
+    def test_conditional_get(self):
+        """test matching etag and if-modified-since return 304"""
+        res = self.client.get(self.url)
+
+        etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=res['ETag'])
+        since = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified']
+        )
+
+        self.assertEqual(etag.status_code, 304)
+        self.assertEqual(since.status_code, 304)
+
+    def test_range(self):
+        """test byte ranges return partial content"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content),
+                         self.content[10:20])
+        self.assertEqual(res['Content-Range'],
+                         f'bytes 10-19/{len(self.content)}')
+
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(res.streaming_content), self.content[-5:])
+
+    def test_unsatisfiable_range(self):
+        """test a range past the end of the file returns 416"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'],
+                         f'bytes */{len(self.content)}')
+
+    def test_stale_if_range_serves_whole_file(self):
+        """test a non matching If-Range ignores the range"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=0-1',
+                              HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_accel_redirect(self):
+        """test the proxy is asked to send the file"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res['X-Accel-Redirect'],
+                         '/protected/uploads/influencer/a.jpg')
+        self.assertEqual(res.content, b'')
+
+    def test_missing_and_traversal(self):
+        """test unknown files and paths outside MEDIA_ROOT are 404"""
+        self.assertEqual(self.client.get(media_url('nope.jpg')).status_code,
+                         404)
+        self.assertEqual(
+            self.client.get(media_url('../../etc/passwd')).status_code, 404
+        )
+        self.assertEqual(self.client.get(media_url('uploads')).status_code,
+                         404)
@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.serializers import ListSerializer
+from rest_framework.test import APIClient
+
+from core import metrics, middleware
+from core.middleware import RequestTimings, TimedData, \
+    timed_serializer_class
+from core.models import Tag
+from influencer.serializers import TagSerializer
+
+
+TAGS_URL = reverse('influencer:tag-list')
+TOKEN_URL = reverse('user:token')
+METRICS_URL = reverse('metrics')
+
+
+@override_settings(INFLUENCER_RESPONSE_CACHE=False)
+class PerformanceMiddlewareTests(TestCase):
+    """test request timings reach the headers and the histograms"""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        Tag.objects.create(user=self.user, name='Solo')
+
+    def count(self, view, histogram=metrics.REQUEST_SECONDS):
+        snapshot = histogram.snapshot()
+        return snapshot[view][1] if view in snapshot else 0
+
+    def test_histograms_by_view(self):
+        """test requests are recorded under their viewset action"""
+        self.client.force_authenticate(self.user)
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+        self.client.post(TAGS_URL, {'name': 'Girl'})
+
+        self.assertEqual(self.count('TagViewSet.list'), 2)
+        self.assertEqual(self.count('TagViewSet.create'), 1)
+        _, count, queries = metrics.QUERIES.snapshot()['TagViewSet.list']
+        self.assertGreaterEqual(queries, count)
+        for histogram in (metrics.SERIALIZE_SECONDS, metrics.RENDER_SECONDS):
+            self.assertGreater(histogram.snapshot()['TagViewSet.list'][2], 0)
+
+    def test_serialization_without_sql(self):
+        """test the serializer's time is its own phase, less its queries"""
+        self.client.force_authenticate(self.user)
+        with patch.object(metrics, 'observe_request') as observe:
+            self.client.get(TAGS_URL)
+
+        _, total, db, queries, serialize, render = observe.call_args[0]
+        self.assertGreater(serialize, 0)
+        self.assertLess(db + serialize + render, total)
+
+    def test_serializer_class_kept(self):
+        """test timing keeps the serializer's class name and type"""
+        timed = timed_serializer_class(TagSerializer)
+        timings = RequestTimings()
+        serializer = timed(Tag.objects.all(), many=True)
+        with patch.object(middleware._current, 'timings', timings,
+                          create=True):
+            data = serializer.data
+
+        self.assertIsInstance(serializer, ListSerializer)
+        self.assertIsInstance(serializer, TimedData)
+        self.assertIsInstance(serializer.child, TagSerializer)
+        self.assertEqual(type(serializer.child).__name__, 'TagSerializer')
+        self.assertEqual(data, [{'id': Tag.objects.get().id, 'name': 'Solo'}])
+        self.assertGreater(timings.serialize, 0)
+        self.assertIs(timed_serializer_class(TagSerializer), timed)
+        self.assertIs(timed_serializer_class(timed), timed)
+
+    def test_api_view_name(self):
+        """test plain api views are recorded under their class name"""
+        self.client.post(TOKEN_URL, {'email': 'test@burningb.com',
+                                     'password': 'testpass'})
+
+        self.assertEqual(self.count('CreateTokenView'), 1)
+
+    def test_server_timing_for_staff_only(self):
+        """test only staff users get the Server-Timing header"""
+        self.client.force_authenticate(self.user)
+        res = self.client.get(TAGS_URL)
+        self.assertNotIn('Server-Timing', res)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(TAGS_URL)
+
+        self.assertRegex(
+            res['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", '
+            r'serialize;dur=[\d.]+;desc="serialization", '
+            r'render;dur=[\d.]+;desc="json rendering", '
+            r'app;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+
+    @override_settings(PERFORMANCE_METRICS=False)
+    def test_disabled(self):
+        """test nothing is recorded when switched off"""
+        self.client.force_authenticate(self.user)
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(self.count('TagViewSet.list'), 0)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsEndpointTests(TestCase):
+    """test the prometheus endpoint"""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.client.defaults['HTTP_AUTHORIZATION'] = 'Bearer secret'
+
+    def test_prometheus_text(self):
+        """test histograms are rendered cumulatively with sums and counts"""
+        metrics.observe_request('TagViewSet.list', 0.02, 0.004, 3, 0.002,
+                                0.001)
+        metrics.observe_request('TagViewSet.list', 0.3, 0.1, 12, 0.04, 0.05)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+
+        def value(series):
+            match = re.search(r'^%s (\S+)$' % re.escape(series), body, re.M)
+            return float(match.group(1))
+
+        labels = 'view="TagViewSet.list"'
+        name = 'http_request_duration_seconds'
+        self.assertEqual(value(f'{name}_bucket{{{labels},le="0.025"}}'), 1)
+        self.assertEqual(value(f'{name}_bucket{{{labels},le="0.5"}}'), 2)
+        self.assertEqual(value(f'{name}_bucket{{{labels},le="+Inf"}}'), 2)
+        self.assertAlmostEqual(value(f'{name}_sum{{{labels}}}'), 0.32)
+        self.assertEqual(value(f'http_request_queries_count{{{labels}}}'), 2)
+        self.assertIn('# TYPE influencer_response_cache_total counter', body)
+
+    def test_requests_counted_in_batches(self):
+        """test requests are queued until read or too many are waiting"""
+        def observe():
+            metrics.observe_request('TagViewSet.list', 0.02, 0.004, 3,
+                                    0.002, 0.001)
+
+        with patch.object(metrics, 'PENDING_MAX', 2):
+            observe()
+            self.assertEqual(len(metrics._pending), 1)
+            observe()
+            self.assertEqual(len(metrics._pending), 0)
+        observe()
+
+        self.assertEqual(
+            metrics.QUERIES.snapshot()['TagViewSet.list'][1], 3
+        )
+        self.assertEqual(len(metrics._pending), 0)
+
+    def test_token(self):
+        """test the endpoint asks for the configured token"""
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer other')
+        self.assertEqual(res.status_code, 401)
+        del self.client.defaults['HTTP_AUTHORIZATION']
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_token(self):
+        """test the endpoint is closed until a token is configured"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+
+    def test_pool_metrics(self):
+        """test pool stats are exported per alias"""
+        pool = {'size': 2, 'idle': 1, 'in_use': 1, 'max_size': 10,
+                'checkouts': 7, 'connects': 2, 'waits': 0,
+                'wait_seconds': 0.0, 'timeouts': 0, 'failed_checks': 0,
+                'recycled': 1}
+        with patch.object(metrics, 'pool_stats',
+                          return_value={'default': pool}):
+            body = self.client.get(METRICS_URL).content.decode()
+
+        self.assertIn('db_pool_checkouts_total{alias="default"} 7\n', body)
+        self.assertIn('# TYPE db_pool_in_use gauge', body)
+
+
+class SharedMetricsTests(TestCase):
+    """test the metrics of every worker are added up"""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        metrics.set_directory(self.directory)
+        self.addCleanup(metrics.set_directory, None)
+
+    def write_worker(self, pid, requests, in_use):
+        """write the metrics file of another worker"""
+        histogram = metrics.Histogram('h', '', metrics.LATENCY_BUCKETS)
+        for _ in range(requests):
+            histogram.observe('TagViewSet.list', 0.02)
+        state = {
+            'histograms': {metrics.REQUEST_SECONDS.name: histogram.raw()},
+            'cache': {'hit': requests, 'miss': 0},
+            'pools': {'default': {'in_use': in_use, 'checkouts': requests}},
+        }
+        with open(os.path.join(self.directory, f'worker-{pid}.json'),
+                  'w') as fileobj:
+            json.dump(state, fileobj)
+
+    def requests(self):
+        snapshot = metrics.cumulative(
+            metrics.collect()['histograms'][metrics.REQUEST_SECONDS.name]
+        )
+        return snapshot['TagViewSet.list'][1]
+
+    def test_workers_added_up(self):
+        """test a scrape sums this process and the other workers"""
+        metrics.observe_request('TagViewSet.list', 0.02, 0.004, 3, 0.002,
+                                0.001)
+        self.write_worker(1, requests=2, in_use=1)
+        self.write_worker(2, requests=3, in_use=2)
+
+        collected = metrics.collect()
+
+        self.assertEqual(self.requests(), 6)
+        self.assertEqual(collected['cache']['hit'], 5)
+        self.assertEqual(collected['pools']['default']['in_use'], 3)
+        self.assertNotIn('pid=', metrics.render())
+
+    def test_retired_worker_keeps_counting(self):
+        """test an exited worker's counters stay, its gauges go"""
+        self.write_worker(1, requests=2, in_use=1)
+        self.write_worker(2, requests=3, in_use=2)
+
+        metrics.retire(1)
+        metrics.retire(2)
+        self.write_worker(3, requests=1, in_use=1)
+
+        collected = metrics.collect()
+        self.assertEqual(self.requests(), 6)
+        self.assertEqual(collected['pools']['default'],
+                         {'in_use': 1, 'checkouts': 6})
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted(['retired.json', f'worker-{os.getpid()}.json',
+                    'worker-3.json'])
+        )
+
+    def test_retired_worker_counted_once(self):
+        """test a worker file left behind after retiring is skipped"""
+        self.write_worker(1, requests=2, in_use=1)
+        retired = os.path.join(self.directory, 'worker-1.json')
+        with patch.object(os, 'remove'):
+            metrics.retire(1)
+        self.assertTrue(os.path.exists(retired))
+
+        self.assertEqual(self.requests(), 2)
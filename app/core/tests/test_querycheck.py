@@ -0,0 +1,157 @@
+import logging
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import querycheck
+from core.models import Influencer, Style, Tag
+from core.querycheck import Origin, Problem, QueryBudgetExceeded
+from core.testrunner import QueryCheckRunner
+from influencer.views import InfluencerViewSet, TagViewSet
+
+
+TAGS_URL = reverse('influencer:tag-list')
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+
+
+def unprefetched_queryset(self):
+    """the influencer list without its tags and styles prefetch"""
+    return Influencer.objects.filter(user=self.request.user)
+
+
+class NormalizeTests(TestCase):
+    """test queries differing by values share a shape"""
+
+    def test_values_blanked(self):
+        self.assertEqual(
+            querycheck.normalize(
+                "SELECT * FROM t WHERE id = 12 AND name = 'it''s'  LIMIT 3"
+            ),
+            'SELECT * FROM t WHERE id = ? AND name = ? LIMIT ?'
+        )
+
+    def test_in_lists_collapsed(self):
+        self.assertEqual(
+            querycheck.normalize('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            querycheck.normalize('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+
+@override_settings(QUERY_DETECTOR=True, QUERY_BUDGET_STRICT=False,
+                   INFLUENCER_RESPONSE_CACHE=False,
+                   INFLUENCER_FAST_SERIALIZATION=False)
+class QueryDetectorMiddlewareTests(TestCase):
+    """test the detector reports repeated and slow queries per request"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Solo')
+        style = Style.objects.create(user=self.user, name='Street')
+        for i in range(3):
+            influencer = Influencer.objects.create(
+                user=self.user, name=f'Jenny {i}', insta_id=f'jenny{i}',
+                followers=100, insta_link='https://instagram.com/jenny',
+            )
+            influencer.tags.add(tag)
+            influencer.styles.add(style)
+
+    def problems(self, logs):
+        return [record.problem for record in logs.records
+                if hasattr(record, 'problem')]
+
+    def test_n_plus_one_attributed(self):
+        """test per row queries are attributed to the field and view"""
+        with patch.object(InfluencerViewSet, 'get_queryset',
+                          unprefetched_queryset), \
+                self.assertLogs('core.querycheck', logging.WARNING) as logs:
+            self.client.get(INFLUENCERS_URL)
+
+        problems = {problem.origin.field: problem
+                    for problem in self.problems(logs)}
+        tags = problems['InfluencerSerializer.tags']
+        self.assertEqual(tags.kind, 'N+1')
+        self.assertEqual(tags.count, 3)
+        self.assertEqual(tags.view, 'InfluencerViewSet.list')
+        self.assertEqual(tags.origin.view, 'InfluencerViewSet.list')
+        self.assertTrue(tags.origin.location.startswith('influencer'))
+        self.assertIn('InfluencerSerializer.styles', problems)
+
+    def test_prefetched_list_clean(self):
+        """test the prefetched influencer list reports nothing"""
+        with patch.object(querycheck.logger, 'warning') as warning:
+            res = self.client.get(INFLUENCERS_URL)
+
+        self.assertEqual(len(res.data['results']), 3)
+        warning.assert_not_called()
+
+    @override_settings(QUERY_DETECTOR_SLOW_MS=0)
+    def test_slow_queries(self):
+        """test queries over the threshold are reported"""
+        with self.assertLogs('core.querycheck', logging.WARNING) as logs:
+            self.client.get(TAGS_URL)
+
+        problem = self.problems(logs)[0]
+        self.assertEqual(problem.kind, 'slow')
+        self.assertEqual(problem.view, 'TagViewSet.list')
+        self.assertIn('core_tag', problem.sql)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_budget_exceeded_strict(self):
+        """test a view over its query budget fails the request"""
+        with patch.object(InfluencerViewSet, 'get_queryset',
+                          unprefetched_queryset), \
+                patch.object(querycheck.logger, 'warning'):
+            with self.assertRaisesRegex(QueryBudgetExceeded,
+                                        'InfluencerViewSet.list ran'):
+                self.client.get(INFLUENCERS_URL)
+
+    def test_budget_exceeded_logged(self):
+        """test budgets are only logged unless strict"""
+        with patch.object(TagViewSet, 'query_budget', {'list': 0}), \
+                self.assertLogs('core.querycheck', logging.WARNING) as logs:
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('its query_budget is 0', logs.output[0])
+
+    @override_settings(QUERY_DETECTOR=False)
+    def test_disabled(self):
+        """test nothing is reported when switched off"""
+        with patch.object(InfluencerViewSet, 'get_queryset',
+                          unprefetched_queryset), \
+                patch.object(querycheck.logger, 'warning') as warning:
+            self.client.get(INFLUENCERS_URL)
+
+        warning.assert_not_called()
+
+
+class QueryCheckRunnerTests(TestCase):
+    """test the runner reports the problems collected during the run"""
+
+    def run_suite(self, runner, *problems):
+        for problem in problems:
+            runner.collector.emit(logging.makeLogRecord({'problem': problem}))
+        return runner.suite_result(None, MagicMock(failures=[], errors=[]))
+
+    def test_fail_on_n_plus_one(self):
+        """test repeated queries fail the run when asked to"""
+        problem = Problem('N+1', 'TagViewSet.list', 'SELECT 1', 4, 0.01,
+                          Origin(None, 'TagViewSet.list', None))
+        slow = problem._replace(kind='slow', count=1)
+
+        self.assertEqual(
+            self.run_suite(QueryCheckRunner(verbosity=0), problem), 0
+        )
+        self.assertEqual(self.run_suite(
+            QueryCheckRunner(fail_on_n_plus_one=True, verbosity=0),
+            problem, problem._replace(count=6), slow
+        ), 1)
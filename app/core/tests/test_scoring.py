@@ -0,0 +1,197 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import scoring
+from core.bulk import bulk_update
+from core.models import Tag, Style, Influencer
+from influencer.cache import get_user_version
+
+
+def sample_influencer(user, name, followers, **params):
+    """create and return a sample influencer"""
+    defaults = {
+        'insta_id': name.lower(),
+        'insta_link': f'www.instagram.com/{name.lower()}',
+    }
+    defaults.update(params)
+    return Influencer.objects.create(user=user, name=name,
+                                     followers=followers, **defaults)
+
+
+class ScoringTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.park = sample_influencer(self.user, 'Park', 999)
+        self.seo = sample_influencer(self.user, 'Seo', 9)
+        self.hong = sample_influencer(self.user, 'Hong', 0)
+
+    def scores(self):
+        return dict(Influencer.objects.values_list('name', 'score'))
+
+    def test_followers_normalized_per_user(self):
+        """test scores are min-max scaled to 0..100 per user"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        sample_influencer(other, 'Kim', 99)
+
+        scored, changed = scoring.recompute_user(self.user)
+
+        self.assertEqual((scored, changed), (3, 2))
+        self.assertEqual(self.scores(), {
+            'Park': Decimal('100.00'),
+            'Seo': Decimal('33.33'),
+            'Hong': Decimal('0.00'),
+            'Kim': Decimal('0.00'),
+        })
+
+    def test_tag_and_style_weights(self):
+        """test tag and style weights are added before normalizing"""
+        solo = Tag.objects.create(user=self.user, name='Solo')
+        chic = Style.objects.create(user=self.user, name='Chic')
+        self.hong.tags.add(solo)
+        self.hong.styles.add(chic)
+
+        scoring.recompute_user(self.user, {
+            'normalize': False,
+            'tags': {'Solo': 2.5, 'Unknown': 10},
+            'styles': {'Chic': 1},
+        })
+
+        self.assertEqual(self.scores(), {
+            'Park': Decimal('3.00'),
+            'Seo': Decimal('1.00'),
+            'Hong': Decimal('3.50'),
+        })
+
+    def test_other_users_memberships_not_read(self):
+        """test only the user's pairs of the id range are loaded"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        solo = Tag.objects.create(user=self.user, name='Solo')
+        theirs = sample_influencer(other, 'Lee', 5)
+        theirs.tags.add(Tag.objects.create(user=other, name='Solo'))
+        kim = sample_influencer(self.user, 'Kim', 0)
+        kim.tags.add(solo)
+
+        with CaptureQueriesContext(connection) as queries:
+            scoring.recompute_user(self.user, {'normalize': False,
+                                               'tags': {'Solo': 1}})
+
+        memberships = [query['sql'] for query in queries.captured_queries
+                       if 'core_influencer_tags' in query['sql']]
+        self.assertEqual(len(memberships), 1)
+        self.assertIn('"core_influencer"."user_id" =', memberships[0])
+        self.assertEqual(Influencer.objects.get(id=kim.id).score,
+                         Decimal('1.00'))
+
+    def test_chunks_match_single_pass(self):
+        """test chunking doesn't change the result"""
+        scoring.recompute_user(self.user, chunk_size=1, batch_size=1)
+        chunked = self.scores()
+        Influencer.objects.update(score=0)
+
+        scoring.recompute_user(self.user)
+
+        self.assertEqual(self.scores(), chunked)
+
+    def test_unchanged_scores_not_written(self):
+        """test a second run writes nothing and keeps the version"""
+        scoring.recompute_user(self.user)
+        version = get_user_version(self.user.id)
+
+        scored, changed = scoring.recompute_user(self.user)
+
+        self.assertEqual((scored, changed), (3, 0))
+        self.assertEqual(get_user_version(self.user.id), version)
+
+    def test_changes_bump_user_version(self):
+        """test rescoring invalidates the user's cached responses"""
+        version = get_user_version(self.user.id)
+
+        scoring.recompute_user(self.user)
+
+        self.assertNotEqual(get_user_version(self.user.id), version)
+
+    @override_settings(INFLUENCER_SCORE_WEIGHTS={'followers': 2,
+                                                 'normalize': False})
+    def test_weights_from_settings(self):
+        """test the weights setting is used"""
+        sample_influencer(self.user, 'Huge', 10 ** 9)
+
+        scoring.recompute_user(self.user)
+
+        scores = self.scores()
+        self.assertEqual(scores['Park'], Decimal('6.00'))
+        self.assertEqual(scores['Huge'], Decimal('18.00'))
+
+    def test_bulk_update(self):
+        """test bulk_update writes each object's own value"""
+        self.park.score, self.seo.score = Decimal('1.50'), Decimal('2.25')
+
+        updated = bulk_update([self.park, self.seo], ['score'],
+                              batch_size=1)
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(self.scores()['Park'], Decimal('1.50'))
+        self.assertEqual(self.scores()['Seo'], Decimal('2.25'))
+        self.assertEqual(self.scores()['Hong'], Decimal('0.00'))
+
+
+class RecomputeScoresCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        sample_influencer(self.user, 'Park', 999)
+        sample_influencer(self.user, 'Seo', 9)
+
+    def test_recompute_scores(self):
+        """test the command rescores every user"""
+        out = StringIO()
+
+        call_command('recompute_scores', stdout=out)
+
+        self.assertEqual(
+            Influencer.objects.get(name='Park').score, Decimal('100.00')
+        )
+        self.assertIn('2 scored, 1 changed', out.getvalue())
+
+    def test_weights_file(self):
+        """test weights are read from a json file"""
+        ntf = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        with ntf:
+            json.dump({'normalize': False}, ntf)
+        self.addCleanup(os.remove, ntf.name)
+
+        call_command('recompute_scores', weights=ntf.name,
+                     users=[self.user.email], stdout=StringIO())
+
+        self.assertEqual(
+            Influencer.objects.get(name='Park').score, Decimal('3.00')
+        )
+
+    def test_unknown_user(self):
+        """test an unknown user email is rejected"""
+        with self.assertRaises(CommandError):
+            call_command('recompute_scores', users=['nobody@burningb.com'],
+                         stdout=StringIO())
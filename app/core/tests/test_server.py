@@ -0,0 +1,197 @@
+import http.client
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from core import server
+
+
+LOCAL_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+
+
+def hello_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'hello']
+
+
+class WorkerTests(SimpleTestCase):
+    """test a worker serving from a shared socket"""
+
+    def setUp(self):
+        self.sock = server.bind('127.0.0.1', 0)
+        self.addCleanup(self.sock.close)
+        self.port = self.sock.getsockname()[1]
+
+    def start(self, app=hello_app, **kwargs):
+        worker = server.Worker(self.sock, app, threads=2, **kwargs)
+        thread = threading.Thread(target=worker.run)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(worker.stop)
+        return worker, thread
+
+    def get(self, path='/'):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        conn.request('GET', path)
+        res = conn.getresponse()
+        body = res.read()
+        conn.close()
+        return res.status, body
+
+    def test_serves_requests(self):
+        """test requests are answered by the wsgi app"""
+        self.start()
+
+        self.assertEqual(self.get(), (200, b'hello'))
+        self.assertEqual(self.get(), (200, b'hello'))
+
+    def test_file_wrapper_sent_with_sendfile(self):
+        """test files returned through wsgi.file_wrapper use sendfile()"""
+        content = os.urandom(256 * 1024)
+        with tempfile.NamedTemporaryFile() as stored:
+            stored.write(content)
+            stored.flush()
+
+            def file_app(environ, start_response):
+                start_response('200 OK', [
+                    ('Content-Type', 'application/octet-stream'),
+                    ('Content-Length', str(len(content))),
+                ])
+                return environ['wsgi.file_wrapper'](open(stored.name, 'rb'))
+
+            self.start(app=file_app)
+            with patch.object(socket.socket, 'sendfile', autospec=True,
+                              side_effect=socket.socket.sendfile) as sendfile:
+                status, body = self.get()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, content)
+        sendfile.assert_called_once()
+
+    def test_idle_connection_timed_out(self):
+        """test a client sending nothing is dropped and frees its thread"""
+        self.start(timeout=0.2)
+        idle = [socket.create_connection(('127.0.0.1', self.port), 5)
+                for _ in range(2)]
+        for conn in idle:
+            self.addCleanup(conn.close)
+
+        for conn in idle:
+            self.assertEqual(conn.recv(1), b'')
+        self.assertEqual(self.get(), (200, b'hello'))
+
+    def test_recycle_after_max_requests(self):
+        """test the worker stops after max_requests"""
+        worker, thread = self.start(max_requests=2)
+        self.get()
+        self.get()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(worker.requests, 2)
+
+    def test_recycle_over_max_rss(self):
+        """test the worker stops once its RSS passes max_rss"""
+        worker, thread = self.start(max_rss=1)
+        self.get()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+
+    def test_stop_drains_requests_in_flight(self):
+        """test stopping lets a running request finish"""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_app(environ, start_response):
+            started.set()
+            release.wait(5)
+            return hello_app(environ, start_response)
+
+        worker, thread = self.start(app=slow_app)
+        result = []
+        client = threading.Thread(target=lambda: result.append(self.get()))
+        client.start()
+        started.wait(5)
+
+        worker.stop()
+        release.set()
+        client.join(5)
+        thread.join(5)
+
+        self.assertEqual(result, [(200, b'hello')])
+        self.assertFalse(thread.is_alive())
+
+    def test_stopped_worker_drains_image_queue(self):
+        """test the image queue gets what is left of graceful_timeout"""
+        worker, thread = self.start()
+        worker.stop()
+        thread.join(5)
+        master = server.Master(self.sock, hello_app, graceful_timeout=30,
+                               log=lambda message: None)
+
+        with patch('influencer.images.shutdown',
+                   return_value=True) as shutdown:
+            master.finish_background_work(worker)
+
+        timeout = shutdown.call_args[1]['timeout']
+        self.assertTrue(25 < timeout <= 30)
+
+    def test_current_rss(self):
+        """test the rss reading is plausible"""
+        self.assertGreater(server.current_rss(), 1024 * 1024)
+
+
+class ServeCommandTests(SimpleTestCase):
+    """test the serve command end to end"""
+
+    def test_serve_and_drain(self):
+        """test a prefork worker answers and exits cleanly on SIGTERM"""
+        proc = subprocess.Popen(
+            [sys.executable, 'manage.py', 'serve', '--bind', '127.0.0.1:0',
+             '--workers', '1', '--threads', '2'],
+            cwd=settings.BASE_DIR, stderr=subprocess.PIPE,
+            env=dict(os.environ, PYTHONUNBUFFERED='1'),
+        )
+        self.addCleanup(proc.stderr.close)
+        try:
+            line = proc.stderr.readline().decode()
+            port = int(re.search(r':(\d+) ', line).group(1))
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            conn.request('GET', '/healthz')
+            res = conn.getresponse()
+            self.assertEqual((res.status, res.read()),
+                             (200, b'{"status": "ok"}'))
+            conn.close()
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(20)
+
+        self.assertEqual(proc.returncode, 0)
+
+    def test_invalid_bind(self):
+        """test a bind without a port is rejected"""
+        with patch.object(server, 'bind') as bind, \
+                self.assertRaises(CommandError):
+            call_command('serve', bind='localhost')
+        bind.assert_not_called()
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_workers_need_a_shared_cache(self):
+        """test several workers are refused with a process local cache"""
+        with patch.object(server, 'bind') as bind, \
+                self.assertRaisesRegex(CommandError, 'shared cache'):
+            call_command('serve', bind='127.0.0.1:0', workers=2)
+        bind.assert_not_called()
@@ -0,0 +1,148 @@
+import os
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from core.models import Influencer
+from influencer import signals
+
+
+def sample_image(color='red'):
+    """return jpeg bytes of a small image"""
+    buf = BytesIO()
+    Image.new('RGB', (10, 10), color).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+class StorageSetup:
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name,
+                                     INFLUENCER_IMAGE_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media_root = media.name
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+
+    def sample_influencer(self, name):
+        return Influencer.objects.create(
+            user=self.user,
+            name=name,
+            insta_id='asdasf',
+            followers=1234,
+            insta_link='www.instagram.com'
+        )
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, filename), self.media_root)
+            for root, _, filenames in os.walk(self.media_root)
+            for filename in filenames
+        )
+
+
+class ContentAddressedStorageTests(StorageSetup, TestCase):
+    """test profile images are deduplicated by content"""
+
+    def test_name_is_content_hash(self):
+        """test uploads are named by the sha256 of their content"""
+        name = default_storage.save('uploads/influencer/a.JPG',
+                                    ContentFile(b'content'))
+
+        self.assertEqual(
+            name,
+            'uploads/influencer/ed/'
+            'ed7002b439e9ac845f22357d822bac1444730fbdb6016d3ec9432297b9ec9f73'
+            '.jpg'
+        )
+        with default_storage.open(name) as fileobj:
+            self.assertEqual(fileobj.read(), b'content')
+
+    def test_same_content_stored_once(self):
+        """test re-uploading the same content reuses the file"""
+        park = self.sample_influencer('Park')
+        seo = self.sample_influencer('Seo')
+
+        park.profile_image.save('a.jpg', ContentFile(sample_image()))
+        park.profile_image.save('b.jpg', ContentFile(sample_image()))
+        seo.profile_image.save('c.jpg', ContentFile(sample_image()))
+
+        self.assertEqual(park.profile_image.name, seo.profile_image.name)
+        self.assertEqual(self.stored_files(), [park.profile_image.name])
+
+    def test_locked_once_written(self):
+        """test an upload takes the image lock after writing its content"""
+        park = self.sample_influencer('Park')
+        content = sample_image()
+        seen = []
+
+        def lock(using=None):
+            seen.append([
+                (os.path.basename(name),
+                 os.path.getsize(os.path.join(self.media_root, name)))
+                for name in self.stored_files()
+            ])
+
+        with patch.object(signals, 'lock_profile_images', side_effect=lock):
+            park.profile_image.save('a.jpg', ContentFile(content))
+
+        # the first lock comes before publishing, the upload fully written
+        [(name, size)] = seen[0]
+        self.assertTrue(name.startswith('.upload-'))
+        self.assertEqual(size, len(content))
+
+
+class ProfileImageReleaseTests(StorageSetup, TransactionTestCase):
+    """test stored files are deleted once their last reference commits"""
+
+    def test_file_kept_while_referenced(self):
+        """test a shared file is only deleted with its last reference"""
+        park = self.sample_influencer('Park')
+        seo = self.sample_influencer('Seo')
+        park.profile_image.save('a.jpg', ContentFile(sample_image()))
+        seo.profile_image.save('a.jpg', ContentFile(sample_image()))
+        shared = park.profile_image.name
+
+        park.profile_image.save('b.jpg', ContentFile(sample_image('blue')))
+        self.assertTrue(default_storage.exists(shared))
+
+        seo.delete()
+        self.assertFalse(default_storage.exists(shared))
+        self.assertEqual(self.stored_files(), [park.profile_image.name])
+
+    def test_rolled_back_delete_keeps_file(self):
+        """test a file is kept when the delete unreferencing it rolls back"""
+        park = self.sample_influencer('Park')
+        park.profile_image.save('a.jpg', ContentFile(sample_image()))
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            park.delete()
+            raise RuntimeError
+
+        self.assertTrue(default_storage.exists(park.profile_image.name))
+
+    def test_reference_added_before_commit_keeps_file(self):
+        """test references are checked again when the release runs"""
+        park = self.sample_influencer('Park')
+        park.profile_image.save('a.jpg', ContentFile(sample_image()))
+        name = park.profile_image.name
+
+        with transaction.atomic():
+            park.delete()
+            seo = self.sample_influencer('Seo')
+            seo.profile_image = name
+            seo.save()
+
+        self.assertEqual(self.stored_files(), [name])
@@ -0,0 +1,254 @@
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from hmac import compare_digest
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import FileResponse, Http404, HttpResponse, \
+    HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from core import metrics as request_metrics
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_range(header, size):
+    """return (start, end) of a single byte range, None to send it all
+
+    raises ValueError for a range that can't be satisfied
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as fileobj:
+        fileobj.seek(start)
+        while length > 0:
+            chunk = fileobj.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _is_immutable(path):
+    prefixes = getattr(settings, 'MEDIA_IMMUTABLE_PREFIXES', ('uploads/',))
+    return path.startswith(tuple(prefixes))
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT
+
+    with MEDIA_ACCEL_REDIRECT_PREFIX (nginx) or MEDIA_SENDFILE_HEADER
+    (e.g. X-Sendfile) set, the proxy is told to send the file and the
+    worker only returns headers. otherwise the file is returned through
+    the server's wsgi.file_wrapper, `manage.py serve` sends it with
+    sendfile(). single byte ranges are answered with 206 responses, read
+    by the worker
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        statobj = os.stat(fullpath)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404('File not found')
+    if not stat.S_ISREG(statobj.st_mode):
+        raise Http404('File not found')
+
+    size = statobj.st_size
+    etag = '"%x-%x"' % (statobj.st_mtime_ns, size)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(statobj.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if _is_immutable(path)
+        else 'public, max-age=%d' % getattr(settings, 'MEDIA_MAX_AGE', 3600),
+        'Accept-Ranges': 'bytes',
+    }
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        not_modified = etag in parse_etags(if_none_match)
+    else:
+        not_modified = not was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'),
+            statobj.st_mtime, size
+        )
+    if not_modified:
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+    sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    if accel_prefix or sendfile_header:
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + \
+                '/' + path
+        else:
+            response[sendfile_header] = fullpath
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if range_header and (not if_range or if_range == etag):
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % size
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(fullpath, 'rb'),
+                                    content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(fullpath, start, length),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+
+    for key, value in headers.items():
+        response[key] = value
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+@never_cache
+@require_safe
+def healthz(request):
+    """Liveness: the process is up and answering, nothing else is checked"""
+    return JsonResponse({'status': 'ok'})
+
+
+def _check_database():
+    started = time.perf_counter()
+    try:
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        logger.warning('readiness: database check failed', exc_info=True)
+        return {'status': 'fail'}
+    latency = (time.perf_counter() - started) * 1000
+    limit = getattr(settings, 'READINESS_DB_LATENCY_MS', 500)
+    return {
+        'status': 'ok' if latency <= limit else 'fail',
+        'latency_ms': round(latency, 3),
+    }
+
+
+_migrations_applied = False
+
+
+def _check_migrations():
+    # once applied they stay applied for the life of the process
+    global _migrations_applied
+    if _migrations_applied:
+        return {'status': 'ok', 'pending': 0}
+    try:
+        executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        pending = len(executor.migration_plan(
+            executor.loader.graph.leaf_nodes()
+        ))
+    except DatabaseError:
+        logger.warning('readiness: migrations check failed', exc_info=True)
+        return {'status': 'fail'}
+    _migrations_applied = not pending
+    return {'status': 'fail' if pending else 'ok', 'pending': pending}
+
+
+def _check_media():
+    try:
+        with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT,
+                                         prefix='.readyz-') as probe:
+            probe.write(b'ok')
+            probe.flush()
+    except OSError:
+        logger.warning('readiness: media check failed', exc_info=True)
+        return {'status': 'fail'}
+    return {'status': 'ok'}
+
+
+READINESS_CHECKS = (
+    ('database', _check_database),
+    ('migrations', _check_migrations),
+    ('media', _check_media),
+)
+
+
+@never_cache
+@require_safe
+def readyz(request):
+    """Readiness: answers 200 only when this instance can serve traffic
+
+    checks a database round trip against READINESS_DB_LATENCY_MS, that
+    no migrations are pending and that MEDIA_ROOT is writable. failures
+    answer 503 with the failing checks in the body, their errors are only
+    logged since the endpoint is public
+    """
+    checks = {name: check() for name, check in READINESS_CHECKS}
+    ready = all(result['status'] == 'ok' for result in checks.values())
+    return JsonResponse(
+        {'status': 'ok' if ready else 'fail', 'checks': checks},
+        status=200 if ready else 503,
+    )
+
+
+@never_cache
+@require_safe
+def metrics(request):
+    """Request, cache and pool metrics of this process for Prometheus
+
+    the scraper must send METRICS_TOKEN as a bearer token, without a
+    token configured the endpoint is closed
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        return HttpResponse(status=403)
+    if not compare_digest(request.META.get('HTTP_AUTHORIZATION', ''),
+                          f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(request_metrics.render(),
+                        content_type='text/plain; version=0.0.4')
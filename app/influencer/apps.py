@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class InfluencerConfig(AppConfig):
     name = 'influencer'
+
+    def ready(self):
+        from influencer import signals  # noqa: F401
@@ -0,0 +1,234 @@
+"""In-process bitmap index over influencer tag/style membership
+
+each tag and style id maps to a python int used as a bitset where bit n is
+set when the influencer at position n is related to it. positions are
+dense per user, so a bitset takes a bit per influencer of the user no
+matter how large the ids get. an index is built lazily per user
+and is only used while its version matches the user's change version.
+that version lives in the cache every worker shares, so a change made by
+another worker makes this process rebuild its index
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.models import Influencer
+from influencer.cache import get_user_version
+from influencer.filters import MATCH_ALL, fits_in_query
+
+
+RELATIONS = ('tags', 'styles')
+
+_indexes = OrderedDict()
+_lock = threading.RLock()
+_building = set()
+
+
+def ids_to_bits(ids):
+    """return a bitset with the bit of every id set"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        buf[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def bits_to_ids(bits):
+    """return the sorted ids of the bits set in a bitset"""
+    ids = []
+    digits = bin(bits)[:1:-1]
+    find = digits.find
+    pos = find('1')
+    while pos != -1:
+        ids.append(pos)
+        pos = find('1', pos + 1)
+    return ids
+
+
+def popcount(bits):
+    """return the number of ids in a bitset"""
+    return bin(bits).count('1')
+
+
+class MembershipIndex:
+    """tag and style id -> bitset of influencer positions for a single user"""
+
+    def __init__(self, version):
+        self.version = version
+        self.bitsets = {relation: {} for relation in RELATIONS}
+        # position -> influencer id, and back
+        self.ids = []
+        self.positions = {}
+        self._ordered = True
+
+    @classmethod
+    def build(cls, user_id, version):
+        """load the membership of every influencer of the user"""
+        index = cls(version)
+        members = {}
+        for relation in RELATIONS:
+            through = getattr(Influencer, relation).through
+            column = f'{relation[:-1]}_id'
+            keys = members[relation] = {}
+            rows = through.objects.filter(influencer__user_id=user_id)\
+                .values_list(column, 'influencer_id')
+            for key, influencer_id in rows.iterator():
+                keys.setdefault(key, []).append(influencer_id)
+        index.place(sorted({influencer_id
+                            for keys in members.values()
+                            for ids in keys.values()
+                            for influencer_id in ids}))
+        for relation, keys in members.items():
+            index.bitsets[relation] = {
+                key: index.to_bits(ids) for key, ids in keys.items()
+            }
+        return index
+
+    def place(self, influencer_ids):
+        """give the influencers without a position the next ones"""
+        for influencer_id in influencer_ids:
+            if influencer_id not in self.positions:
+                if self.ids and influencer_id < self.ids[-1]:
+                    self._ordered = False
+                self.positions[influencer_id] = len(self.ids)
+                self.ids.append(influencer_id)
+
+    def to_bits(self, influencer_ids):
+        """return the bitset of the placed influencers"""
+        positions = self.positions
+        return ids_to_bits(map(positions.__getitem__,
+                               filter(positions.__contains__,
+                                      influencer_ids)))
+
+    def to_ids(self, bits):
+        """return the sorted influencer ids of a bitset"""
+        result = list(map(self.ids.__getitem__, bits_to_ids(bits)))
+        if not self._ordered:
+            result.sort()
+        return result
+
+    def add(self, relation, keys, influencer_ids):
+        self.place(influencer_ids)
+        bits = self.to_bits(influencer_ids)
+        bitsets = self.bitsets[relation]
+        for key in keys:
+            bitsets[key] = bitsets.get(key, 0) | bits
+
+    def remove(self, relation, keys, influencer_ids):
+        mask = ~self.to_bits(influencer_ids)
+        bitsets = self.bitsets[relation]
+        for key in keys:
+            if key in bitsets:
+                bitsets[key] &= mask
+
+    def clear_influencers(self, relation, influencer_ids):
+        """remove influencers from every key of a relation"""
+        self.remove(relation, list(self.bitsets[relation]), influencer_ids)
+
+    def drop(self, relation, key):
+        self.bitsets[relation].pop(key, None)
+
+    def resolve(self, relation, keys, match):
+        """return the bitset of influencers matching the keys"""
+        bitsets = self.bitsets[relation]
+        sets = [bitsets.get(key, 0) for key in set(keys)]
+        if not sets:
+            return 0
+        result = sets[0]
+        for bits in sets[1:]:
+            if match == MATCH_ALL:
+                result &= bits
+            else:
+                result |= bits
+        return result
+
+
+def _max_indexes():
+    return getattr(settings, 'INFLUENCER_INDEX_MAX_USERS', 128)
+
+
+def enabled():
+    return getattr(settings, 'INFLUENCER_BITMAP_INDEX', True)
+
+
+def get_index(user_id):
+    """return the user's index if it is warm and current, else None"""
+    version = get_user_version(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is None or index.version != version:
+            return None
+        _indexes.move_to_end(user_id)
+        return index
+
+
+def warm(user_id):
+    """build the user's index, returns None if another thread is on it"""
+    with _lock:
+        if user_id in _building:
+            return None
+        _building.add(user_id)
+    try:
+        version = get_user_version(user_id)
+        index = MembershipIndex.build(user_id, version)
+        with _lock:
+            _indexes[user_id] = index
+            _indexes.move_to_end(user_id)
+            while len(_indexes) > _max_indexes():
+                _indexes.popitem(last=False)
+        return index
+    finally:
+        with _lock:
+            _building.discard(user_id)
+
+
+def for_user(user_id):
+    """return a usable index for the user, building it when cold"""
+    if not enabled():
+        return None
+    return get_index(user_id) or warm(user_id)
+
+
+def apply_change(user_id, old_versions, new_version, change):
+    """apply an in-place change to the index after a version bump
+
+    the index stays warm only if it is at one of old_versions, i.e.
+    nobody else changed the user's data since, otherwise it is dropped
+    """
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            return
+        if index.version not in old_versions:
+            del _indexes[user_id]
+            return
+        change(index)
+        index.version = new_version
+
+
+def reset():
+    """drop every index of this process"""
+    with _lock:
+        _indexes.clear()
+
+
+def resolve_ids(user_id, filters, match):
+    """resolve {'tags': ids, 'styles': ids} to a sorted id list
+
+    returns None when the index can't be used and sql should be used
+    instead
+    """
+    index = for_user(user_id)
+    if index is None:
+        return None
+    result = None
+    for relation, keys in filters.items():
+        bits = index.resolve(relation, keys, match)
+        result = bits if result is None else result & bits
+    ids = index.to_ids(result or 0)
+    if not fits_in_query(ids):
+        return None
+    return ids
@@ -0,0 +1,65 @@
+"""Set-based updates and deletes of many influencers at once
+
+the per row signal handlers are skipped for speed, so the cache
+bookkeeping they would do happens here once per call instead
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from core.bulk import bulk_update
+from core.models import Influencer
+from influencer import bitmap, leaderboard
+from influencer.signals import bulk_delete, changed, \
+    release_profile_image
+
+
+UPDATE_CHUNK_SIZE = 500
+
+
+def max_batch():
+    return getattr(settings, 'INFLUENCER_BULK_MAX_BATCH', 1000)
+
+
+def id_batches(ids, model=Influencer):
+    """split ids to stay under the backend's parameter limit"""
+    connection = connections[router.db_for_write(model)]
+    size = connection.features.max_query_params or len(ids) or 1
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def update_influencers(user, influencers, fields):
+    """write fields of already modified influencers in chunks"""
+    if not influencers:
+        return 0
+    updated = bulk_update(influencers, sorted(fields),
+                          batch_size=UPDATE_CHUNK_SIZE)
+    # values changed under every board of the user, drop them
+    changed(user.id, top_change=lambda board: False)
+    return updated
+
+
+def delete_influencers(user, ids):
+    """delete influencers and their memberships, returns the rows deleted"""
+    ids = sorted(ids)
+    deleted = 0
+    images = set()
+    using = router.db_for_write(Influencer)
+    with transaction.atomic(using=using), bulk_delete():
+        for batch in id_batches(ids):
+            influencers = Influencer.objects.filter(id__in=batch)
+            images.update(
+                influencers.exclude(profile_image='')
+                .values_list('profile_image', flat=True)
+            )
+            # the memberships go along, as set-based deletes
+            _, rows = influencers.delete()
+            deleted += rows.get(Influencer._meta.label, 0)
+
+        def change(index):
+            for relation in bitmap.RELATIONS:
+                index.clear_influencers(relation, ids)
+        changed(user.id, change, leaderboard.influencers_deleted(ids))
+        for name in sorted(images):
+            release_profile_image(name)
+    return deleted
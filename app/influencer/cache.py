@@ -0,0 +1,57 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+
+VERSION_KEY = 'influencer:version:{user_id}'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _fresh_version():
+    """return a version that can't collide with an evicted counter"""
+    return time.time_ns()
+
+
+def get_user_version(user_id):
+    """return the change version of a user's tags, styles and influencers"""
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    """mark a user's data as changed and return the new version"""
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, None)
+        return version
+
+
+def user_cache_key(user_id, name, params):
+    """return a cache key that changes whenever the user's data changes"""
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    version = get_user_version(user_id)
+    return f'influencer:{name}:{user_id}:{version}:{digest}'
+
+
+def record(event):
+    """count a response cache event ('hit' or 'miss') for this process"""
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def cache_stats():
+    """return the response cache hit/miss counters of this process"""
+    with _stats_lock:
+        return {'hit': _stats['hit'], 'miss': _stats['miss']}
@@ -0,0 +1,113 @@
+"""Streaming export of an influencer roster as CSV, NDJSON or a JSON array
+
+rows are read through a server-side cursor and encoded one chunk at a
+time, so memory stays flat and the first bytes go out before the last
+rows are read. tags and styles are written as names in the layout the
+import_influencers command reads back
+"""
+import csv
+import io
+import json
+
+from django.http import StreamingHttpResponse
+
+from core.models import Tag, Style
+from influencer.filters import member_ids
+
+
+FIELDS = ('id', 'name', 'insta_id', 'followers', 'insta_link', 'score')
+COLUMNS = FIELDS + ('tags', 'styles')
+NAME_SEPARATOR = '|'
+# tag/style ids of a chunk are looked up with one IN query, keep it under
+# sqlite's 999 parameters
+CHUNK_SIZE = 500
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+
+
+def iter_chunks(user, queryset, chunk_size=None):
+    """yield lists of export row dicts in id order"""
+    chunk_size = chunk_size or CHUNK_SIZE
+    names = {
+        'tags': dict(Tag.objects.filter(user=user).values_list('id', 'name')),
+        'styles': dict(Style.objects.filter(user=user)
+                       .values_list('id', 'name')),
+    }
+    rows = queryset.prefetch_related(None).order_by('id')\
+        .values(*FIELDS).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _with_members(chunk, names)
+            chunk = []
+    if chunk:
+        yield _with_members(chunk, names)
+
+
+def _with_members(chunk, names):
+    ids = [row['id'] for row in chunk]
+    for relation, lookup in names.items():
+        members = member_ids(relation, ids)
+        for row in chunk:
+            row[relation] = [lookup[key] for key in members.get(row['id'], [])]
+    return chunk
+
+
+def _json_row(row):
+    return json.dumps(dict(row, score=str(row['score'])),
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow(
+                [row[field] for field in FIELDS] +
+                [NAME_SEPARATOR.join(row['tags']),
+                 NAME_SEPARATOR.join(row['styles'])]
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(chunks):
+    for chunk in chunks:
+        yield ''.join(_json_row(row) + '\n' for row in chunk)
+
+
+def encode_json(chunks):
+    yield '['
+    separator = ''
+    for chunk in chunks:
+        yield separator + ','.join(_json_row(row) for row in chunk)
+        separator = ','
+    yield ']'
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+    'json': encode_json,
+}
+
+
+def streaming_response(user, queryset, fmt):
+    """return a StreamingHttpResponse exporting the queryset as fmt"""
+    chunks = ENCODERS[fmt](iter_chunks(user, queryset))
+    response = StreamingHttpResponse(
+        (text.encode('utf-8') for text in chunks if text),
+        content_type=CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = \
+        f'attachment; filename="influencers.{fmt}"'
+    return response
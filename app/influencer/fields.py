@@ -0,0 +1,61 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class UserOwnedManyRelatedField(serializers.ManyRelatedField):
+    """Validate a list of primary keys with a single id__in query
+
+    every missing id is reported at once, and the resolved instances are
+    returned so saving the relation needs no further lookups
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk = queryset.model._meta.pk
+        ids = []
+        for value in data:
+            if child.pk_field is not None:
+                value = child.pk_field.to_internal_value(value)
+            try:
+                ids.append(pk.to_python(value))
+            except (DjangoValidationError, TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(value).__name__)
+
+        objs = queryset.in_bulk(set(ids)) if ids else {}
+        missing = [value for value in dict.fromkeys(ids) if value not in objs]
+        if missing:
+            raise serializers.ValidationError([
+                child.error_messages['does_not_exist'].format(pk_value=value)
+                for value in missing
+            ])
+        return [objs[value] for value in ids]
+
+
+class UserOwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field limited to objects of the requesting user
+
+    with many=True the whole list is validated in one query
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(user=request.user)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserOwnedManyRelatedField(**list_kwargs)
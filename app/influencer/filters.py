@@ -0,0 +1,57 @@
+from django.db import connections, router
+from django.db.models import Count
+
+from core.models import Influencer
+
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+MATCH_MODES = (MATCH_ANY, MATCH_ALL)
+
+# parameters a list query binds besides its id list: the user, the keyset
+# cursor, the limit, with room to spare
+RESERVED_PARAMS = 16
+
+
+def fits_in_query(ids):
+    """return whether ids can be bound as one IN list of a list query"""
+    connection = connections[router.db_for_read(Influencer)]
+    max_params = connection.features.max_query_params
+    return max_params is None or len(ids) <= max_params - RESERVED_PARAMS
+
+
+def members_of(relation, ids, match=MATCH_ANY):
+    """return a subquery of influencer ids related to the given ids
+
+    relation is 'tags' or 'styles'. with match='all' an influencer must be
+    related to every id, which compiles to a single GROUP BY/HAVING over
+    the through table instead of one join per id
+    """
+    through = getattr(Influencer, relation).through
+    column = relation[:-1]
+    ids = set(ids)
+    members = through.objects.filter(**{f'{column}__in': ids})
+    if match == MATCH_ALL:
+        # the through table is unique on (influencer, tag/style) and the ids
+        # are deduplicated, so a plain count equals the distinct count
+        members = members.values('influencer_id').annotate(
+            matched=Count(column)
+        ).filter(matched=len(ids))
+    return members.values('influencer_id')
+
+
+def filter_by_members(queryset, relation, ids, match=MATCH_ANY):
+    """filter influencers by tag or style ids without duplicating rows"""
+    return queryset.filter(id__in=members_of(relation, ids, match))
+
+
+def member_ids(relation, influencer_ids):
+    """return {influencer id: sorted tag/style ids} in one query"""
+    through = getattr(Influencer, relation).through
+    column = f'{relation[:-1]}_id'
+    members = {}
+    rows = through.objects.filter(influencer_id__in=influencer_ids)\
+        .order_by(column).values_list('influencer_id', column)
+    for influencer_id, key in rows:
+        members.setdefault(influencer_id, []).append(key)
+    return members
@@ -0,0 +1,174 @@
+"""Profile image derivatives (resized JPEG/WebP copies of the upload)
+
+derivatives are generated off the request path by a per-process thread
+pool and stored next to each other under predictable names, so their
+urls can be derived from the original's name
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, features
+
+from core.models import Influencer
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives/influencer/'
+DEFAULT_SIZES = (64, 256, 1024)
+DEFAULT_FORMATS = ('JPEG', 'WEBP')
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': 80, 'method': 4},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_sizes():
+    return sorted(getattr(settings, 'INFLUENCER_IMAGE_SIZES', DEFAULT_SIZES),
+                  reverse=True)
+
+
+def get_formats():
+    formats = getattr(settings, 'INFLUENCER_IMAGE_FORMATS', DEFAULT_FORMATS)
+    return [fmt for fmt in formats
+            if fmt != 'WEBP' or features.check('webp')]
+
+
+def derivative_name(name, size, fmt):
+    """return the storage name of one derivative of an original
+
+    the original's extension stays in the name: the same content stored
+    as .jpg and as .jpeg is two files, referenced and released apart, so
+    each needs derivatives of its own
+    """
+    base = os.path.basename(name).replace('.', '_')
+    return f'{DERIVATIVES_DIR}{base}_{size}.{EXTENSIONS[fmt]}'
+
+
+def derivative_names(name):
+    """return {size: {format: name}} for every configured derivative"""
+    return {
+        size: {fmt: derivative_name(name, size, fmt)
+               for fmt in get_formats()}
+        for size in get_sizes()
+    }
+
+
+def generate_derivatives(name, storage=default_storage):
+    """write every derivative of the stored original image"""
+    sizes = get_sizes()
+    targets = [target for names in derivative_names(name).values()
+               for target in names.values()]
+    if all(storage.exists(target) for target in targets):
+        return
+
+    with storage.open(name) as fileobj:
+        image = Image.open(fileobj)
+        # let the decoder downscale (JPEG DCT scaling) to the largest size
+        # we need instead of decoding every pixel of the original
+        image.draft('RGB', (sizes[0], sizes[0]))
+        image = image.convert('RGB')
+
+    for size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS)
+        for fmt in get_formats():
+            buf = BytesIO()
+            image.save(buf, fmt, **SAVE_OPTIONS.get(fmt, {}))
+            target = derivative_name(name, size, fmt)
+            storage.delete(target)
+            storage.save(target, ContentFile(buf.getvalue()))
+
+
+def delete_derivatives(name, storage=default_storage):
+    """remove every derivative of an original"""
+    for names in derivative_names(name).values():
+        for target in names.values():
+            storage.delete(target)
+
+
+def mark_ready(name):
+    """flag the rows showing name as having their derivatives
+
+    and bump their owners' versions, the detail responses and ETags
+    cached without the derivatives are stale now
+    """
+    from influencer.signals import changed
+
+    rows = Influencer.objects.filter(profile_image=name,
+                                     profile_image_ready=False)
+    user_ids = set(rows.values_list('user_id', flat=True))
+    if not user_ids:
+        return
+    rows.update(profile_image_ready=True)
+    for user_id in sorted(user_ids):
+        changed(user_id)
+
+
+def _generate(name):
+    try:
+        generate_derivatives(name)
+        mark_ready(name)
+    except Exception:
+        logger.exception('Failed to generate derivatives of %s', name)
+        raise
+
+
+def _generate_in_pool(name):
+    try:
+        _generate(name)
+    finally:
+        # pool threads keep no database connection between jobs
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'INFLUENCER_IMAGE_WORKERS', 2),
+                thread_name_prefix='derivatives',
+            )
+        return _executor
+
+
+def enqueue(name):
+    """schedule derivative generation, returns a future
+
+    with INFLUENCER_IMAGE_WORKERS = 0 the derivatives are generated
+    synchronously and None is returned
+    """
+    if getattr(settings, 'INFLUENCER_IMAGE_WORKERS', 2) == 0:
+        _generate(name)
+        return None
+    return get_executor().submit(_generate_in_pool, name)
+
+
+def shutdown(timeout=None):
+    """wait up to timeout seconds for the queued derivatives to be written
+
+    returns whether they all were. called by exiting server workers,
+    whose os._exit would otherwise drop the queue. a later enqueue starts
+    a new pool
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is None:
+        return True
+    # ThreadPoolExecutor.shutdown(wait=True) has no timeout of its own
+    waiter = threading.Thread(target=executor.shutdown, daemon=True)
+    waiter.start()
+    waiter.join(timeout)
+    return not waiter.is_alive()
@@ -0,0 +1,268 @@
+"""Top-K influencers per (user, metric, facet) kept in the shared cache
+
+a board holds the best INFLUENCER_LEADERBOARD_SIZE (value, id) entries of
+a user's roster, optionally restricted to one tag or style, plus whether
+that is the whole facet. boards are stamped with the user's change
+version: signal handlers update them in place on influencer save/delete
+and restamp them, any change that isn't applied (bulk imports, score
+recomputation, a concurrent writer) leaves them stale and they are
+rebuilt from sql on the next read. a user keeps at most
+INFLUENCER_LEADERBOARD_MAX_BOARDS boards, the top of any further facet
+is read from sql
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import Influencer
+from influencer.cache import get_user_version
+
+
+METRICS = ('score', 'followers')
+RELATIONS = ('tags', 'styles')
+FACET_ALL = ('all', None)
+REGISTRY_KEY = 'influencer:top:{user_id}'
+BOARD_KEY = 'influencer:top:{user_id}:{metric}:{relation}:{key}'
+
+
+def size():
+    return getattr(settings, 'INFLUENCER_LEADERBOARD_SIZE', 100)
+
+
+def enabled():
+    return getattr(settings, 'INFLUENCER_LEADERBOARD', True)
+
+
+def max_boards():
+    return getattr(settings, 'INFLUENCER_LEADERBOARD_MAX_BOARDS', 64)
+
+
+def board_key(user_id, metric, facet):
+    relation, key = facet
+    return BOARD_KEY.format(user_id=user_id, metric=metric,
+                            relation=relation, key=key)
+
+
+def facet_queryset(user_id, facet):
+    """return the influencers of a facet"""
+    relation, key = facet
+    queryset = Influencer.objects.filter(user_id=user_id)
+    if relation in RELATIONS:
+        queryset = queryset.filter(**{f'{relation}__id': key})
+    return queryset
+
+
+def top_sql(user_id, metric, facet, k):
+    """return the ids of the best k influencers straight from sql"""
+    return list(
+        facet_queryset(user_id, facet).order_by(f'-{metric}', 'id')
+        .values_list('id', flat=True)[:k]
+    )
+
+
+def top_entries(user_id, metric, facet, k):
+    """return the best k [value, id] entries of a facet from sql"""
+    return [list(row) for row in
+            facet_queryset(user_id, facet).order_by(f'-{metric}', 'id')
+            .values_list(metric, 'id')[:k]]
+
+
+class Leaderboard:
+    """best entries of one facet, ordered by value desc then id"""
+
+    def __init__(self, user_id, metric, facet, version, entries, complete):
+        self.user_id = user_id
+        self.metric = metric
+        self.facet = facet
+        self.version = version
+        self.entries = entries
+        self.complete = complete
+
+    @classmethod
+    def build(cls, user_id, metric, facet, version):
+        capacity = size()
+        entries = top_entries(user_id, metric, facet, capacity + 1)
+        return cls(user_id, metric, facet, version, entries[:capacity],
+                   len(entries) <= capacity)
+
+    def ids(self, k):
+        return [pk for _, pk in self.entries[:k]]
+
+    def covers(self, k):
+        """whether the board holds the true top k"""
+        return self.complete or len(self.entries) >= k
+
+    def discard(self, pk):
+        """remove an entry, returns whether it was on the board"""
+        for i, (_, entry_pk) in enumerate(self.entries):
+            if entry_pk == pk:
+                del self.entries[i]
+                return True
+        return False
+
+    def is_member(self, pk):
+        relation, key = self.facet
+        if relation not in RELATIONS:
+            return True
+        through = getattr(Influencer, relation).through
+        column = f'{relation[:-1]}_id'
+        return through.objects.filter(
+            influencer_id=pk, **{column: key}
+        ).exists()
+
+    def offer(self, pk, value, last, was_entry=False, created=False):
+        """place a saved influencer on the board if it belongs there
+
+        last is the board's last entry before the influencer was discarded.
+        an influencer that falls past it on an incomplete board is dropped
+        rather than kept out of order, the board then covers fewer entries
+        until it is rebuilt
+        """
+        if not self.complete and \
+                (last is None or (-value, pk) > (-last[0], last[1])):
+            return
+        if not was_entry:
+            if created and self.facet != FACET_ALL:
+                return
+            if not self.is_member(pk):
+                return
+        position = 0
+        while position < len(self.entries) and \
+                (-self.entries[position][0], self.entries[position][1]) < \
+                (-value, pk):
+            position += 1
+        self.entries.insert(position, [value, pk])
+        if len(self.entries) > size():
+            del self.entries[size():]
+            self.complete = False
+
+    def save(self):
+        cache.set(board_key(self.user_id, self.metric, self.facet), {
+            'version': self.version,
+            'entries': self.entries,
+            'complete': self.complete,
+        }, None)
+
+
+def load(user_id, metric, facet):
+    """return the stored board or None"""
+    data = cache.get(board_key(user_id, metric, facet))
+    if data is None:
+        return None
+    return Leaderboard(user_id, metric, facet, data['version'],
+                       data['entries'], data['complete'])
+
+
+def register(user_id, metric, facet):
+    """add a board to the user's registry, False when it is full"""
+    key = REGISTRY_KEY.format(user_id=user_id)
+    boards = cache.get(key) or set()
+    if (metric, facet) in boards:
+        return True
+    if len(boards) >= max_boards():
+        return False
+    cache.set(key, boards | {(metric, facet)}, None)
+    return True
+
+
+def get_board(user_id, metric, facet):
+    """return a current board for the facet, rebuilding a stale one
+
+    returns None when the board is not stored and the user's registry
+    has no room for it
+    """
+    version = get_user_version(user_id)
+    board = load(user_id, metric, facet)
+    if board is None or board.version != version:
+        if not register(user_id, metric, facet):
+            return None
+        board = Leaderboard.build(user_id, metric, facet, version)
+        board.save()
+    return board
+
+
+def top_ids(user_id, metric, facet, k):
+    """return the ids of the best k influencers of a facet"""
+    if not enabled() or k > size():
+        return top_sql(user_id, metric, facet, k)
+    board = get_board(user_id, metric, facet)
+    if board is None:
+        return top_sql(user_id, metric, facet, k)
+    if not board.covers(k):
+        board = Leaderboard.build(user_id, metric, facet, board.version)
+        board.save()
+    return board.ids(k)
+
+
+def registered(user_id):
+    return cache.get(REGISTRY_KEY.format(user_id=user_id)) or set()
+
+
+def apply_change(user_id, old_versions, new_version, change):
+    """apply a change to every stored board of the user
+
+    change(board) returns False when the board has to be dropped. boards
+    not at one of old_versions missed an earlier change and are dropped
+    as well, and so are they from the registry
+    """
+    boards = registered(user_id)
+    if not boards:
+        return
+    keys = {board_key(user_id, metric, facet): (metric, facet)
+            for metric, facet in boards}
+    stored = cache.get_many(list(keys))
+    kept = set()
+    for key, (metric, facet) in keys.items():
+        data = stored.get(key)
+        if data is None:
+            continue
+        board = Leaderboard(user_id, metric, facet, data['version'],
+                            data['entries'], data['complete'])
+        if board.version not in old_versions or change(board) is False:
+            cache.delete(key)
+            continue
+        board.version = new_version
+        board.save()
+        kept.add((metric, facet))
+    if kept != boards:
+        cache.set(REGISTRY_KEY.format(user_id=user_id), kept, None)
+
+
+def influencer_saved(instance, created):
+    """return the change placing a saved influencer on every board"""
+    def change(board):
+        value = getattr(instance, board.metric)
+        value = Influencer._meta.get_field(board.metric).to_python(value)
+        last = board.entries[-1] if board.entries else None
+        was_entry = board.discard(instance.pk)
+        board.offer(instance.pk, value, last, was_entry, created)
+    return change
+
+
+def influencer_deleted(pk):
+    """return the change removing a deleted influencer from every board"""
+    def change(board):
+        board.discard(pk)
+    return change
+
+
+def influencers_deleted(pks):
+    """return the change removing many deleted influencers"""
+    pks = set(pks)
+
+    def change(board):
+        board.entries = [entry for entry in board.entries
+                         if entry[1] not in pks]
+    return change
+
+
+def facets_changed(relation, keys=None):
+    """return the change dropping the boards of changed tags/styles
+
+    keys None drops every board of the relation
+    """
+    def change(board):
+        board_relation, facet_key = board.facet
+        if board_relation == relation and \
+                (keys is None or facet_key in keys):
+            return False
+    return change
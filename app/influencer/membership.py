@@ -0,0 +1,138 @@
+"""Set-based tag/style membership changes across many influencers
+
+the through tables are written with one INSERT ... SELECT and one DELETE
+per relation and batch of influencers instead of a rewrite of every
+influencer's m2m set. the ORM
+m2m_changed signals are sent once per tag/style afterwards so version
+bumps, the bitmap index and the leaderboards stay current. their
+handlers apply the change only once the transaction commits
+"""
+from django.db import connections, router, transaction
+from django.db.models import IntegerField, Value
+from django.db.models.signals import m2m_changed
+
+from core.models import Tag, Style, Influencer
+
+
+MODELS = {'tags': Tag, 'styles': Style}
+BATCH_SIZE = 500
+
+
+def owned_ids(user, influencer_ids, keys):
+    """return the ids of each kind that belong to the user in one query
+
+    keys is {'tags': ids, 'styles': ids}, the result uses the same shape
+    with an extra 'influencers' entry
+    """
+    kinds = [('influencers', Influencer, influencer_ids)] + \
+        [(relation, MODELS[relation], ids) for relation, ids in keys.items()]
+    queries = [
+        model.objects.filter(user=user, id__in=set(ids)).order_by()
+        .annotate(kind=Value(i, output_field=IntegerField()))
+        .values_list('kind', 'id')
+        for i, (_, model, ids) in enumerate(kinds) if ids
+    ]
+    owned = {name: set() for name, _, _ in kinds}
+    if not queries:
+        return owned
+    rows = queries[0].union(*queries[1:], all=True) \
+        if len(queries) > 1 else queries[0]
+    for kind, pk in rows:
+        owned[kinds[kind][0]].add(pk)
+    return owned
+
+
+def _columns(relation):
+    field = Influencer._meta.get_field(relation)
+    through = field.remote_field.through
+    return through, field.m2m_column_name(), field.m2m_reverse_name()
+
+
+def _batches(influencer_ids, keys, connection):
+    """split influencer ids to stay under the backend's parameter limit"""
+    size = BATCH_SIZE
+    if connection.features.max_query_params is not None:
+        size = min(size, connection.features.max_query_params - len(keys))
+    for start in range(0, len(influencer_ids), size):
+        yield influencer_ids[start:start + size]
+
+
+def add_members(relation, influencer_ids, keys):
+    """relate influencers to tag/style keys, returns the rows added"""
+    through, source, target = _columns(relation)
+    connection = connections[router.db_for_write(through)]
+    quote = connection.ops.quote_name
+    table = quote(through._meta.db_table)
+    keys = sorted(keys)
+    added = 0
+    with connection.cursor() as cursor:
+        for batch in _batches(influencer_ids, keys, connection):
+            cursor.execute(
+                f'INSERT INTO {table} ({quote(source)}, {quote(target)}) '
+                f'SELECT i.id, k.id '
+                f'FROM {quote(Influencer._meta.db_table)} i '
+                f'CROSS JOIN {quote(MODELS[relation]._meta.db_table)} k '
+                f'WHERE i.id IN ({", ".join(["%s"] * len(batch))}) '
+                f'AND k.id IN ({", ".join(["%s"] * len(keys))}) '
+                f'AND NOT EXISTS (SELECT 1 FROM {table} x '
+                f'WHERE x.{quote(source)} = i.id '
+                f'AND x.{quote(target)} = k.id)',
+                batch + keys,
+            )
+            added += cursor.rowcount
+    return added
+
+
+def remove_members(relation, influencer_ids, keys):
+    """unrelate influencers from tag/style keys, returns the rows removed"""
+    through, source, target = _columns(relation)
+    connection = connections[router.db_for_write(through)]
+    removed = 0
+    for batch in _batches(influencer_ids, keys, connection):
+        deleted, _ = through.objects.filter(**{
+            f'{source}__in': batch, f'{target}__in': list(keys),
+        }).delete()
+        removed += deleted
+    return removed
+
+
+def send_changed(relation, action, user, keys, influencer_ids):
+    """send m2m_changed from each tag/style's side for a bulk change"""
+    through = getattr(Influencer, relation).through
+    model = MODELS[relation]
+    for key in sorted(keys):
+        m2m_changed.send(
+            sender=through, instance=model(id=key, user=user),
+            action=action, reverse=True, model=Influencer,
+            pk_set=set(influencer_ids), using=router.db_for_write(through),
+        )
+
+
+def bulk_change(user, influencers, add=None, remove=None):
+    """add and remove tag/style ids across an influencer queryset
+
+    add and remove are {'tags': ids, 'styles': ids} of ids the user owns.
+    returns the number of influencers and {relation: rows} added/removed
+    """
+    add, remove = add or {}, remove or {}
+    result = {'influencers': 0, 'added': {}, 'removed': {}}
+    with transaction.atomic():
+        # resolved once up front: removing a tag can take influencers out of
+        # a ?tags= filtered queryset before the adds run
+        influencer_ids = list(influencers.order_by('id')
+                              .values_list('id', flat=True))
+        result['influencers'] = len(influencer_ids)
+        for relation, keys in sorted(remove.items()):
+            result['removed'][relation] = \
+                remove_members(relation, influencer_ids, keys) if keys else 0
+        for relation, keys in sorted(add.items()):
+            result['added'][relation] = \
+                add_members(relation, influencer_ids, keys) if keys else 0
+
+        # sent inside the transaction like the ORM's own m2m_changed, the
+        # handlers defer the index and board updates to transaction.on_commit
+        # so a rolled back change never reaches them
+        for action, changes in (('post_remove', remove), ('post_add', add)):
+            for relation, keys in sorted(changes.items()):
+                send_changed(relation, action, user, keys, influencer_ids)
+    return result
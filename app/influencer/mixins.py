@@ -0,0 +1,157 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from core.cache import enabled_with_shared_cache
+from core.middleware import timed_serializer_class
+from influencer.cache import get_user_version, record, user_cache_key
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+    default_code = 'not_modified'
+
+
+class ConditionalGetMixin:
+    """Answer GET requests with a matching If-None-Match with a 304
+
+    the strong etag is derived from the user's change version and the
+    request itself, so it is checked right after authentication without
+    running the queryset or the serializer. the version has to be the one
+    every process shares, so INFLUENCER_ETAGS defaults to on only with a
+    shared cache
+    """
+    etag = None
+
+    def get_etag(self, request):
+        raw = repr((
+            request.user.id,
+            get_user_version(request.user.id),
+            type(self).__name__,
+            request.get_host(),
+            request.get_full_path(),
+            request.accepted_media_type,
+        ))
+        return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or \
+                not enabled_with_shared_cache('INFLUENCER_ETAGS'):
+            return
+        self.etag = self.get_etag(request)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if '*' in etags or self.etag in etags:
+                raise NotModified
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args,
+                                             **kwargs)
+        if self.etag and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+        return response
+
+
+class CachedListMixin:
+    """Cache list responses per user until the user's data changes
+
+    the key includes the user's change version, so any write to their
+    tags, styles or influencers makes every cached list unreachable.
+    INFLUENCER_RESPONSE_CACHE defaults to on only with a shared cache
+    """
+    list_cache_timeout = 300
+
+    def list_cache_key(self, request):
+        params = sorted(
+            (key, values) for key, values in request.query_params.lists()
+        )
+        return user_cache_key(
+            request.user.id,
+            f'list:{type(self).__name__}',
+            (request.get_host(), params),
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not enabled_with_shared_cache('INFLUENCER_RESPONSE_CACHE'):
+            return super().list(request, *args, **kwargs)
+
+        key = self.list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            record('hit')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record('miss')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.list_cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class SerializationTimingMixin:
+    """Count the view's serializer.data as the request's serialization
+
+    PerformanceMiddleware reports it as its own phase, apart from the SQL
+    and the JSON rendering. the timed serializer classes are made once, not
+    per request
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = timed_serializer_class(
+            self.get_serializer_class()
+        )
+        kwargs['context'] = self.get_serializer_context()
+        return serializer_class(*args, **kwargs)
+
+
+class FastListMixin:
+    """Build list responses from values() rows instead of the serializer
+
+    opt-in with INFLUENCER_FAST_SERIALIZATION. the rows must render to the
+    same JSON as serializer_class, the tests compare both byte for byte
+    """
+    fast_fields = ()
+
+    def fast_queryset(self, queryset):
+        """return the values() queryset the rows are read from"""
+        return queryset.prefetch_related(None).values(*self.fast_fields)
+
+    def fast_rows(self, rows):
+        """return the response dicts for a page of values() rows"""
+        return [{field: row[field] for field in self.fast_fields}
+                for row in rows]
+
+    def serialize_rows(self, rows):
+        timings = getattr(self.request, '_timings', None)
+        if timings is None:
+            return self.fast_rows(rows)
+        return timings.serializing(self.fast_rows, rows)
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'INFLUENCER_FAST_SERIALIZATION', False):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.fast_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_rows(page))
+        return Response(self.serialize_rows(queryset))
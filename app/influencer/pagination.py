@@ -0,0 +1,160 @@
+import decimal
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination seeking on (<sort key>, id) instead of offsets
+
+    every page is a single range scan over the (user, <sort key>, id)
+    indexes, so deep pages cost the same as the first one
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    ordering_fields = ('id', 'followers', 'score', 'name')
+    default_ordering = '-id'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request)
+        self.page_size = self.get_page_size(request)
+        field, descending = self.ordering.lstrip('-'), \
+            self.ordering.startswith('-')
+        cursor = self.decode_cursor(request)
+        if cursor and field != 'id':
+            cursor['v'] = self.decode_value(queryset.model, field,
+                                            cursor['v'])
+
+        reverse = bool(cursor and cursor['r'])
+        if reverse:
+            descending = not descending
+        if cursor:
+            queryset = queryset.filter(
+                self.seek_filter(field, descending, cursor)
+            )
+        prefix = '-' if descending else ''
+        order = [prefix + field]
+        if field != 'id':
+            order.append(prefix + 'id')
+        rows = list(queryset.order_by(*order)[:self.page_size + 1])
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if rows and (has_more or reverse):
+            self.next_cursor = self.position(rows[-1], field, False)
+        if rows and (has_more if reverse else cursor is not None):
+            self.previous_cursor = self.position(rows[0], field, True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.next_cursor)),
+            ('previous', self.get_link(self.previous_cursor)),
+            ('results', data),
+        ]))
+
+    def get_ordering(self, request):
+        """return the requested ordering, falling back to the default"""
+        ordering = request.query_params.get(self.ordering_query_param, '')
+        if ordering.lstrip('-') in self.ordering_fields:
+            return ordering
+        return self.default_ordering
+
+    def get_page_size(self, request):
+        """return the requested page size, capped to max_page_size"""
+        try:
+            page_size = int(
+                request.query_params[self.page_size_query_param]
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def seek_filter(self, field, descending, cursor):
+        """return the filter selecting rows after the cursor position"""
+        lookup = 'lt' if descending else 'gt'
+        after_id = Q(**{f'id__{lookup}': cursor['i']})
+        if field == 'id':
+            return after_id
+        return Q(**{f'{field}__{lookup}': cursor['v']}) | \
+            (Q(**{field: cursor['v']}) & after_id)
+
+    def position(self, row, field, reverse):
+        """return the cursor pointing at a row"""
+        if isinstance(row, dict):
+            value, pk = row[field], row['id']
+        else:
+            value, pk = getattr(row, field), row.pk
+        return {
+            'o': self.ordering,
+            'v': str(value) if field == 'score' else value,
+            'i': pk,
+            'r': reverse,
+        }
+
+    def decode_cursor(self, request):
+        """return the cursor from the request or None for the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(
+                urlsafe_b64decode(encoded.encode('ascii')).decode()
+            )
+            if cursor['o'] != self.ordering or \
+                    not isinstance(cursor['i'], int):
+                raise ValueError
+            cursor['r'] = bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def decode_value(self, model, field, value):
+        """return the cursor's sort key value as the model field takes it
+
+        a cursor is client input, a value the column can't hold would
+        fail the query instead of the request
+        """
+        model_field = model._meta.get_field(field)
+        try:
+            value = model_field.to_python(value)
+            model_field.run_validators(value)
+        except (TypeError, ValueError, ValidationError,
+                decimal.InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+        # sqlite declares no integer range for run_validators to check
+        if value is None or \
+                isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def get_link(self, cursor):
+        """return the url for a cursor or None"""
+        if cursor is None:
+            return None
+        encoded = urlsafe_b64encode(
+            json.dumps(cursor, separators=(',', ':')).encode()
+        ).decode('ascii')
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
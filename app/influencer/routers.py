@@ -0,0 +1,16 @@
+from rest_framework.routers import DefaultRouter
+
+
+class BulkRouter(DefaultRouter):
+    """DefaultRouter that also routes PATCH and DELETE on list urls
+
+    they are only bound for viewsets that implement bulk_partial_update /
+    bulk_destroy, other viewsets keep answering them with a 405
+    """
+    routes = [
+        DefaultRouter.routes[0]._replace(mapping=dict(
+            DefaultRouter.routes[0].mapping,
+            patch='bulk_partial_update',
+            delete='bulk_destroy',
+        )),
+    ] + DefaultRouter.routes[1:]
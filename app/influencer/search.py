@@ -0,0 +1,141 @@
+"""Name / insta_id substring search for backends without pg_trgm
+
+postgres answers icontains through the trigram indexes created in the
+migrations. elsewhere (sqlite test runs) a per-user trigram index is kept
+in process and rebuilt lazily whenever the user's change version moves
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from core.models import Influencer
+from influencer.cache import get_user_version
+from influencer.filters import fits_in_query
+
+
+SCAN_THRESHOLD = 2000
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NgramIndex:
+    """trigram -> influencer ids over the lowercased name and insta_id"""
+
+    def __init__(self, version):
+        self.version = version
+        self.docs = {}
+        self.postings = {}
+        self._by_followers = None
+
+    @classmethod
+    def build(cls, user_id, version):
+        index = cls(version)
+        rows = Influencer.objects.filter(user_id=user_id)\
+            .values_list('id', 'name', 'insta_id', 'followers')
+        for pk, name, insta_id, followers in rows.iterator():
+            index.docs[pk] = (name, insta_id, followers,
+                              name.lower(), insta_id.lower())
+            for gram in trigrams(name.lower()) | trigrams(insta_id.lower()):
+                index.postings.setdefault(gram, set()).add(pk)
+        return index
+
+    def posting_sets(self, query):
+        """return the id sets of the query's trigrams, smallest first"""
+        return sorted((self.postings.get(gram, set())
+                       for gram in trigrams(query)), key=len)
+
+    def candidates(self, query):
+        postings = self.posting_sets(query)
+        if not postings:
+            return self.docs.keys()
+        return set.intersection(*postings)
+
+    def search(self, query):
+        """return ids whose name or insta_id contains the query"""
+        query = query.lower()
+        return sorted(
+            pk for pk in self.candidates(query)
+            if query in self.docs[pk][3] or query in self.docs[pk][4]
+        )
+
+    def autocomplete(self, query, limit):
+        """return matches, prefix matches first then by followers"""
+        query = query.lower()
+        postings = self.posting_sets(query)
+        smallest = postings[0] if postings else self.docs.keys()
+        if len(smallest) <= SCAN_THRESHOLD:
+            candidates = set.intersection(*postings) if postings \
+                else smallest
+            order = sorted(candidates,
+                           key=lambda pk: (-self.docs[pk][2], pk))
+        else:
+            # many candidates: walk the roster by followers and stop as
+            # soon as enough prefix matches are found. intersecting sets
+            # this large costs more than substring testing the rows walked
+            order = (pk for pk in self.by_followers() if pk in smallest)
+
+        prefixed, contained = [], []
+        for pk in order:
+            name, insta_id, _, name_l, insta_l = self.docs[pk]
+            if name_l.startswith(query) or insta_l.startswith(query):
+                prefixed.append(pk)
+                if len(prefixed) >= limit:
+                    break
+            elif len(contained) < limit and \
+                    (query in name_l or query in insta_l):
+                contained.append(pk)
+        return [
+            {'id': pk, 'name': self.docs[pk][0], 'insta_id': self.docs[pk][1]}
+            for pk in (prefixed + contained)[:limit]
+        ]
+
+    def by_followers(self):
+        if self._by_followers is None:
+            self._by_followers = sorted(
+                self.docs, key=lambda pk: (-self.docs[pk][2], pk)
+            )
+        return self._by_followers
+
+
+def enabled():
+    setting = getattr(settings, 'INFLUENCER_NGRAM_INDEX', None)
+    if setting is None:
+        return connection.vendor != 'postgresql'
+    return setting
+
+
+def for_user(user_id):
+    """return the user's current index, None when sql should be used"""
+    if not enabled():
+        return None
+    version = get_user_version(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(user_id)
+            return index
+    index = NgramIndex.build(user_id, version)
+    with _lock:
+        _indexes[user_id] = index
+        while len(_indexes) > getattr(settings, 'INFLUENCER_INDEX_MAX_USERS',
+                                      128):
+            _indexes.popitem(last=False)
+    return index
+
+
+def search_ids(user_id, query):
+    """return matching influencer ids or None to search with sql"""
+    index = for_user(user_id)
+    if index is None:
+        return None
+    ids = index.search(query)
+    if not fits_in_query(ids):
+        return None
+    return ids
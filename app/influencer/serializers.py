@@ -1,6 +1,10 @@
+from django.core.files.storage import default_storage
+
 from rest_framework import serializers
 
 from core.models import Tag, Style, Influencer
+from influencer import images
+from influencer.fields import UserOwnedPrimaryKeyRelatedField
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -23,11 +27,11 @@ class StyleSerializer(serializers.ModelSerializer):
 
 class InfluencerSerializer(serializers.ModelSerializer):
     """Serializer for Influencer objects"""
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserOwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
-    styles = serializers.PrimaryKeyRelatedField(
+    styles = UserOwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Style.objects.all()
     )
@@ -50,6 +54,86 @@ class InfluencerDetailSerializer(InfluencerSerializer):
     """Serialize a influencer"""
     styles = StyleSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
+    profile_image_derivatives = serializers.SerializerMethodField()
+
+    class Meta(InfluencerSerializer.Meta):
+        fields = InfluencerSerializer.Meta.fields + (
+            'profile_image_derivatives',
+        )
+
+    def get_profile_image_derivatives(self, obj):
+        """return {size: {format: url}} of the generated derivatives"""
+        if not obj.profile_image or not obj.profile_image_ready:
+            return {}
+        request = self.context.get('request')
+        derivatives = {}
+        for size, names in images.derivative_names(
+                obj.profile_image.name).items():
+            for fmt, name in names.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                derivatives.setdefault(str(size), {})[fmt.lower()] = url
+        return derivatives
+
+
+class InfluencerBulkUpdateSerializer(serializers.ModelSerializer):
+    """validates the rows of a bulk partial update
+
+    the fields are built once and reused for every row, building a
+    serializer per row costs more than the update itself
+    """
+
+    class Meta:
+        model = Influencer
+        fields = ('name', 'insta_id', 'followers', 'insta_link')
+
+    def validate_row(self, row):
+        """return the (values, errors) of one partial row"""
+        values, errors = {}, {}
+        for name, value in row.items():
+            if name == 'id':
+                continue
+            field = self.fields.get(name)
+            if field is None or field.read_only:
+                errors[name] = ['This field can not be bulk updated.']
+                continue
+            try:
+                values[field.source] = field.run_validation(value)
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+        return values, errors
+
+
+class MembershipIdsSerializer(serializers.Serializer):
+    """tag and style ids of a bulk membership change"""
+    tags = serializers.ListField(child=serializers.IntegerField(),
+                                 required=False, default=list)
+    styles = serializers.ListField(child=serializers.IntegerField(),
+                                   required=False, default=list)
+
+
+class BulkMembershipSerializer(serializers.Serializer):
+    """add and remove tags/styles across many influencers"""
+    influencers = serializers.ListField(child=serializers.IntegerField(),
+                                        required=False, max_length=5000)
+    add = MembershipIdsSerializer(required=False, default=dict)
+    remove = MembershipIdsSerializer(required=False, default=dict)
+
+    def validate(self, attrs):
+        add, remove = attrs['add'], attrs['remove']
+        if not any(add.values()) and not any(remove.values()):
+            raise serializers.ValidationError(
+                'Give tag or style ids to add or remove.'
+            )
+        for relation in ('tags', 'styles'):
+            both = set(add.get(relation, ())) & \
+                set(remove.get(relation, ()))
+            if both:
+                raise serializers.ValidationError({relation: (
+                    f'Ids {sorted(both)} are both added and removed.'
+                )})
+        return attrs
 
 
 class InfluencerProfileImageSerializer(serializers.ModelSerializer):
@@ -0,0 +1,217 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import Tag, Style, Influencer
+from core.storage import publishing
+from influencer import bitmap, images, leaderboard
+from influencer.cache import VERSION_KEY, bump_user_version
+
+
+_state = threading.local()
+
+
+@contextmanager
+def bulk_delete():
+    """skip the per row influencer delete handlers inside the block
+
+    for callers deleting many influencers at once, they bump the version,
+    update the caches and release the profile images once themselves
+    """
+    _state.bulk_delete = True
+    try:
+        yield
+    finally:
+        _state.bulk_delete = False
+
+
+def in_bulk_delete():
+    return getattr(_state, 'bulk_delete', False)
+
+
+def changed(user_id, change=None, top_change=None):
+    """bump the user's version, keep the bitmap index and boards current
+
+    the version is bumped right away, so nothing cached before the write
+    is used again, not even by the writing transaction itself, and once
+    more when the write commits to retire what other readers cached from
+    the pre-commit rows meanwhile. the change is applied in place only
+    then. changes are idempotent, so an index rebuilt before or after the
+    commit ends up the same. a rolled back write applies nothing
+    """
+    pending = bump_user_version(user_id)
+
+    def committed():
+        version = bump_user_version(user_id)
+        # an index or board from before the write, or rebuilt from the
+        # pre-commit rows in between, both lack just this change
+        bases = (pending - 1, pending) if version == pending + 1 else ()
+        bitmap.apply_change(user_id, bases, version,
+                            change or (lambda index: None))
+        leaderboard.apply_change(user_id, bases, version,
+                                 top_change or (lambda board: None))
+    transaction.on_commit(committed)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reset_new_user(sender, instance, created, **kwargs):
+    """make sure a new user never sees state cached for a reused id"""
+    if created:
+        cache.delete(VERSION_KEY.format(user_id=instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Style)
+def attribute_saved(sender, instance, **kwargs):
+    changed(instance.user_id)
+
+
+@receiver(post_save, sender=Influencer)
+def influencer_saved(sender, instance, created, **kwargs):
+    changed(instance.user_id,
+            top_change=leaderboard.influencer_saved(instance, created))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Style)
+def attribute_deleted(sender, instance, **kwargs):
+    relation = 'tags' if sender is Tag else 'styles'
+    changed(instance.user_id,
+            lambda index: index.drop(relation, instance.pk),
+            leaderboard.facets_changed(relation, {instance.pk}))
+
+
+@receiver(post_delete, sender=Influencer)
+def influencer_deleted(sender, instance, **kwargs):
+    if in_bulk_delete():
+        return
+
+    def change(index):
+        for relation in bitmap.RELATIONS:
+            index.clear_influencers(relation, [instance.pk])
+    changed(instance.user_id, change,
+            leaderboard.influencer_deleted(instance.pk))
+
+
+@receiver(m2m_changed, sender=Influencer.tags.through)
+@receiver(m2m_changed, sender=Influencer.styles.through)
+def membership_changed(sender, instance, action, reverse, pk_set,
+                       **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    relation = 'tags' if sender is Influencer.tags.through else 'styles'
+
+    def change(index):
+        if action == 'post_clear':
+            if reverse:
+                index.drop(relation, instance.pk)
+            else:
+                index.clear_influencers(relation, [instance.pk])
+            return
+        if reverse:
+            keys, influencer_ids = [instance.pk], pk_set
+        else:
+            keys, influencer_ids = pk_set, [instance.pk]
+        if action == 'post_add':
+            index.add(relation, keys, influencer_ids)
+        else:
+            index.remove(relation, keys, influencer_ids)
+
+    if action == 'post_clear':
+        facets = {instance.pk} if reverse else None
+    else:
+        facets = {instance.pk} if reverse else set(pk_set)
+    changed(instance.user_id, change,
+            leaderboard.facets_changed(relation, facets))
+
+
+# pg_advisory_xact_lock key serializing profile image stores and releases
+PROFILE_IMAGE_LOCK = 7001
+PROFILE_IMAGE_PREFIX = 'uploads/influencer/'
+
+
+def lock_profile_images(using=None):
+    """hold the profile image lock until the current transaction ends
+
+    a stored file is shared by every row with the same content, so an
+    upload finding its file already stored and a release deleting that
+    file must not interleave. uploads take the lock once their content is
+    written to a temporary file, before it is published, and keep it
+    until their row commits. releases take it before looking for
+    references. only postgres has the advisory lock, other backends go
+    without
+    """
+    using = using or router.db_for_write(Influencer)
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)',
+                       [PROFILE_IMAGE_LOCK])
+
+
+def release_profile_image(name):
+    """delete a stored profile image once the write unreferencing it commits
+
+    the references are checked again under the lock then, a rolled back
+    write or a row committed meanwhile keeps the file
+    """
+    if name:
+        transaction.on_commit(lambda: _release_profile_image(name))
+
+
+def _release_profile_image(name):
+    with transaction.atomic(using=router.db_for_write(Influencer)):
+        lock_profile_images()
+        if Influencer.objects.filter(profile_image=name).exists():
+            return
+        storage = Influencer._meta.get_field('profile_image').storage
+        images.delete_derivatives(name, storage)
+        storage.delete(name)
+
+
+@receiver(post_init, sender=Influencer)
+def remember_profile_image(sender, instance, **kwargs):
+    value = instance.__dict__.get('profile_image')
+    instance._stored_profile_image = getattr(value, 'name', value)
+
+
+@receiver(pre_save, sender=Influencer)
+def profile_image_storing(sender, instance, using, **kwargs):
+    image = instance.profile_image
+    if (image.name or '') == (instance._stored_profile_image or ''):
+        return
+    # the derivatives are flagged again once generated for the new image
+    instance.profile_image_ready = False
+    # an upload still to be written locks in profile_image_publishing,
+    # after the slow part
+    if image.name and image._committed:
+        lock_profile_images(using)
+
+
+@receiver(publishing)
+def profile_image_publishing(sender, name, **kwargs):
+    if name.startswith(PROFILE_IMAGE_PREFIX):
+        lock_profile_images()
+
+
+@receiver(post_save, sender=Influencer)
+def profile_image_replaced(sender, instance, **kwargs):
+    stored = instance._stored_profile_image
+    current = instance.profile_image.name
+    instance._stored_profile_image = current
+    if stored and stored != current:
+        release_profile_image(stored)
+
+
+@receiver(post_delete, sender=Influencer)
+def profile_image_deleted(sender, instance, **kwargs):
+    if in_bulk_delete():
+        return
+    release_profile_image(instance.profile_image.name)
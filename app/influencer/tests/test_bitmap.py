@@ -0,0 +1,178 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag, Style
+
+from influencer import bitmap
+from influencer.cache import bump_user_version
+
+
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+
+
+def sample_influencer(user, name):
+    """Create and return a sample influencer"""
+    return Influencer.objects.create(
+        user=user,
+        name=name,
+        insta_id='asdasf',
+        followers=1234,
+        insta_link='www.instagram.com'
+    )
+
+
+class BitsetTests(TestCase):
+
+    def test_ids_round_trip(self):
+        """test converting ids to a bitset and back"""
+        ids = [0, 3, 8, 9, 1000]
+
+        bits = bitmap.ids_to_bits(ids)
+
+        self.assertEqual(bitmap.bits_to_ids(bits), ids)
+        self.assertEqual(bitmap.popcount(bits), len(ids))
+        self.assertEqual(bitmap.ids_to_bits([]), 0)
+
+    def test_positions_placed_out_of_order(self):
+        """test influencers placed out of id order still come out sorted"""
+        index = bitmap.MembershipIndex(0)
+
+        index.add('tags', [1], [50, 9])
+        index.add('tags', [1, 2], [7])
+        index.remove('tags', [1], [9, 10 ** 9])
+
+        self.assertEqual(index.ids, [50, 9, 7])
+        self.assertEqual(index.to_ids(index.resolve('tags', [1], 'any')),
+                         [7, 50])
+        self.assertEqual(index.to_ids(index.resolve('tags', [2], 'any')),
+                         [7])
+
+
+class MembershipIndexSetup:
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.solo = Tag.objects.create(user=self.user, name='Solo')
+        self.girl = Tag.objects.create(user=self.user, name='Girl')
+        self.chic = Style.objects.create(user=self.user, name='Chic')
+        self.park = sample_influencer(self.user, 'Park')
+        self.seo = sample_influencer(self.user, 'Seo')
+        self.park.tags.set([self.solo, self.girl])
+        self.seo.tags.set([self.solo])
+        self.seo.styles.set([self.chic])
+
+    def resolve(self, match='any', **filters):
+        return bitmap.resolve_ids(self.user.id, filters, match)
+
+
+class MembershipIndexTests(MembershipIndexSetup, TestCase):
+    """test the bitmap index stays consistent with the database"""
+
+    def test_build_lazily(self):
+        """test the index is built on first use"""
+        bitmap.reset()
+        self.assertIsNone(bitmap.get_index(self.user.id))
+
+        ids = self.resolve(tags=[self.girl.id])
+
+        self.assertEqual(ids, [self.park.id])
+        self.assertIsNotNone(bitmap.get_index(self.user.id))
+
+    def test_match_modes(self):
+        """test any/all across tags and styles"""
+        self.assertEqual(self.resolve(tags=[self.solo.id, self.girl.id]),
+                         [self.park.id, self.seo.id])
+        self.assertEqual(
+            self.resolve('all', tags=[self.solo.id, self.girl.id]),
+            [self.park.id]
+        )
+        self.assertEqual(
+            self.resolve(tags=[self.solo.id], styles=[self.chic.id]),
+            [self.seo.id]
+        )
+
+    def test_uncommitted_change_skips_index(self):
+        """test a write still in its transaction doesn't read the index"""
+        bitmap.for_user(self.user.id)
+
+        self.seo.tags.add(self.girl)
+
+        self.assertIsNone(bitmap.get_index(self.user.id))
+        self.assertEqual(self.resolve(tags=[self.girl.id]),
+                         [self.park.id, self.seo.id])
+
+    def test_stale_index_rebuilt(self):
+        """test a change the index didn't see forces a rebuild"""
+        index = bitmap.for_user(self.user.id)
+        Influencer.tags.through.objects.create(influencer_id=self.seo.id,
+                                               tag_id=self.girl.id)
+        bump_user_version(self.user.id)
+
+        self.assertIsNone(bitmap.get_index(self.user.id))
+        self.assertEqual(self.resolve(tags=[self.girl.id]),
+                         [self.park.id, self.seo.id])
+        self.assertIsNot(bitmap.get_index(self.user.id), index)
+
+    def test_bitsets_sized_by_roster(self):
+        """test large influencer ids don't grow the bitsets"""
+        far = Influencer.objects.create(
+            id=10 ** 7, user=self.user, name='Far', insta_id='far',
+            followers=1, insta_link='www.instagram.com'
+        )
+        far.tags.set([self.girl])
+
+        index = bitmap.warm(self.user.id)
+
+        self.assertEqual(index.bitsets['tags'][self.girl.id].bit_length(), 3)
+        self.assertEqual(self.resolve(tags=[self.girl.id]),
+                         [self.park.id, far.id])
+
+    @override_settings(INFLUENCER_RESPONSE_CACHE=False)
+    def test_sql_fallback_matches_index(self):
+        """test the api returns the same rows with and without the index"""
+        params = {'tags': f'{self.solo.id},{self.girl.id}', 'match': 'all'}
+        res = self.client.get(INFLUENCERS_URL, params)
+
+        with override_settings(INFLUENCER_BITMAP_INDEX=False):
+            fallback = self.client.get(INFLUENCERS_URL, params)
+
+        self.assertEqual(res.data, fallback.data)
+        self.assertEqual(len(res.data['results']), 1)
+
+
+class MembershipIndexCommitTests(MembershipIndexSetup, TransactionTestCase):
+    """test changes reach a warm index only once they commit"""
+
+    def test_signals_keep_index_current(self):
+        """test committed changes are applied to a warm index in place"""
+        index = bitmap.for_user(self.user.id)
+
+        self.seo.tags.add(self.girl)
+        self.chic.influencer_set.remove(self.seo)
+        self.park.delete()
+
+        self.assertIs(bitmap.get_index(self.user.id), index)
+        self.assertEqual(self.resolve(tags=[self.girl.id]), [self.seo.id])
+        self.assertEqual(self.resolve(styles=[self.chic.id]), [])
+
+        self.solo.delete()
+        self.assertEqual(self.resolve(tags=[self.solo.id]), [])
+
+    def test_rolled_back_change_not_applied(self):
+        """test a rolled back write leaves no phantom ids in the index"""
+        bitmap.for_user(self.user.id)
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.seo.tags.add(self.girl)
+            raise RuntimeError
+
+        self.assertEqual(self.resolve(tags=[self.girl.id]), [self.park.id])
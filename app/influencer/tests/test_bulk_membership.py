@@ -0,0 +1,190 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag, Style
+
+from influencer import bitmap, leaderboard, membership
+from influencer.cache import get_user_version
+
+
+BULK_URL = reverse('influencer:influencer-bulk-membership')
+
+
+def sample_influencer(user, name):
+    """Create and return a sample influencer"""
+    return Influencer.objects.create(
+        user=user,
+        name=name,
+        insta_id=name.lower(),
+        followers=1234,
+        insta_link='www.instagram.com'
+    )
+
+
+class BulkMembershipTests(TestCase):
+    """test adding and removing tags/styles across many influencers"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.solo = Tag.objects.create(user=self.user, name='Solo')
+        self.girl = Tag.objects.create(user=self.user, name='Girl')
+        self.chic = Style.objects.create(user=self.user, name='Chic')
+        self.park = sample_influencer(self.user, 'Park')
+        self.seo = sample_influencer(self.user, 'Seo')
+        self.hong = sample_influencer(self.user, 'Hong')
+        self.park.tags.add(self.solo)
+
+    def tag_names(self, influencer):
+        return sorted(influencer.tags.values_list('name', flat=True))
+
+    def test_add_to_listed_influencers(self):
+        """test tags and styles are added to the listed influencers"""
+        res = self.client.post(BULK_URL, {
+            'influencers': [self.park.id, self.seo.id],
+            'add': {'tags': [self.solo.id, self.girl.id],
+                    'styles': [self.chic.id]},
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['influencers'], 2)
+        self.assertEqual(res.data['added'], {'tags': 3, 'styles': 2})
+        self.assertEqual(self.tag_names(self.park), ['Girl', 'Solo'])
+        self.assertEqual(self.tag_names(self.seo), ['Girl', 'Solo'])
+        self.assertEqual(self.tag_names(self.hong), [])
+        self.assertEqual(list(self.seo.styles.all()), [self.chic])
+
+    def test_add_and_remove_by_filter(self):
+        """test the list filters select the influencers"""
+        self.seo.tags.add(self.solo)
+
+        res = self.client.post(
+            f'{BULK_URL}?tags={self.solo.id}',
+            {'add': {'tags': [self.girl.id]},
+             'remove': {'tags': [self.solo.id]}},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['removed'], {'tags': 2, 'styles': 0})
+        self.assertEqual(res.data['added'], {'tags': 2, 'styles': 0})
+        self.assertEqual(self.tag_names(self.park), ['Girl'])
+        self.assertEqual(self.tag_names(self.seo), ['Girl'])
+        self.assertEqual(self.tag_names(self.hong), [])
+
+    def test_set_based_queries(self):
+        """test the query count doesn't grow with the influencers"""
+        for i in range(20):
+            sample_influencer(self.user, f'Extra{i}')
+        ids = list(Influencer.objects.values_list('id', flat=True))
+        payload = {'influencers': ids,
+                   'add': {'tags': [self.solo.id, self.girl.id]},
+                   'remove': {'styles': [self.chic.id]}}
+
+        # ownership, influencer ids, one delete, one insert, savepoints
+        with self.assertNumQueries(6):
+            res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.data['added']['tags'], 2 * len(ids) - 1)
+
+    def test_caches_stay_current(self):
+        """test the bitmap index and leaderboards see the change"""
+        bitmap.warm(self.user.id)
+        facet = ('tags', self.girl.id)
+        leaderboard.top_ids(self.user.id, 'score', facet, 10)
+        version = get_user_version(self.user.id)
+
+        self.client.post(BULK_URL, {
+            'influencers': [self.seo.id, self.hong.id],
+            'add': {'tags': [self.girl.id]},
+        }, format='json')
+
+        self.assertNotEqual(get_user_version(self.user.id), version)
+        self.assertEqual(
+            bitmap.resolve_ids(self.user.id, {'tags': [self.girl.id]}, 'any'),
+            sorted([self.seo.id, self.hong.id])
+        )
+        self.assertEqual(
+            leaderboard.top_ids(self.user.id, 'score', facet, 10),
+            leaderboard.top_sql(self.user.id, 'score', facet, 10)
+        )
+
+    def test_other_users_ids_rejected(self):
+        """test ids owned by another user are rejected"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        tag = Tag.objects.create(user=other, name='Other')
+        influencer = sample_influencer(other, 'Other')
+
+        res = self.client.post(BULK_URL, {
+            'influencers': [self.park.id, influencer.id],
+            'add': {'tags': [tag.id, self.girl.id]},
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(res.data), {'tags', 'influencers'})
+        self.assertEqual(self.tag_names(self.park), ['Solo'])
+
+    def test_invalid_payloads(self):
+        """test empty and contradicting changes are rejected"""
+        payloads = [
+            {'influencers': [self.park.id]},
+            {'influencers': [self.park.id],
+             'add': {'tags': [self.solo.id]},
+             'remove': {'tags': [self.solo.id]}},
+            {'add': {'tags': [self.solo.id]}},
+        ]
+        for payload in payloads:
+            res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkMembershipCommitTests(TransactionTestCase):
+    """test bulk changes reach the warm caches only once committed"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.girl = Tag.objects.create(user=self.user, name='Girl')
+        self.park = sample_influencer(self.user, 'Park')
+        self.seo = sample_influencer(self.user, 'Seo')
+        self.park.tags.add(self.girl)
+        self.index = bitmap.warm(self.user.id)
+
+    def girls(self):
+        return bitmap.resolve_ids(self.user.id, {'tags': [self.girl.id]},
+                                  'any')
+
+    def test_committed_change_applied_in_place(self):
+        """test a committed bulk change updates the warm index"""
+        membership.bulk_change(
+            self.user, Influencer.objects.filter(id=self.seo.id),
+            add={'tags': [self.girl.id]},
+        )
+
+        self.assertIs(bitmap.get_index(self.user.id), self.index)
+        self.assertEqual(self.girls(), [self.park.id, self.seo.id])
+
+    def test_rolled_back_change_not_applied(self):
+        """test a rolled back bulk change leaves the caches alone"""
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            membership.bulk_change(
+                self.user, Influencer.objects.filter(id=self.seo.id),
+                add={'tags': [self.girl.id]},
+            )
+            raise RuntimeError
+
+        self.assertEqual(self.girls(), [self.park.id])
@@ -0,0 +1,261 @@
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag
+
+from influencer import bitmap, leaderboard
+from influencer.cache import get_user_version
+
+
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+TAGS_URL = reverse('influencer:tag-list')
+
+
+def sample_influencer(user, name, followers=10):
+    """Create and return a sample influencer"""
+    return Influencer.objects.create(
+        user=user,
+        name=name,
+        insta_id=name.lower(),
+        followers=followers,
+        insta_link='www.instagram.com'
+    )
+
+
+class BulkUpdateTests(TestCase):
+    """test PATCH on the influencer list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.park = sample_influencer(self.user, 'Park')
+        self.seo = sample_influencer(self.user, 'Seo')
+
+    def test_bulk_partial_update(self):
+        """test every row is applied with its own fields"""
+        res = self.client.patch(INFLUENCERS_URL, [
+            {'id': self.park.id, 'followers': 500},
+            {'id': self.seo.id, 'name': 'Seo Jin', 'followers': 20},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'updated': 2})
+        self.park.refresh_from_db()
+        self.seo.refresh_from_db()
+        self.assertEqual((self.park.name, self.park.followers),
+                         ('Park', 500))
+        self.assertEqual((self.seo.name, self.seo.followers),
+                         ('Seo Jin', 20))
+
+    def test_per_row_errors(self):
+        """test errors are reported per row and nothing is written"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        foreign = sample_influencer(other, 'Other')
+        hong = sample_influencer(self.user, 'Hong')
+
+        res = self.client.patch(INFLUENCERS_URL, [
+            {'id': self.park.id, 'followers': 500},
+            {'id': self.seo.id, 'followers': 'many'},
+            {'id': foreign.id, 'followers': 1},
+            {'id': self.park.id, 'followers': 1},
+            {'id': hong.id, 'tags': []},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertEqual(list(res.data[1]), ['followers'])
+        self.assertEqual(list(res.data[2]), ['id'])
+        self.assertEqual(list(res.data[3]), ['id'])
+        self.assertEqual(list(res.data[4]), ['tags'])
+        self.park.refresh_from_db()
+        self.assertEqual(self.park.followers, 10)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.followers, 10)
+
+    @override_settings(INFLUENCER_BULK_MAX_BATCH=1)
+    def test_max_batch(self):
+        """test batches over the configured size are rejected"""
+        res = self.client.patch(INFLUENCERS_URL, [
+            {'id': self.park.id, 'followers': 1},
+            {'id': self.seo.id, 'followers': 1},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count(self):
+        """test the query count doesn't grow with the rows"""
+        influencers = [sample_influencer(self.user, f'Extra{i}')
+                       for i in range(20)]
+        rows = [{'id': influencer.id, 'followers': i}
+                for i, influencer in enumerate(influencers)]
+
+        # select, one executemany, two savepoints each released
+        with self.assertNumQueries(6):
+            self.client.patch(INFLUENCERS_URL, rows, format='json')
+
+        self.assertEqual(
+            Influencer.objects.get(id=influencers[-1].id).followers, 19
+        )
+
+    def test_caches_invalidated(self):
+        """test cached boards are dropped and the version bumped"""
+        leaderboard.top_ids(self.user.id, 'followers',
+                            leaderboard.FACET_ALL, 10)
+        version = get_user_version(self.user.id)
+
+        self.client.patch(INFLUENCERS_URL, [
+            {'id': self.seo.id, 'followers': 1000},
+        ], format='json')
+
+        self.assertNotEqual(get_user_version(self.user.id), version)
+        self.assertEqual(
+            leaderboard.top_ids(self.user.id, 'followers',
+                                leaderboard.FACET_ALL, 10)[0],
+            self.seo.id
+        )
+
+    def test_not_routed_for_tags(self):
+        """test other list endpoints don't accept bulk methods"""
+        res = self.client.patch(TAGS_URL, [], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class BulkDeleteTests(TestCase):
+    """test DELETE on the influencer list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.solo = Tag.objects.create(user=self.user, name='Solo')
+        self.park = sample_influencer(self.user, 'Park')
+        self.seo = sample_influencer(self.user, 'Seo')
+        self.hong = sample_influencer(self.user, 'Hong')
+        self.park.tags.add(self.solo)
+        self.seo.tags.add(self.solo)
+
+    def remaining(self):
+        return sorted(Influencer.objects.values_list('name', flat=True))
+
+    def test_delete_ids(self):
+        """test listed influencers and their memberships are deleted"""
+        bitmap.warm(self.user.id)
+
+        res = self.client.delete(INFLUENCERS_URL,
+                                 {'ids': [self.park.id, self.hong.id]},
+                                 format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'deleted': 2})
+        self.assertEqual(self.remaining(), ['Seo'])
+        self.assertEqual(
+            list(Influencer.tags.through.objects
+                 .values_list('influencer_id', flat=True)),
+            [self.seo.id]
+        )
+        self.assertEqual(
+            bitmap.resolve_ids(self.user.id, {'tags': [self.solo.id]},
+                               'any'),
+            [self.seo.id]
+        )
+
+    def test_delete_by_filter(self):
+        """test the list filters select the influencers to delete"""
+        res = self.client.delete(f'{INFLUENCERS_URL}?tags={self.solo.id}')
+
+        self.assertEqual(res.data, {'deleted': 2})
+        self.assertEqual(self.remaining(), ['Hong'])
+
+    def test_delete_requires_ids_or_filter(self):
+        """test a bare DELETE doesn't wipe the roster"""
+        res = self.client.delete(INFLUENCERS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self.remaining()), 3)
+
+    def test_delete_unknown_ids(self):
+        """test unknown ids are reported and nothing is deleted"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        foreign = sample_influencer(other, 'Other')
+
+        res = self.client.delete(INFLUENCERS_URL,
+                                 {'ids': [self.park.id, foreign.id]},
+                                 format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(foreign.id), res.data['ids'][0])
+        self.assertEqual(len(self.remaining()), 4)
+
+    def test_version_bumped_once(self):
+        """test the per row delete handlers leave the bookkeeping to it"""
+        version = get_user_version(self.user.id)
+
+        self.client.delete(INFLUENCERS_URL,
+                           {'ids': [self.park.id, self.seo.id,
+                                    self.hong.id]},
+                           format='json')
+
+        # one bump now, the commit's bump never runs inside a TestCase
+        self.assertEqual(get_user_version(self.user.id), version + 1)
+
+    @override_settings(INFLUENCER_BULK_MAX_BATCH=1)
+    def test_max_batch(self):
+        """test deletes over the configured size are rejected"""
+        res = self.client.delete(f'{INFLUENCERS_URL}?tags={self.solo.id}')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self.remaining()), 3)
+
+
+class BulkDeleteCommitTests(TransactionTestCase):
+    """test what DELETE on the influencer list leaves to its commit"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.park = sample_influencer(self.user, 'Park')
+
+    def test_profile_image_released(self):
+        """test profile images of deleted influencers are removed"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.park.profile_image = SimpleUploadedFile(
+                'park.jpg', ntf.read(), content_type='image/jpeg'
+            )
+            self.park.save()
+        path = self.park.profile_image.path
+        self.assertTrue(os.path.exists(path))
+
+        self.client.delete(INFLUENCERS_URL, {'ids': [self.park.id]},
+                           format='json')
+
+        self.assertFalse(os.path.exists(path))
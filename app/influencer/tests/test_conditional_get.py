@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag
+
+
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+TAGS_URL = reverse('influencer:tag-list')
+LOCAL_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+
+
+def detail_url(influencer_id):
+    """return influencer detail url"""
+    return reverse('influencer:influencer-detail', args=[influencer_id])
+
+
+@override_settings(INFLUENCER_ETAGS=True)
+class ConditionalGetTests(TestCase):
+    """test etag / if-none-match handling on the influencer api"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.influencer = Influencer.objects.create(
+            user=self.user,
+            name='Park',
+            insta_id='park_',
+            followers=10,
+            insta_link='www.instagram.com'
+        )
+
+    def test_not_modified_without_queries(self):
+        """test a matching etag returns 304 without touching the db"""
+        for url in (INFLUENCERS_URL, TAGS_URL,
+                    detail_url(self.influencer.id)):
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertIn('ETag', res)
+
+            with self.assertNumQueries(0):
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(res.content, b'')
+
+    def test_change_returns_new_etag(self):
+        """test a write changes the etag of the user's endpoints"""
+        etag = self.client.get(INFLUENCERS_URL)['ETag']
+
+        Tag.objects.create(user=self.user, name='Solo')
+        res = self.client.get(INFLUENCERS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_etag_depends_on_query(self):
+        """test different query params get different etags"""
+        etag = self.client.get(INFLUENCERS_URL)['ETag']
+
+        res = self.client.get(INFLUENCERS_URL, {'ordering': 'name'},
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_per_user(self):
+        """test another user's etag never matches"""
+        etag = self.client.get(TAGS_URL)['ETag']
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(INFLUENCER_ETAGS=None, CACHES=LOCAL_CACHES)
+    def test_off_with_local_cache(self):
+        """test no etags are sent unless every process shares the version"""
+        res = self.client.get(detail_url(self.influencer.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
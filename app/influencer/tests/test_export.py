@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag, Style
+
+from influencer import exports
+
+
+EXPORT_URL = reverse('influencer:influencer-export')
+
+
+def sample_influencer(user, name, followers=10):
+    """Create and return a sample influencer"""
+    return Influencer.objects.create(
+        user=user,
+        name=name,
+        insta_id=name.lower(),
+        followers=followers,
+        insta_link='www.instagram.com',
+        score='1.50',
+    )
+
+
+class ExportTests(TestCase):
+    """test streaming the roster out"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.solo = Tag.objects.create(user=self.user, name='Solo')
+        self.girl = Tag.objects.create(user=self.user, name='Girl')
+        self.chic = Style.objects.create(user=self.user, name='Chic')
+        self.park = sample_influencer(self.user, 'Park')
+        self.seo = sample_influencer(self.user, 'Seo, Jin', followers=20)
+        self.park.tags.add(self.girl, self.solo)
+        self.park.styles.add(self.chic)
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        sample_influencer(other, 'Other')
+
+    def export(self, fmt, **params):
+        res = self.client.get(EXPORT_URL, dict(params, type=fmt))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode()
+
+    def test_csv(self):
+        """test the csv export in the import layout"""
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+
+        self.assertEqual([row['name'] for row in rows], ['Park', 'Seo, Jin'])
+        self.assertEqual(rows[0]['tags'], 'Solo|Girl')
+        self.assertEqual(rows[0]['styles'], 'Chic')
+        self.assertEqual(rows[1]['tags'], '')
+        self.assertEqual(rows[0]['score'], '1.50')
+
+    def test_ndjson_and_json(self):
+        """test both json layouts hold the same rows"""
+        lines = self.export('ndjson').splitlines()
+        array = json.loads(self.export('json'))
+
+        self.assertEqual([json.loads(line) for line in lines], array)
+        self.assertEqual(array[0], {
+            'id': self.park.id,
+            'name': 'Park',
+            'insta_id': 'park',
+            'followers': 10,
+            'insta_link': 'www.instagram.com',
+            'score': '1.50',
+            'tags': ['Solo', 'Girl'],
+            'styles': ['Chic'],
+        })
+
+    def test_empty_roster(self):
+        """test an empty export is still well formed"""
+        params = {'tags': self.chic.id + 1000}
+
+        self.assertEqual(json.loads(self.export('json', **params)), [])
+        self.assertEqual(self.export('ndjson', **params), '')
+        self.assertEqual(self.export('csv', **params).strip(),
+                         ','.join(exports.COLUMNS))
+
+    def test_filters(self):
+        """test the list filters select the exported influencers"""
+        rows = json.loads(self.export('json', tags=self.solo.id))
+
+        self.assertEqual([row['id'] for row in rows], [self.park.id])
+
+    def test_invalid_type(self):
+        """test unknown export types are rejected"""
+        res = self.client.get(EXPORT_URL, {'type': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_chunked_queries(self):
+        """test the rows are read chunk by chunk"""
+        for i in range(5):
+            sample_influencer(self.user, f'Extra{i}')
+
+        # tag and style names, the cursor, then two lookups per chunk
+        with patch.object(exports, 'CHUNK_SIZE', 2), \
+                self.assertNumQueries(3 + 4 * 2):
+            res = self.client.get(EXPORT_URL, {'type': 'ndjson'})
+            lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 7)
+
+    def test_round_trip(self):
+        """test an export imports back into the same roster"""
+        content = self.export('csv')
+        copy = get_user_model().objects.create_user(
+            'copy@burningb.com',
+            'testpass'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as ntf:
+            ntf.write(content)
+            ntf.flush()
+            call_command('import_influencers', ntf.name,
+                         user=copy.email, stdout=io.StringIO())
+
+        imported = Influencer.objects.get(user=copy, name='Park')
+        self.assertEqual(sorted(imported.tags.values_list('name', flat=True)),
+                         ['Girl', 'Solo'])
+        self.assertEqual(str(imported.score), '1.50')
+        self.assertEqual(
+            Influencer.objects.filter(user=copy).count(), 2
+        )
@@ -0,0 +1,115 @@
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag, Style
+from influencer.views import InfluencerViewSet
+
+
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+TAGS_URL = reverse('influencer:tag-list')
+STYLES_URL = reverse('influencer:style-list')
+
+
+def sample_influencer(user, name, followers):
+    """Create and return a sample influencer"""
+    return Influencer.objects.create(
+        user=user,
+        name=name,
+        insta_id=name.lower(),
+        followers=followers,
+        insta_link=f'www.instagram.com/{name.lower()}',
+        score=followers % 7,
+    )
+
+
+@override_settings(INFLUENCER_RESPONSE_CACHE=False)
+class FastSerializationTests(TestCase):
+    """test the fast list path renders the same bytes as the serializers"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tags = [Tag.objects.create(user=self.user, name=name)
+                     for name in ('Solo', 'Girl', 'Vlog')]
+        self.styles = [Style.objects.create(user=self.user, name=name)
+                       for name in ('Chic', 'Street')]
+        self.influencers = [
+            sample_influencer(self.user, f'Influencer{i}', i * 13 % 50)
+            for i in range(12)
+        ]
+        for i, influencer in enumerate(self.influencers):
+            # added out of id order, the lists must still come back sorted
+            influencer.tags.add(*reversed(self.tags[:i % 4]))
+            if i % 3:
+                influencer.styles.add(*reversed(self.styles[:i % 3]))
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        Tag.objects.create(user=other, name='Other')
+        sample_influencer(other, 'Other', 1)
+
+    def assertSameContent(self, url, params=None):
+        with self.settings(INFLUENCER_FAST_SERIALIZATION=False):
+            slow = self.client.get(url, params)
+        with self.settings(INFLUENCER_FAST_SERIALIZATION=True):
+            fast = self.client.get(url, params)
+
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_influencer_pages(self):
+        """test every page of every ordering is identical"""
+        for ordering in ('-id', 'followers', '-score', 'name'):
+            params = {'ordering': ordering, 'page_size': 5}
+            pages = 0
+            while params is not None:
+                res = self.assertSameContent(INFLUENCERS_URL, params)
+                pages += 1
+                link = res.json()['next']
+                params = parse_qs(urlsplit(link).query) if link else None
+            self.assertEqual(pages, 3)
+
+    def test_influencer_filters(self):
+        """test filtered, searched and empty lists are identical"""
+        tag, style = self.tags[0].id, self.styles[1].id
+        for params in ({'tags': f'{tag}'},
+                       {'tags': f'{tag},{self.tags[2].id}', 'match': 'all'},
+                       {'styles': f'{style}'},
+                       {'search': 'influencer1'},
+                       {'search': 'nobody'}):
+            self.assertSameContent(INFLUENCERS_URL, params)
+
+    def test_attribute_lists(self):
+        """test the tag and style lists are identical"""
+        self.assertSameContent(TAGS_URL)
+        self.assertSameContent(TAGS_URL, {'assigned_only': 1})
+        self.assertSameContent(STYLES_URL)
+
+    @override_settings(INFLUENCER_FAST_SERIALIZATION=True)
+    def test_query_count(self):
+        """test a page costs the same queries whatever its size"""
+        # influencers, tag ids and style ids
+        with self.assertNumQueries(3):
+            self.client.get(INFLUENCERS_URL, {'page_size': 12})
+
+    @override_settings(INFLUENCER_FAST_SERIALIZATION=True)
+    def test_serializer_not_used(self):
+        """test the fast path doesn't build serializers"""
+        with patch.object(InfluencerViewSet, 'get_serializer') as serializer:
+            res = self.client.get(INFLUENCERS_URL)
+
+        self.assertEqual(len(res.json()['results']), 12)
+        serializer.assert_not_called()
@@ -0,0 +1,189 @@
+import tempfile
+import threading
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework.test import APIClient
+
+from core.models import Influencer
+
+from influencer import images
+from influencer.cache import get_user_version
+
+
+def sample_image():
+    """return jpeg bytes of a small image"""
+    buf = BytesIO()
+    Image.new('RGB', (100, 100)).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+def profile_image_upload_url(influencer_id):
+    """return URL for influencer image upload"""
+    return reverse('influencer:influencer-upload-profile-image',
+                   args=[influencer_id])
+
+
+def detail_url(influencer_id):
+    """return influencer detail url"""
+    return reverse('influencer:influencer-detail', args=[influencer_id])
+
+
+class DerivativeSetup:
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'anlsgkmsakl213'
+        )
+        self.client.force_authenticate(self.user)
+        self.influencer = Influencer.objects.create(
+            user=self.user,
+            name='Park',
+            insta_id='park_',
+            followers=10,
+            insta_link='www.instagram.com'
+        )
+
+    def tearDown(self):
+        self.influencer.refresh_from_db()
+        if self.influencer.profile_image:
+            images.delete_derivatives(self.influencer.profile_image.name)
+            self.influencer.profile_image.delete()
+
+    def upload(self):
+        url = profile_image_upload_url(self.influencer.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (800, 400)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'profile_image': ntf},
+                                   format='multipart')
+        self.influencer.refresh_from_db()
+        return res
+
+
+@override_settings(INFLUENCER_IMAGE_SIZES=(64, 256),
+                   INFLUENCER_IMAGE_FORMATS=('JPEG', 'WEBP'))
+class ProfileImageDerivativeTests(DerivativeSetup, TestCase):
+    """test generating resized copies of profile images"""
+
+    @override_settings(INFLUENCER_IMAGE_WORKERS=0)
+    def test_derivatives_generated(self):
+        """test every size and format is written, keeping aspect ratio"""
+        self.upload()
+
+        names = images.derivative_names(self.influencer.profile_image.name)
+        for size, by_format in names.items():
+            for fmt, name in by_format.items():
+                with default_storage.open(name) as fileobj:
+                    image = Image.open(fileobj)
+                    self.assertEqual(image.format, fmt)
+                    self.assertEqual(image.size, (size, size // 2))
+
+    def test_derivatives_per_extension(self):
+        """test the same content stored as .jpg and .jpeg is kept apart"""
+        jpg = default_storage.save('uploads/influencer/a.jpg',
+                                   ContentFile(sample_image()))
+        jpeg = default_storage.save('uploads/influencer/a.jpeg',
+                                    ContentFile(sample_image()))
+        self.addCleanup(default_storage.delete, jpg)
+        self.addCleanup(default_storage.delete, jpeg)
+        self.addCleanup(images.delete_derivatives, jpeg)
+        images.generate_derivatives(jpg)
+        images.generate_derivatives(jpeg)
+
+        images.delete_derivatives(jpg)
+
+        for names in images.derivative_names(jpeg).values():
+            for name in names.values():
+                self.assertTrue(default_storage.exists(name))
+        self.assertNotEqual(images.derivative_name(jpg, 64, 'JPEG'),
+                            images.derivative_name(jpeg, 64, 'JPEG'))
+
+    @override_settings(INFLUENCER_IMAGE_WORKERS=0)
+    def test_detail_exposes_derivatives(self):
+        """test the detail serializer lists derivative urls"""
+        self.upload()
+
+        res = self.client.get(detail_url(self.influencer.id))
+
+        derivatives = res.data['profile_image_derivatives']
+        self.assertEqual(sorted(derivatives), ['256', '64'])
+        self.assertTrue(derivatives['64']['webp'].endswith('_64.webp'))
+        self.assertTrue(derivatives['64']['jpeg'].startswith('http'))
+
+    @override_settings(INFLUENCER_IMAGE_WORKERS=0)
+    def test_derivatives_hidden_until_generated(self):
+        """test a replaced image lists no derivatives until they exist"""
+        self.upload()
+        self.influencer.profile_image.save('other.jpg',
+                                           ContentFile(sample_image()))
+
+        res = self.client.get(detail_url(self.influencer.id))
+
+        self.assertFalse(self.influencer.profile_image_ready)
+        self.assertEqual(res.data['profile_image_derivatives'], {})
+
+
+@override_settings(INFLUENCER_IMAGE_SIZES=(64, 256),
+                   INFLUENCER_IMAGE_FORMATS=('JPEG', 'WEBP'))
+class ProfileImagePoolTests(DerivativeSetup, TransactionTestCase):
+    """test derivatives generated by the worker pool"""
+
+    def test_generated_off_request(self):
+        """test enqueue returns a future run by the worker pool"""
+        self.influencer.profile_image.save('avatar.jpg',
+                                           ContentFile(sample_image()))
+
+        future = images.enqueue(self.influencer.profile_image.name)
+        future.result(timeout=10)
+
+        name = images.derivative_name(self.influencer.profile_image.name,
+                                      64, 'WEBP')
+        self.assertTrue(default_storage.exists(name))
+
+    def test_ready_bumps_version(self):
+        """test responses cached before the derivatives existed retire"""
+        self.influencer.profile_image.save('avatar.jpg',
+                                           ContentFile(sample_image()))
+        version = get_user_version(self.user.id)
+
+        images.enqueue(self.influencer.profile_image.name).result(timeout=10)
+
+        self.influencer.refresh_from_db()
+        self.assertTrue(self.influencer.profile_image_ready)
+        self.assertGreater(get_user_version(self.user.id), version)
+
+
+class ImageQueueShutdownTests(SimpleTestCase):
+    """test waiting for the queued derivatives before exiting"""
+
+    def test_waits_for_queued_jobs(self):
+        """test shutdown returns once the queue is drained"""
+        done = []
+        images.get_executor().submit(done.append, 1)
+
+        self.assertTrue(images.shutdown(timeout=5))
+        self.assertEqual(done, [1])
+
+    def test_bounded_by_timeout(self):
+        """test shutdown gives up on a queue still busy after timeout"""
+        release = threading.Event()
+        images.get_executor().submit(release.wait, 5)
+        self.addCleanup(release.set)
+
+        self.assertFalse(images.shutdown(timeout=0.05))
+
+    def test_nothing_queued(self):
+        """test shutdown without a pool returns right away"""
+        images.shutdown()
+
+        self.assertTrue(images.shutdown(timeout=0))
@@ -3,7 +3,9 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -11,11 +13,13 @@ from rest_framework.test import APIClient
 
 from core.models import Influencer, Tag, Style
 
+from influencer import images
 from influencer.serializers import InfluencerSerializer, \
                                    InfluencerDetailSerializer
 
 
 INFLUENCERS_URL = reverse('influencer:influencer-list')
+FACETS_URL = reverse('influencer:influencer-facets')
 
 
 def profile_image_upload_url(influencer_id):
@@ -86,7 +90,7 @@ class PrivateInfluencerApiTests(TestCase):
         influencers = Influencer.objects.all().order_by('-id')
         serializer = InfluencerSerializer(influencers, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_influencers_limited_to_user(self):
         """Test retrieving influencers for user"""
@@ -102,8 +106,8 @@ class PrivateInfluencerApiTests(TestCase):
         influencers = Influencer.objects.filter(user=self.user)
         serializer = InfluencerSerializer(influencers, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_influencer_detail(self):
         """test viewing influencer detail page"""
@@ -215,6 +219,7 @@ class PrivateInfluencerApiTests(TestCase):
         self.assertEqual(tags.count(), 0)
 
 
+@override_settings(INFLUENCER_IMAGE_WORKERS=0)
 class InfluencerProfileImageUploadTests(TestCase):
     """profile_image upload test"""
 
@@ -228,6 +233,8 @@ class InfluencerProfileImageUploadTests(TestCase):
         self.influencer = sample_influencer(user=self.user)
 
     def tearDown(self):
+        if self.influencer.profile_image:
+            images.delete_derivatives(self.influencer.profile_image.name)
         self.influencer.profile_image.delete()
 
     def test_upload_profile_image(self):
@@ -271,9 +278,9 @@ class InfluencerProfileImageUploadTests(TestCase):
         serializer1 = InfluencerSerializer(influencer1)
         serializer2 = InfluencerSerializer(influencer2)
         serializer3 = InfluencerSerializer(influencer3)
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_influencer_by_style(self):
         """test returning influencers with specific styles"""
@@ -293,6 +300,266 @@ class InfluencerProfileImageUploadTests(TestCase):
         serializer1 = InfluencerSerializer(influencer1)
         serializer2 = InfluencerSerializer(influencer2)
         serializer3 = InfluencerSerializer(influencer3)
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+
+@override_settings(INFLUENCER_RESPONSE_CACHE=False)
+class InfluencerQueryCountTests(TestCase):
+    """test the influencer endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tags = [sample_tag(user=self.user, name=f'tag{i}')
+                     for i in range(3)]
+        self.styles = [sample_style(user=self.user, name=f'style{i}')
+                       for i in range(3)]
+
+    def create_influencers(self, count):
+        """create influencers with every sample tag and style"""
+        for i in range(count):
+            influencer = sample_influencer(user=self.user, name=f'inf{i}')
+            influencer.tags.set(self.tags)
+            influencer.styles.set(self.styles)
+
+    def test_list_query_count(self):
+        """test listing influencers doesn't run a query per row"""
+        self.create_influencers(10)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(INFLUENCERS_URL)
+
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertEqual(res.data['results'][0]['tags'],
+                         [tag.id for tag in self.tags])
+
+    def test_filtered_list_query_count(self):
+        """test filtering influencers doesn't run a query per row"""
+        self.create_influencers(10)
+        params = {
+            'tags': str(self.tags[0].id),
+            'styles': str(self.styles[0].id),
+        }
+        self.client.get(INFLUENCERS_URL, params)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(INFLUENCERS_URL, params)
+
+        self.assertEqual(len(res.data['results']), 10)
+
+    def test_retrieve_query_count(self):
+        """test the detail endpoint runs a fixed number of queries"""
+        self.create_influencers(1)
+        influencer = Influencer.objects.get()
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(influencer.id))
+
+        self.assertEqual(len(res.data['tags']), 3)
+        self.assertEqual(len(res.data['styles']), 3)
+
+    def test_create_query_count(self):
+        """test the query count doesn't grow with the submitted ids"""
+        tags = [sample_tag(user=self.user, name=f'many{i}')
+                for i in range(30)]
+        payload = {'name': 'Park', 'insta_id': 'park', 'followers': 1,
+                   'insta_link': 'www.instagram.com', 'styles': []}
+        with CaptureQueriesContext(connection) as one_tag:
+            self.client.post(INFLUENCERS_URL,
+                             dict(payload, tags=[tags[0].id]), format='json')
+
+        with self.assertNumQueries(len(one_tag)):
+            res = self.client.post(
+                INFLUENCERS_URL,
+                dict(payload, tags=[tag.id for tag in tags]), format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['tags']), 30)
+
+
+class InfluencerRelatedIdsTests(TestCase):
+    """test tag and style ids are validated against the user's own"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = sample_tag(user=self.user)
+        self.payload = {'name': 'Park', 'insta_id': 'park', 'followers': 1,
+                        'insta_link': 'www.instagram.com', 'styles': []}
+
+    def test_other_users_tags_rejected(self):
+        """test tags owned by another user can't be assigned"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        foreign = sample_tag(user=other, name='foreign')
+        payload = dict(self.payload, tags=[self.tag.id, foreign.id])
+
+        res = self.client.post(INFLUENCERS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(foreign.id), res.data['tags'][0])
+        self.assertFalse(Influencer.objects.exists())
+
+    def test_all_missing_ids_reported(self):
+        """test every missing id is reported in one response"""
+        payload = dict(self.payload, tags=[self.tag.id, 9998, 9999, 9998])
+
+        res = self.client.post(INFLUENCERS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertIn('9998', res.data['tags'][0])
+        self.assertIn('9999', res.data['tags'][1])
+
+    def test_invalid_ids(self):
+        """test non integer ids and non list values are rejected"""
+        for tags in (['x'], 'main', [[1]]):
+            res = self.client.post(INFLUENCERS_URL,
+                                   dict(self.payload, tags=tags),
+                                   format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_with_own_ids(self):
+        """test a patch resolves the ids of the user's tags"""
+        influencer = sample_influencer(user=self.user)
+        style = sample_style(user=self.user)
+
+        res = self.client.patch(detail_url(influencer.id),
+                                {'tags': [self.tag.id], 'styles': [style.id]},
+                                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(influencer.tags.all()), [self.tag])
+        self.assertEqual(list(influencer.styles.all()), [style])
+
+
+class InfluencerMatchFilterTests(TestCase):
+    """test the any/all match modes of the tag and style filters"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.solo = sample_tag(user=self.user, name='Solo')
+        self.girl = sample_tag(user=self.user, name='Girl')
+        self.chic = sample_style(user=self.user, name='Chic')
+        self.both = sample_influencer(user=self.user, name='Both')
+        self.both.tags.set([self.solo, self.girl])
+        self.both.styles.set([self.chic])
+        self.one = sample_influencer(user=self.user, name='One')
+        self.one.tags.set([self.solo])
+        sample_influencer(user=self.user, name='None')
+
+    def get_ids(self, params):
+        res = self.client.get(INFLUENCERS_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in res.data['results']]
+
+    def test_match_any_without_duplicates(self):
+        """test matching several tags returns each influencer once"""
+        ids = self.get_ids({'tags': f'{self.solo.id},{self.girl.id}'})
+
+        self.assertEqual(ids, [self.one.id, self.both.id])
+
+    def test_match_all_tags(self):
+        """test match=all only returns influencers with every tag"""
+        ids = self.get_ids({
+            'tags': f'{self.solo.id},{self.girl.id},{self.solo.id}',
+            'match': 'all',
+        })
+
+        self.assertEqual(ids, [self.both.id])
+
+    def test_match_all_tags_and_styles(self):
+        """test match=all applies to both tags and styles"""
+        ids = self.get_ids({
+            'tags': str(self.solo.id),
+            'styles': str(self.chic.id),
+            'match': 'all',
+        })
+
+        self.assertEqual(ids, [self.both.id])
+
+    def test_invalid_match_mode(self):
+        """test an unknown match mode is rejected"""
+        res = self.client.get(INFLUENCERS_URL, {'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class InfluencerFacetsTests(TestCase):
+    """test the facet counts endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.solo = sample_tag(user=self.user, name='Solo')
+        self.girl = sample_tag(user=self.user, name='Girl')
+        self.chic = sample_style(user=self.user, name='Chic')
+        self.park = sample_influencer(user=self.user, name='Park')
+        self.park.tags.set([self.solo, self.girl])
+        self.park.styles.set([self.chic])
+        self.seo = sample_influencer(user=self.user, name='Seo')
+        self.seo.tags.set([self.solo])
+
+    def counts(self, data, kind):
+        return {row['name']: row['count'] for row in data[kind]}
+
+    def test_facets_unfiltered(self):
+        """test counts over the whole roster"""
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.counts(res.data, 'tags'),
+                         {'Solo': 2, 'Girl': 1})
+        self.assertEqual(self.counts(res.data, 'styles'), {'Chic': 1})
+
+    def test_facets_filtered(self):
+        """test counts only include influencers matching the filter"""
+        res = self.client.get(FACETS_URL, {'tags': str(self.girl.id)})
+
+        self.assertEqual(self.counts(res.data, 'tags'),
+                         {'Solo': 1, 'Girl': 1})
+
+    def test_facets_cached_and_invalidated(self):
+        """test counts are cached until memberships change"""
+        self.client.get(FACETS_URL)
+        with self.assertNumQueries(0):
+            self.client.get(FACETS_URL)
+
+        self.seo.styles.add(self.chic)
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(self.counts(res.data, 'styles'), {'Chic': 2})
+
+    def test_facets_cached_per_search(self):
+        """test searched and unsearched counts are cached apart"""
+        searched = self.client.get(FACETS_URL, {'search': 'Park'})
+        plain = self.client.get(FACETS_URL)
+        again = self.client.get(FACETS_URL, {'search': ' Park '})
+
+        self.assertEqual(self.counts(searched.data, 'tags'),
+                         {'Solo': 1, 'Girl': 1})
+        self.assertEqual(self.counts(plain.data, 'tags'),
+                         {'Solo': 2, 'Girl': 1})
+        self.assertEqual(again.data, searched.data)
@@ -0,0 +1,115 @@
+import json
+from base64 import urlsafe_b64encode
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Influencer
+
+
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+
+
+def encode_cursor(cursor):
+    """return a cursor as it appears in the links"""
+    return urlsafe_b64encode(json.dumps(cursor).encode()).decode('ascii')
+
+
+def sample_influencer(user, **params):
+    """Create and return a sample influencer"""
+    defaults = {
+        'name': 'Sample influencer',
+        'insta_id': 'asdasf',
+        'followers': 1234,
+        'insta_link': 'www.instagram.com'
+    }
+    defaults.update(params)
+
+    return Influencer.objects.create(user=user, **defaults)
+
+
+class InfluencerPaginationTests(TestCase):
+    """Test keyset pagination of the influencer list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        for i in range(7):
+            sample_influencer(user=self.user, name=f'inf{i}',
+                              followers=(i % 3) * 100, score=i)
+
+    def collect(self, params):
+        """follow the next links and return every id plus the last page"""
+        ids = []
+        res = self.client.get(INFLUENCERS_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(row['id'] for row in res.data['results'])
+            if not res.data['next']:
+                return ids, res
+            res = self.client.get(res.data['next'])
+
+    def test_default_ordering(self):
+        """test the list is ordered by newest first by default"""
+        res = self.client.get(INFLUENCERS_URL)
+
+        expected = list(Influencer.objects.order_by('-id')
+                        .values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in res.data['results']],
+                         expected)
+        self.assertIsNone(res.data['next'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_paginate_by_followers_with_ties(self):
+        """test paging on a non unique key visits every row once"""
+        ids, _ = self.collect({'ordering': '-followers', 'page_size': 2})
+
+        expected = list(Influencer.objects.order_by('-followers', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_paginate_by_score_and_name(self):
+        """test paging by score and name ascending"""
+        for ordering in ('score', 'name'):
+            ids, _ = self.collect({'ordering': ordering, 'page_size': 3})
+
+            expected = list(Influencer.objects.order_by(ordering, 'id')
+                            .values_list('id', flat=True))
+            self.assertEqual(ids, expected)
+
+    def test_previous_link(self):
+        """test the previous link returns the preceding page"""
+        first = self.client.get(INFLUENCERS_URL,
+                                {'ordering': 'followers', 'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_invalid_cursor(self):
+        """test an invalid cursor returns not found"""
+        res = self.client.get(INFLUENCERS_URL, {'cursor': 'garbage'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor_value(self):
+        """test a sort key value the column can't hold is not found"""
+        for ordering, value in (('followers', 'abc'), ('followers', 10 ** 30),
+                                ('score', 'abc'), ('score', [1]),
+                                ('followers', None)):
+            cursor = encode_cursor({'o': ordering, 'v': value, 'i': 1,
+                                    'r': False})
+
+            res = self.client.get(INFLUENCERS_URL, {'ordering': ordering,
+                                                    'cursor': cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,243 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag, Style
+
+from influencer import leaderboard
+from influencer.cache import bump_user_version, get_user_version
+
+
+TOP_URL = reverse('influencer:influencer-top')
+
+
+def sample_influencer(user, name, followers, score=0):
+    """Create and return a sample influencer"""
+    return Influencer.objects.create(
+        user=user,
+        name=name,
+        insta_id=name.lower(),
+        followers=followers,
+        insta_link='www.instagram.com',
+        score=score,
+    )
+
+
+@override_settings(INFLUENCER_LEADERBOARD_SIZE=3)
+class LeaderboardTests(TransactionTestCase):
+    """test the cached boards stay consistent with the database
+
+    boards are only updated in place once a write commits
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.solo = Tag.objects.create(user=self.user, name='Solo')
+        self.chic = Style.objects.create(user=self.user, name='Chic')
+        self.influencers = [
+            sample_influencer(self.user, f'Influencer{i}', followers=i * 10,
+                              score=i)
+            for i in range(1, 6)
+        ]
+
+    def top(self, metric='score', facet=leaderboard.FACET_ALL, k=3):
+        return leaderboard.top_ids(self.user.id, metric, facet, k)
+
+    def expected(self, metric='score', facet=leaderboard.FACET_ALL, k=3):
+        return leaderboard.top_sql(self.user.id, metric, facet, k)
+
+    def board(self, metric='score', facet=leaderboard.FACET_ALL):
+        return leaderboard.load(self.user.id, metric, facet)
+
+    def test_top_endpoint(self):
+        """test the top action returns influencers in rank order"""
+        res = self.client.get(TOP_URL, {'metric': 'followers', 'k': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in res.data],
+                         ['Influencer5', 'Influencer4'])
+
+    def test_top_endpoint_facet(self):
+        """test the top action restricted to a tag"""
+        self.influencers[0].tags.add(self.solo)
+        self.influencers[2].tags.add(self.solo)
+
+        res = self.client.get(TOP_URL, {'tag': self.solo.id})
+
+        self.assertEqual([row['name'] for row in res.data],
+                         ['Influencer3', 'Influencer1'])
+
+    def test_top_endpoint_invalid(self):
+        """test invalid metric and facet parameters are rejected"""
+        for params in ({'metric': 'name'}, {'k': 'x'}, {'tag': 'x'},
+                       {'tag': self.solo.id, 'style': self.chic.id}):
+            res = self.client.get(TOP_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_top_endpoint_foreign_facet(self):
+        """test tags and styles of other users or no one are rejected"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        theirs = Tag.objects.create(user=other, name='Theirs')
+
+        for params in ({'tag': theirs.id}, {'style': 10 ** 6},
+                       {'tag': 10 ** 30}):
+            res = self.client.get(TOP_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(leaderboard.registered(self.user.id), set())
+
+    @override_settings(INFLUENCER_LEADERBOARD_MAX_BOARDS=2)
+    def test_registry_capped(self):
+        """test facets past the cap are read from sql, dropped ones free up"""
+        self.influencers[0].styles.add(self.chic)
+        style = ('styles', self.chic.id)
+        self.top()
+        self.top(metric='followers')
+
+        self.assertEqual(self.top(facet=style), self.expected(facet=style))
+        self.assertIsNone(self.board(facet=style))
+        self.assertEqual(len(leaderboard.registered(self.user.id)), 2)
+
+        Influencer.objects.filter(id=self.influencers[1].id)\
+            .update(score=99)
+        bump_user_version(self.user.id)
+        self.influencers[2].save()
+        self.assertEqual(leaderboard.registered(self.user.id), set())
+        self.top(facet=style)
+        self.assertIsNotNone(self.board(facet=style))
+
+    def test_top_endpoint_other_user(self):
+        """test the top action only returns the user's influencers"""
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        sample_influencer(other, 'Other', followers=10 ** 6, score=99)
+
+        res = self.client.get(TOP_URL, {'k': 1})
+
+        self.assertEqual([row['name'] for row in res.data], ['Influencer5'])
+
+    def test_save_updates_board_in_place(self):
+        """test saving an influencer moves it without a rebuild"""
+        self.assertEqual(self.top(), self.expected())
+        low = self.influencers[0]
+        low.score = 50
+        low.save()
+
+        with self.assertNumQueries(0):
+            ids = self.top()
+
+        self.assertEqual(ids, self.expected())
+        self.assertEqual(ids[0], low.id)
+        self.assertEqual(self.board().version,
+                         get_user_version(self.user.id))
+
+    def test_create_and_delete(self):
+        """test created and deleted influencers update the board"""
+        self.top()
+        new = sample_influencer(self.user, 'New', followers=0, score=10)
+        self.assertEqual(self.top()[0], new.id)
+
+        new.delete()
+        self.influencers[4].delete()
+
+        self.assertEqual(self.board().entries[0][1], self.influencers[3].id)
+        self.assertFalse(self.board().covers(3))
+        self.assertEqual(self.top(), self.expected())
+
+    def test_demoted_entry_leaves_incomplete_board(self):
+        """test an entry falling below the board is dropped"""
+        self.top()
+        top = self.influencers[4]
+        top.score = 0
+        top.save()
+
+        self.assertNotIn(top.id, self.board().ids(3))
+        self.assertEqual(self.top(), self.expected())
+
+    def test_facet_board(self):
+        """test tag boards check membership and drop on m2m changes"""
+        for influencer in self.influencers[:3]:
+            influencer.tags.add(self.solo)
+        facet = ('tags', self.solo.id)
+        self.assertEqual(self.top(facet=facet), self.expected(facet=facet))
+
+        outsider = self.influencers[4]
+        outsider.score = 100
+        outsider.save()
+        self.assertEqual(self.top(facet=facet), self.expected(facet=facet))
+
+        member = self.influencers[0]
+        member.score = 100
+        member.save()
+        self.assertEqual(self.top(facet=facet)[0], member.id)
+
+        outsider.tags.add(self.solo)
+        self.assertIsNone(self.board(facet=facet))
+        self.assertEqual(self.top(facet=facet), self.expected(facet=facet))
+
+    def test_style_delete_drops_board(self):
+        """test deleting a style drops its boards"""
+        self.influencers[0].styles.add(self.chic)
+        facet = ('styles', self.chic.id)
+        self.top(facet=facet)
+        self.top()
+
+        self.chic.delete()
+
+        self.assertIsNone(self.board(facet=facet))
+        self.assertIsNotNone(self.board())
+
+    def test_unapplied_change_rebuilds(self):
+        """test a bulk change that bypasses signals is picked up"""
+        self.top()
+        Influencer.objects.filter(id=self.influencers[0].id)\
+            .update(score=99)
+        bump_user_version(self.user.id)
+
+        self.assertEqual(self.top()[0], self.influencers[0].id)
+
+    def test_large_k_uses_sql(self):
+        """test k past the board size is answered from sql"""
+        self.assertEqual(self.top(k=5), self.expected(k=5))
+        self.assertIsNone(self.board())
+
+    @override_settings(INFLUENCER_LEADERBOARD=False)
+    def test_disabled(self):
+        """test the boards can be switched off"""
+        self.assertEqual(self.top(), self.expected())
+        self.assertIsNone(self.board())
+
+    def test_check_leaderboards(self):
+        """test the check command finds and drops inconsistent boards"""
+        self.top()
+        self.top(metric='followers')
+        call_command('check_leaderboards', stdout=StringIO())
+
+        board = self.board()
+        board.entries.reverse()
+        board.save()
+        with self.assertRaises(CommandError):
+            call_command('check_leaderboards', stdout=StringIO())
+
+        call_command('check_leaderboards', fix=True, stdout=StringIO())
+        self.assertIsNone(cache.get(leaderboard.board_key(
+            self.user.id, 'score', leaderboard.FACET_ALL
+        )))
+        self.assertIsNotNone(self.board(metric='followers'))
@@ -0,0 +1,117 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag
+
+from influencer.cache import cache_stats
+
+
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+TAGS_URL = reverse('influencer:tag-list')
+LOCAL_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+
+
+@override_settings(INFLUENCER_RESPONSE_CACHE=True)
+class ResponseCacheTests(TestCase):
+    """test list responses are cached per user and version"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Solo')
+        self.influencer = Influencer.objects.create(
+            user=self.user,
+            name='Park',
+            insta_id='park_',
+            followers=10,
+            insta_link='www.instagram.com'
+        )
+
+    def test_list_cached(self):
+        """test a repeated list is served from the cache"""
+        before = cache_stats()
+        first = self.client.get(INFLUENCERS_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(INFLUENCERS_URL)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        after = cache_stats()
+        self.assertEqual(after['hit'] - before['hit'], 1)
+        self.assertEqual(after['miss'] - before['miss'], 1)
+
+    def test_query_params_normalized(self):
+        """test parameter order doesn't change the cache key"""
+        self.client.get(TAGS_URL + '?assigned_only=0&x=1')
+
+        res = self.client.get(TAGS_URL + '?x=1&assigned_only=0')
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_write_invalidates(self):
+        """test changing a tag or a membership invalidates the lists"""
+        self.client.get(TAGS_URL)
+        self.client.get(INFLUENCERS_URL)
+
+        self.tag.name = 'Couple'
+        self.tag.save()
+        tags = self.client.get(TAGS_URL)
+        self.assertEqual(tags['X-Cache'], 'MISS')
+        self.assertEqual(tags.data[0]['name'], 'Couple')
+
+        self.client.get(INFLUENCERS_URL)
+        self.influencer.tags.add(self.tag)
+        res = self.client.get(INFLUENCERS_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['tags'], [self.tag.id])
+
+    def test_cache_per_user(self):
+        """test users never share cached responses"""
+        self.client.get(TAGS_URL)
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data, [])
+
+    @override_settings(INFLUENCER_RESPONSE_CACHE=None, CACHES=LOCAL_CACHES)
+    def test_off_with_local_cache(self):
+        """test responses aren't cached unless every process shares them"""
+        self.client.get(TAGS_URL)
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('X-Cache', res)
+
+    @override_settings(INFLUENCER_RESPONSE_CACHE=None)
+    def test_file_backend(self):
+        """test the cache works with the file based backend"""
+        with tempfile.TemporaryDirectory() as location:
+            caches = {'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}
+            with override_settings(CACHES=caches):
+                self.client.get(INFLUENCERS_URL)
+                res = self.client.get(INFLUENCERS_URL)
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data['results'][0]['name'], 'Park')
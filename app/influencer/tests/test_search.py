@@ -0,0 +1,136 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Influencer, Tag
+
+from influencer import search
+
+
+INFLUENCERS_URL = reverse('influencer:influencer-list')
+AUTOCOMPLETE_URL = reverse('influencer:influencer-autocomplete')
+
+
+def sample_influencer(user, name, insta_id, followers=100):
+    """Create and return a sample influencer"""
+    return Influencer.objects.create(
+        user=user,
+        name=name,
+        insta_id=insta_id,
+        followers=followers,
+        insta_link='www.instagram.com'
+    )
+
+
+class InfluencerSearchTests(TestCase):
+    """test searching influencers by name and insta_id"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@burningb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.park = sample_influencer(self.user, 'Park Jinho', 'jh_park', 50)
+        self.seo = sample_influencer(self.user, 'Seo Jin', 'jin_seo', 10)
+        self.hong = sample_influencer(self.user, 'Hong Gil', 'gil_dong', 10)
+        other = get_user_model().objects.create_user(
+            'other@burningb.com',
+            'testpass'
+        )
+        sample_influencer(other, 'Jin Other', 'jin_other')
+
+    def search(self, query):
+        res = self.client.get(INFLUENCERS_URL, {'search': query})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(row['id'] for row in res.data['results'])
+
+    def test_search_name_and_insta_id(self):
+        """test search matches substrings of either field"""
+        self.assertEqual(self.search('jin'), [self.park.id, self.seo.id])
+        self.assertEqual(self.search('DONG'), [self.hong.id])
+        self.assertEqual(self.search('e'), [self.seo.id])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_search_sql_path(self):
+        """test the sql path returns the same results"""
+        with override_settings(INFLUENCER_NGRAM_INDEX=False,
+                               INFLUENCER_RESPONSE_CACHE=False):
+            self.assertEqual(self.search('jin'), [self.park.id, self.seo.id])
+            self.assertEqual(self.search('DONG'), [self.hong.id])
+
+    @override_settings(INFLUENCER_RESPONSE_CACHE=False)
+    def test_search_with_filters_one_id_list(self):
+        """test search and filter ids are intersected into one IN list"""
+        solo = Tag.objects.create(user=self.user, name='Solo')
+        self.seo.tags.add(solo)
+        self.hong.tags.add(solo)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(INFLUENCERS_URL,
+                                  {'search': 'jin', 'tags': solo.id})
+
+        self.assertEqual([row['id'] for row in res.data['results']],
+                         [self.seo.id])
+        page = [query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith('SELECT "core_influencer"') and
+                'LIMIT' in query['sql']]
+        self.assertEqual(page[0].count('"core_influencer"."id" IN'), 1)
+
+    def test_search_sees_writes(self):
+        """test the index is rebuilt after influencers change"""
+        self.search('jin')
+
+        self.hong.name = 'Hong Jin'
+        self.hong.save()
+
+        self.assertEqual(self.search('jin'),
+                         [self.park.id, self.seo.id, self.hong.id])
+
+    def test_autocomplete_ranking(self):
+        """test prefix matches rank first, then by followers"""
+        for setting in (True, False):
+            with override_settings(INFLUENCER_NGRAM_INDEX=setting):
+                res = self.client.get(AUTOCOMPLETE_URL, {'q': 'jin'})
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual([row['id'] for row in res.data],
+                                 [self.seo.id, self.park.id])
+                self.assertEqual(set(res.data[0]),
+                                 {'id', 'name', 'insta_id'})
+
+    def test_autocomplete_walk_matches_sort(self):
+        """test walking the roster ranks like sorting the candidates"""
+        index = search.NgramIndex.build(self.user.id, 0)
+        expected = [index.autocomplete(query, 10)
+                    for query in ('jin', 'jh_', 'g', 'nothing')]
+
+        with patch.object(search, 'SCAN_THRESHOLD', 0):
+            walked = [index.autocomplete(query, 10)
+                      for query in ('jin', 'jh_', 'g', 'nothing')]
+
+        self.assertEqual(walked, expected)
+        self.assertEqual(expected[0][0]['id'], self.seo.id)
+
+    def test_autocomplete_limit(self):
+        """test the number of suggestions is limited"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'j', 'limit': 1})
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(self.client.get(AUTOCOMPLETE_URL).data, [])
+
+
+class NgramIndexTests(TestCase):
+
+    def test_trigrams(self):
+        """test splitting text into trigrams"""
+        self.assertEqual(search.trigrams('park'), {'par', 'ark'})
+        self.assertEqual(search.trigrams('pa'), set())
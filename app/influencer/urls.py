@@ -1,10 +1,10 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
 
 from influencer import views
+from influencer.routers import BulkRouter
 
 
-router = DefaultRouter()
+router = BulkRouter()
 router.register('tags', views.TagViewSet)
 router.register('style', views.StyleViewSet)
 router.register('influencer', views.InfluencerViewSet)
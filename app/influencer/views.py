@@ -1,14 +1,37 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Prefetch, Q, \
+    Value, When
+
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 
 from core.models import Tag, Style, Influencer
-from influencer import serializers
+from influencer import bitmap, bulk, exports, images, leaderboard, \
+    membership, search, serializers
+from influencer.cache import user_cache_key
+from influencer.filters import MATCH_ANY, MATCH_MODES, filter_by_members, \
+    member_ids
+from influencer.mixins import CachedListMixin, ConditionalGetMixin, \
+    FastListMixin, SerializationTimingMixin
+from influencer.pagination import KeysetPagination
+from user.authentication import CachedTokenAuthentication
+
+
+FACETS_CACHE_TIMEOUT = 300
+AUTOCOMPLETE_MAX_LIMIT = 50
+TOP_DEFAULT_K = 50
+TOP_MAX_K = 500
 
 
-class BaseInfluencerAttrViewSet(viewsets.GenericViewSet,
+class BaseInfluencerAttrViewSet(ConditionalGetMixin,
+                                CachedListMixin,
+                                FastListMixin,
+                                SerializationTimingMixin,
+                                viewsets.GenericViewSet,
                                 mixins.ListModelMixin,
                                 mixins.CreateModelMixin):
     """Base viewset for user owned influencer attributes"""
@@ -18,8 +41,10 @@ class BaseInfluencerAttrViewSet(viewsets.GenericViewSet,
     https://www.django-rest-framework.org/api-guide/viewsets/#genericviewset
     https://www.django-rest-framework.org/api-guide/serializers/#modelserializer
     """
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    fast_fields = ('id', 'name')
+    query_budget = {'list': 3}
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
@@ -50,36 +75,103 @@ class StyleViewSet(BaseInfluencerAttrViewSet):
     serializer_class = serializers.StyleSerializer
 
 
-class InfluencerViewSet(viewsets.ModelViewSet):
+class InfluencerViewSet(ConditionalGetMixin,
+                        CachedListMixin,
+                        FastListMixin,
+                        SerializationTimingMixin,
+                        viewsets.ModelViewSet):
     """Manage influencer in the database"""
     serializer_class = serializers.InfluencerSerializer
     queryset = Influencer.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    fast_fields = ('id', 'name', 'insta_id', 'followers', 'insta_link')
+    # reads must not grow with the number of rows, see core.querycheck
+    query_budget = {
+        'list': 6,
+        'retrieve': 5,
+        'top': 6,
+        'facets': 6,
+        'autocomplete': 3,
+        'export': 4,
+    }
 
     def _params_to_inst(self, qs):
         """Covert a list of string IDs to a list of integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
-    def get_queryset(self):
-        """Retrieve the influencers for the authenticated user"""
+    def _get_filters(self):
+        """return the requested {relation: ids} filters and match mode"""
         tags = self.request.query_params.get('tags')
         styles = self.request.query_params.get('styles')
-        queryset = self.queryset
+        match = self.request.query_params.get('match', MATCH_ANY)
+        if match not in MATCH_MODES:
+            raise ValidationError(
+                {'match': f'Must be one of: {", ".join(MATCH_MODES)}.'}
+            )
+        filters = {}
         if tags:
-            tag_ids = self._params_to_inst(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            filters['tags'] = self._params_to_inst(tags)
         if styles:
-            style_ids = self._params_to_inst(styles)
-            queryset = queryset.filter(styles__id__in=style_ids)
+            filters['styles'] = self._params_to_inst(styles)
+        return filters, match
+
+    def get_queryset(self):
+        """Retrieve the influencers for the authenticated user"""
+        filters, match = self._get_filters()
+        queryset = self.queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('styles', queryset=Style.objects.order_by('id')),
+        )
+        ids = None
+        if filters:
+            ids = bitmap.resolve_ids(self.request.user.id, filters, match)
+            if ids is None:
+                for relation, keys in filters.items():
+                    queryset = filter_by_members(queryset, relation, keys,
+                                                 match)
+        query = self.request.query_params.get('search', '').strip()
+        if query:
+            matches = search.search_ids(self.request.user.id, query)
+            if matches is None:
+                queryset = queryset.filter(
+                    Q(name__icontains=query) | Q(insta_id__icontains=query)
+                )
+            elif ids is None:
+                ids = matches
+            else:
+                # one IN list, two could pass the parameter limit together
+                ids = sorted(set(ids).intersection(matches))
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
         return queryset.filter(user=self.request.user)
 
+    def fast_queryset(self, queryset):
+        # score is read for the keyset cursor only
+        return queryset.prefetch_related(None)\
+            .values(*self.fast_fields, 'score')
+
+    def fast_rows(self, rows):
+        rows = list(rows)
+        ids = [row['id'] for row in rows]
+        tags = member_ids('tags', ids) if ids else {}
+        styles = member_ids('styles', ids) if ids else {}
+        return [
+            dict(((field, row[field]) for field in self.fast_fields),
+                 tags=tags.get(row['id'], []),
+                 styles=styles.get(row['id'], []))
+            for row in rows
+        ]
+
     def get_serializer_class(self):
         """return appropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.InfluencerDetailSerializer
         elif self.action == 'upload_profile_image':
             return serializers.InfluencerProfileImageSerializer
+        elif self.action == 'bulk_membership':
+            return serializers.BulkMembershipSerializer
 
         return self.serializer_class
 
@@ -87,6 +179,258 @@ class InfluencerViewSet(viewsets.ModelViewSet):
         """create a new influencer"""
         serializer.save(user=self.request.user)
 
+    def _check_batch_size(self, size):
+        if size > bulk.max_batch():
+            raise ValidationError(
+                f'At most {bulk.max_batch()} influencers per request.'
+            )
+
+    def _has_filters(self):
+        return bool(self._get_filters()[0] or
+                    self.request.query_params.get('search', '').strip())
+
+    def bulk_partial_update(self, request, *args, **kwargs):
+        """PATCH a list of {id, fields...} rows in one transaction
+
+        errors are reported per row in request order, nothing is written
+        unless every row is valid
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError('Expected a list of influencer changes.')
+        self._check_batch_size(len(rows))
+        serializer = serializers.InfluencerBulkUpdateSerializer()
+        ids = [row.get('id') for row in rows if isinstance(row, dict)]
+
+        with transaction.atomic():
+            instances = self.queryset.filter(user=request.user)\
+                .select_for_update().in_bulk(
+                    [pk for pk in ids if type(pk) is int]
+                )
+            errors, changed, fields, seen = [], [], set(), set()
+            for row in rows:
+                error = self._bulk_row_errors(row, instances, seen)
+                if not error:
+                    values, error = serializer.validate_row(row)
+                    if not error:
+                        instance = instances[row['id']]
+                        for field, value in values.items():
+                            setattr(instance, field, value)
+                        fields.update(values)
+                        changed.append(instance)
+                errors.append(error)
+            if any(errors):
+                raise ValidationError(errors)
+            updated = bulk.update_influencers(request.user, changed, fields)
+        return Response({'updated': updated})
+
+    def _bulk_row_errors(self, row, instances, seen):
+        """return the id errors of a bulk update row"""
+        if not isinstance(row, dict):
+            return {'non_field_errors': ['Expected an object.']}
+        pk = row.get('id')
+        if type(pk) is not int or pk not in instances:
+            return {'id': [f'Invalid pk "{pk}" - object does not exist.']}
+        if pk in seen:
+            return {'id': ['Duplicate id.']}
+        seen.add(pk)
+        return {}
+
+    def bulk_destroy(self, request, *args, **kwargs):
+        """DELETE the influencers of an id list or of the list filters"""
+        ids = request.data.get('ids') if hasattr(request.data, 'get') \
+            else None
+        if ids is None:
+            if not self._has_filters():
+                raise ValidationError({'ids': (
+                    'Give influencer ids or filter with tags, styles or '
+                    'search.'
+                )})
+            ids = list(self.get_queryset().values_list('id', flat=True)
+                       [:bulk.max_batch() + 1])
+        elif not isinstance(ids, list) or \
+                any(type(pk) is not int for pk in ids):
+            raise ValidationError({'ids': 'Expected a list of integers.'})
+        self._check_batch_size(len(ids))
+
+        owned = set()
+        for batch in bulk.id_batches(ids):
+            owned.update(self.queryset.filter(
+                user=request.user, id__in=batch
+            ).values_list('id', flat=True))
+        missing = [pk for pk in ids if pk not in owned]
+        if missing:
+            raise ValidationError({'ids': [
+                f'Invalid pk "{pk}" - object does not exist.'
+                for pk in missing
+            ]})
+        deleted = bulk.delete_influencers(request.user, set(ids))
+        return Response({'deleted': deleted})
+
+    def _facet_counts(self, model, influencers):
+        """count the filtered influencers related to each tag or style"""
+        return list(
+            model.objects.filter(user=self.request.user).annotate(
+                count=Count('influencer',
+                            filter=Q(influencer__in=influencers))
+            ).order_by('-count', 'name').values('id', 'name', 'count')
+        )
+
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        """return per tag and per style counts for the current filter"""
+        filters, match = self._get_filters()
+        key = user_cache_key(request.user.id, 'facets', (
+            match,
+            sorted(set(filters.get('tags', ()))),
+            sorted(set(filters.get('styles', ()))),
+            request.query_params.get('search', '').strip(),
+        ))
+        data = cache.get(key)
+        if data is None:
+            influencers = self.get_queryset().values('id')
+            data = {
+                'tags': self._facet_counts(Tag, influencers),
+                'styles': self._facet_counts(Style, influencers),
+            }
+            cache.set(key, data, FACETS_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """stream the filtered roster as ?type=csv, ndjson or json"""
+        fmt = request.query_params.get('type', 'csv')
+        if fmt not in exports.ENCODERS:
+            raise ValidationError(
+                {'type': f'Must be one of: {", ".join(exports.ENCODERS)}.'}
+            )
+        return exports.streaming_response(
+            request.user, self.filter_queryset(self.get_queryset()), fmt
+        )
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """return influencers matching ?q=, prefix matches first"""
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)),
+                        AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        if not query or limit < 1:
+            return Response([])
+
+        index = search.for_user(request.user.id)
+        if index is not None:
+            return Response(index.autocomplete(query, limit))
+
+        prefix = Q(name__istartswith=query) | Q(insta_id__istartswith=query)
+        rows = Influencer.objects.filter(user=request.user).filter(
+            Q(name__icontains=query) | Q(insta_id__icontains=query)
+        ).annotate(
+            rank=Case(When(prefix, then=Value(0)), default=Value(1),
+                      output_field=IntegerField())
+        ).order_by('rank', '-followers', 'id')\
+            .values('id', 'name', 'insta_id')[:limit]
+        return Response(list(rows))
+
+    def _top_facet(self):
+        """return the leaderboard facet selected by ?tag= or ?style="""
+        tag = self.request.query_params.get('tag')
+        style = self.request.query_params.get('style')
+        if tag and style:
+            raise ValidationError('Filter by either tag or style, not both.')
+        for relation, model, value in (('tags', Tag, tag),
+                                       ('styles', Style, style)):
+            if value:
+                try:
+                    key = int(value)
+                except ValueError:
+                    raise ValidationError(
+                        {relation[:-1]: 'A valid integer is required.'}
+                    )
+                # out of range keys would make the query itself fail
+                if not 0 < key < 2 ** 63 or not model.objects.filter(
+                        user=self.request.user, id=key).exists():
+                    raise ValidationError({relation[:-1]: [
+                        f'Invalid pk "{key}" - object does not exist.'
+                    ]})
+                return relation, key
+        return leaderboard.FACET_ALL
+
+    @action(methods=['GET'], detail=False)
+    def top(self, request):
+        """return the top ?k= influencers by ?metric=score|followers"""
+        metric = request.query_params.get('metric', 'score')
+        if metric not in leaderboard.METRICS:
+            raise ValidationError({
+                'metric': f'Must be one of: '
+                          f'{", ".join(leaderboard.METRICS)}.'
+            })
+        try:
+            k = min(int(request.query_params.get('k', TOP_DEFAULT_K)),
+                    TOP_MAX_K)
+        except ValueError:
+            raise ValidationError({'k': 'A valid integer is required.'})
+        if k < 1:
+            return Response([])
+
+        ids = leaderboard.top_ids(request.user.id, metric,
+                                  self._top_facet(), k)
+        influencers = self.queryset.filter(
+            user=request.user, id__in=ids
+        ).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('styles', queryset=Style.objects.order_by('id')),
+        ).in_bulk()
+        serializer = self.get_serializer(
+            [influencers[pk] for pk in ids if pk in influencers], many=True
+        )
+        return Response(serializer.data)
+
+    @action(methods=['POST'], detail=False, url_path='bulk-membership')
+    def bulk_membership(self, request):
+        """add/remove tags and styles across listed or filtered influencers
+
+        without an influencers list the ?tags=, ?styles= and ?search=
+        filters of the list endpoint select the influencers
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        listed = 'influencers' in data
+        if not listed and not self._has_filters():
+            raise ValidationError({'influencers': (
+                'Give influencer ids or filter with tags, styles or search.'
+            )})
+
+        keys = {
+            relation: set(data['add'].get(relation, ())) |
+            set(data['remove'].get(relation, ()))
+            for relation in membership.MODELS
+        }
+        owned = membership.owned_ids(
+            request.user, data.get('influencers', ()), keys
+        )
+        wanted = dict(keys, influencers=set(data.get('influencers', ())))
+        errors = {
+            kind: [f'Invalid pk "{pk}" - object does not exist.'
+                   for pk in sorted(ids - owned[kind])]
+            for kind, ids in wanted.items() if ids - owned[kind]
+        }
+        if errors:
+            raise ValidationError(errors)
+
+        if listed:
+            influencers = self.queryset.filter(id__in=owned['influencers'])
+        else:
+            influencers = self.get_queryset()
+        result = membership.bulk_change(
+            request.user, influencers,
+            add=data['add'], remove=data['remove'],
+        )
+        return Response(result)
+
     @action(methods=['POST'], detail=True, url_path='upload-profile-image')
     def upload_profile_image(self, request, pk=None):
         """upload an profile image to a influencer"""
@@ -97,7 +441,10 @@ class InfluencerViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            # the image lock taken while storing is held until the commit
+            with transaction.atomic():
+                serializer.save()
+            images.enqueue(influencer.profile_image.name)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
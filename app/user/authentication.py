@@ -0,0 +1,177 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.cache import enabled_with_shared_cache
+
+
+TOKEN_KEY = 'user:token:{digest}'
+REVOKED_KEY = 'user:token:revoked:{digest}'
+LOCAL_MAX_ENTRIES = 1024
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _cache_key(key):
+    return TOKEN_KEY.format(digest=_digest(key))
+
+
+def _revoked_key(key):
+    return REVOKED_KEY.format(digest=_digest(key))
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _local_timeout():
+    return _setting('TOKEN_CACHE_LOCAL_TIMEOUT', 5)
+
+
+def shared_tier():
+    return enabled_with_shared_cache('TOKEN_CACHE_SHARED')
+
+
+def revocations(key):
+    """return the token's revocation count, None when not revoked lately"""
+    return cache.get(_revoked_key(key))
+
+
+def revoke(key):
+    """forget a cached token in this process and in the shared cache
+
+    the token's revocation count goes up too, the local entries of the
+    other processes are checked against it. it outlives those entries,
+    an entry cached before it expired fails the check just the same
+    """
+    with _local_lock:
+        _local.pop(key, None)
+    if shared_tier():
+        revoked = _revoked_key(key)
+        try:
+            cache.incr(revoked)
+        except ValueError:
+            cache.set(revoked, 1, _local_timeout() + 60)
+    cache.delete(_cache_key(key))
+
+
+def entry_for(token):
+    """return what is cached of a token, no secrets of its user"""
+    user = token.user
+    return (user.pk, user.is_active, user.is_staff, token.created)
+
+
+def token_from(key, entry):
+    """return a Token whose user only has the cached fields loaded
+
+    the other user fields are loaded from the database on first access
+    """
+    user_id, is_active, is_staff, created = entry
+    model = get_user_model()
+    user = model.from_db(router.db_for_read(model),
+                         ['id', 'is_active', 'is_staff'],
+                         [user_id, is_active, is_staff])
+    token = Token(key=key, user_id=user_id, created=created)
+    token.user = user
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication caching the token -> user lookup
+
+    resolved tokens are kept in process for TOKEN_CACHE_LOCAL_TIMEOUT
+    seconds and in the shared cache for TOKEN_CACHE_TIMEOUT seconds, as
+    the user id, is_active, is_staff and the token's creation time.
+    deleting a token or saving its user revokes it: the shared entry is
+    deleted and a revocation mark the local entries of every process are
+    checked against is set. the shared tier (TOKEN_CACHE_SHARED) defaults
+    to on only with a cache every process shares, a local one would
+    outlive revocations made elsewhere. TOKEN_EXPIRE_AFTER (seconds)
+    optionally limits the lifetime of tokens
+    """
+
+    def authenticate_credentials(self, key):
+        entry, revoked = self.get_cached_entry(key)
+        if entry is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            entry = entry_for(token)
+            self.cache_entry(key, entry, revoked)
+        token = token_from(key, entry)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        expire_after = _setting('TOKEN_EXPIRE_AFTER', None)
+        if expire_after is not None and \
+                token.created + timedelta(seconds=expire_after) < \
+                timezone.now():
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+
+        return (token.user, token)
+
+    def get_cached_entry(self, key):
+        """return the cached entry or None, and the revocation count
+
+        the count is read before a lookup that misses, a revocation
+        landing during the database read then voids what gets cached
+        """
+        now = time.monotonic()
+        with _local_lock:
+            entry, revoked, expires = _local.get(key, (None, None, 0))
+            if entry is not None and expires <= now:
+                del _local[key]
+                entry = None
+
+        if not shared_tier():
+            return entry, None
+        if entry is not None:
+            current = revocations(key)
+            if current == revoked:
+                return entry, revoked
+            with _local_lock:
+                _local.pop(key, None)
+            return None, current
+        shared_key = _cache_key(key)
+        found = cache.get_many([shared_key, _revoked_key(key)])
+        revoked = found.get(_revoked_key(key))
+        entry = found.get(shared_key)
+        if entry is not None:
+            self.cache_locally(key, entry, revoked)
+        return entry, revoked
+
+    def cache_entry(self, key, entry, revoked):
+        if shared_tier():
+            cache.set(_cache_key(key), entry,
+                      _setting('TOKEN_CACHE_TIMEOUT', 60))
+        self.cache_locally(key, entry, revoked)
+
+    def cache_locally(self, key, entry, revoked):
+        expires = time.monotonic() + _local_timeout()
+        with _local_lock:
+            _local[key] = (entry, revoked, expires)
+            _local.move_to_end(key)
+            while len(_local) > LOCAL_MAX_ENTRIES:
+                _local.popitem(last=False)
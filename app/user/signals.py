@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from user.authentication import revoke
+
+
+def revoke_on_commit(key):
+    """revoke now and again once the change commits
+
+    until then other transactions still read the old row and may cache
+    it again
+    """
+    revoke(key)
+    transaction.on_commit(lambda: revoke(key))
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    revoke_on_commit(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """drop cached tokens so deactivation and edits apply immediately"""
+    if created:
+        return
+    for key in Token.objects.filter(user=instance)\
+            .values_list('key', flat=True):
+        revoke_on_commit(key)
@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user import authentication
+
+
+ME_URL = reverse('user:me')
+LOCAL_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+
+
+@override_settings(TOKEN_CACHE_SHARED=True)
+class CachedTokenAuthenticationTests(TestCase):
+    """test authenticating with cached tokens"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@burningb.com',
+            password='password1',
+            name='test account'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """test the token is only looked up once"""
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'authtoken_token' in query['sql']])
+
+    def test_user_not_cached(self):
+        """test only the user's id, flags and the token's age are cached"""
+        self.client.get(ME_URL)
+
+        self.assertEqual(
+            cache.get(authentication._cache_key(self.token.key)),
+            (self.user.id, True, False, self.token.created)
+        )
+
+    def test_revoked_in_other_process(self):
+        """test another process's local entry is dropped on revocation"""
+        self.client.get(ME_URL)
+        key = self.token.key
+        stale = authentication._local[key]
+
+        self.token.delete()
+        # what a process that didn't run the delete still has
+        authentication._local[key] = stale
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn(key, authentication._local)
+
+    @override_settings(TOKEN_CACHE_SHARED=None, CACHES=LOCAL_CACHES)
+    def test_no_shared_tier_with_local_cache(self):
+        """test tokens are only cached in process without a shared cache"""
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(
+            cache.get(authentication._cache_key(self.token.key))
+        )
+
+    def test_invalid_token(self):
+        """test an unknown token is rejected"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_revoked(self):
+        """test deleting a token revokes it immediately"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_revoked(self):
+        """test deactivating a user revokes their cached token"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_visible(self):
+        """test the cached user is refreshed after the user changes"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'new name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'new name')
+
+    @override_settings(TOKEN_EXPIRE_AFTER=60)
+    def test_token_expiry(self):
+        """test tokens older than TOKEN_EXPIRE_AFTER are rejected"""
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        old = Token.objects.create(
+            user=get_user_model().objects.create_user(
+                email='old@burningb.com',
+                password='password1'
+            )
+        )
+        Token.objects.filter(key=old.key).update(
+            created=timezone.now() - timedelta(minutes=5)
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {old.key}')
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,20 +1,51 @@
 
 DOCKER_APP_NAME=app
+# the image build and this wait both have to fit in the AfterInstall hook
+# timeout of appspec.yml (900s), with time left to fall back to the old color
+READY_TIMEOUT=${READY_TIMEOUT:-180}
 
-EXIST_BLUE=$(docker-compose -p ${DOCKER_APP_NAME}-blue -f docker-compose.blue.yml ps | grep Up)
+# poll the new color's readiness probe until it answers 200
+wait_ready() {
+    local port=$1
+    local deadline=$(( $(date +%s) + READY_TIMEOUT ))
+    until curl -fsS -o /dev/null --max-time 5 "http://localhost:${port}/readyz"; do
+        if [ "$(date +%s)" -ge "$deadline" ]; then
+            return 1
+        fi
+        sleep 1
+    done
+}
 
-if [ -z "$EXIST_BLUE" ]; then
-    echo "blue up"
-    docker-compose -p ${DOCKER_APP_NAME}-blue -f docker-compose.blue.yml up -d
+# bring up one color, then stop the other only once the new one is ready
+cutover() {
+    local new=$1
+    local new_port=$2
+    local old=$3
 
-    sleep 10
+    echo "${new} up"
+    # rebuild so requirements added since the last deploy get installed
+    docker-compose -p ${DOCKER_APP_NAME}-${new} -f docker-compose.${new}.yml up -d --build
 
-    docker-compose -p ${DOCKER_APP_NAME}-green -f docker-compose.green.yml down
-else
-    echo "green up"
-    docker-compose -p ${DOCKER_APP_NAME}-green -f docker-compose.green.yml up -d
+    if ! wait_ready "$new_port"; then
+        echo "${new} not ready after ${READY_TIMEOUT}s, keeping ${old}"
+        curl -sS --max-time 5 "http://localhost:${new_port}/readyz"
+        docker-compose -p ${DOCKER_APP_NAME}-${new} -f docker-compose.${new}.yml down
+        exit 1
+    fi
+
+    echo "${new} ready"
+    docker-compose -p ${DOCKER_APP_NAME}-${old} -f docker-compose.${old}.yml down
+}
 
-    sleep 10
+# the network and the services both colors share outlive every cutover
+docker network inspect ${DOCKER_APP_NAME}-shared > /dev/null 2>&1 || \
+    docker network create ${DOCKER_APP_NAME}-shared
+docker-compose -p ${DOCKER_APP_NAME}-shared -f docker-compose.shared.yml up -d
 
-    docker-compose -p ${DOCKER_APP_NAME}-blue -f docker-compose.blue.yml down
-fi
\ No newline at end of file
+EXIST_BLUE=$(docker-compose -p ${DOCKER_APP_NAME}-blue -f docker-compose.blue.yml ps | grep Up)
+
+if [ -z "$EXIST_BLUE" ]; then
+    cutover blue 8002 green
+else
+    cutover green 8001 blue
+fi